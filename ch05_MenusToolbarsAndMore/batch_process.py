@@ -0,0 +1,285 @@
+"""
+Batch processing for the photo editor.
+Applies a list of recorded photo editor operations to every image in a
+folder. Each image is decoded, edited and encoded in a separate process,
+so one pipeline runs per core. The number of images in flight is limited
+to keep memory use bounded.
+
+Can be run without a GUI, for example:
+    python batch_process.py photos/ edited/ --op rotate:90 --op scale:0.5
+    python batch_process.py photos/ edited/ --ops operations.json
+    python batch_process.py photos/ pdfs/ --pdf
+"""
+# import necessary modules
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                wait)
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from image_operations import (IMAGE_EXTENSIONS, applyOperation,
+                              checkOperation, loadImage)
+from image_printing import exportPdf
+
+
+def findImages(directory):
+    """
+    Return the paths of the image files in directory, sorted by name.
+    """
+    return [os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def checkFolders(source_dir, target_dir):
+    """
+    Raise ValueError if the edited images would be written over the
+    images being edited.
+    """
+    if os.path.realpath(source_dir) == os.path.realpath(target_dir):
+        raise ValueError("The edited images can't be saved to the folder "
+                         "of the images being edited.")
+
+
+def targetPaths(files, target_dir, pdf = False):
+    """
+    Return the path to write the result of each file to. Files whose
+    results would have the same name, such as a.jpg and a.png exported
+    to PDF, are given a number, as in a_1.pdf.
+    """
+    targets = []
+    used = set()
+    for source in files:
+        name = os.path.basename(source)
+        if pdf:
+            name = os.path.splitext(name)[0] + ".pdf"
+        stem, extension = os.path.splitext(name)
+        number = 0
+        while os.path.normcase(name) in used:
+            number += 1
+            name = "{}_{}{}".format(stem, number, extension)
+        used.add(os.path.normcase(name))
+        targets.append(os.path.join(target_dir, name))
+    return targets
+
+
+def parseOperation(text):
+    """
+    Convert command line text such as "rotate:90", "flip:horizontal",
+    "levels:10,240,1.2" or "grayscale" into an operation tuple.
+    Raises ValueError if it isn't a valid operation.
+    """
+    name, _, values = text.partition(":")
+    operation = [name]
+    for value in values.split(",") if values else []:
+        try:
+            operation.append(float(value) if "." in value else int(value))
+        except ValueError:
+            operation.append(value)
+    operation = tuple(operation)
+    checkOperation(operation)
+    return operation
+
+
+def saveOperations(file_name, operations):
+    with open(file_name, "w") as f:
+        json.dump([list(operation) for operation in operations], f, indent=2)
+
+
+def loadOperations(file_name):
+    with open(file_name) as f:
+        return [tuple(operation) for operation in json.load(f)]
+
+
+def processFile(source, target, operations, pdf = False):
+    """
+    Decode, edit and encode a single image, or export it to a PDF file
+    if pdf is True. This runs in a worker process and returns a
+    dictionary describing the result.
+    """
+    start = time.perf_counter()
+    result = {"file": os.path.basename(source), "ok": False, "error": "",
+              "width": 0, "height": 0, "seconds": 0.0}
+
+    image, error = loadImage(source)
+    if image.isNull():
+        result["error"] = error or "Unable to open image."
+    else:
+        try:
+            for operation in operations:
+                image = applyOperation(image, operation)
+            if pdf:
+                saved = exportPdf(image, target)
+            else:
+                saved = image.save(target)
+        except Exception as error:
+            # Report the file as failed instead of stopping the batch
+            result["error"] = "{}: {}".format(type(error).__name__, error)
+        else:
+            if saved:
+                result["ok"] = True
+                result["width"] = image.width()
+                result["height"] = image.height()
+            else:
+                result["error"] = "Unable to save image."
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def runBatch(files, target_dir, operations, workers = None,
+             max_in_flight = None, pdf = False):
+    """
+    Process files with a pool of worker processes, yielding the result
+    of each file as soon as it is done. At most max_in_flight images are
+    submitted at once, so only that many are ever held in memory.
+    Raises ValueError if a result would be written over its source.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    targets = targetPaths(files, target_dir, pdf)
+    for source, target in zip(files, targets):
+        if os.path.realpath(source) == os.path.realpath(target):
+            raise ValueError("{} would be overwritten.".format(source))
+    os.makedirs(target_dir, exist_ok = True)
+
+    # Use spawn so that worker processes don't inherit the GUI's Qt state
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers = workers,
+                             mp_context = context) as executor:
+        pending = set()
+        remaining = zip(files, targets)
+
+        while True:
+            # Keep the pool topped up without queuing every file at once
+            for source, target in remaining:
+                pending.add(executor.submit(processFile, source, target,
+                                            operations, pdf))
+                if len(pending) >= max_in_flight:
+                    break
+
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+
+
+def writeReport(file_name, results, elapsed):
+    """
+    Write the per-file results to a CSV file, followed by the totals.
+    """
+    with open(file_name, "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "ok", "width", "height", "seconds",
+                         "error"])
+        for result in results:
+            writer.writerow([result["file"], result["ok"], result["width"],
+                             result["height"],
+                             "{:.3f}".format(result["seconds"]),
+                             result["error"]])
+        writer.writerow([])
+        succeeded = sum(1 for result in results if result["ok"])
+        writer.writerow(["total", succeeded, "", "",
+                         "{:.3f}".format(elapsed), ""])
+
+
+def summary(results, elapsed):
+    succeeded = sum(1 for result in results if result["ok"])
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    return "{} of {} images processed in {:.2f} s ({:.1f} images/sec)".format(
+        succeeded, len(results), elapsed, rate)
+
+
+class BatchWorker(QThread):
+    """
+    Runs a batch from the GUI without blocking the event loop.
+    """
+    updateValueSignal = pyqtSignal(int)
+    updateTextSignal = pyqtSignal(str)
+    finishedSignal = pyqtSignal(str)
+
+    def __init__(self, source_dir, target_dir, operations):
+        super().__init__()
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.operations = operations
+
+    def run(self):
+        results = []
+        start = time.perf_counter()
+
+        try:
+            checkFolders(self.source_dir, self.target_dir)
+            files = findImages(self.source_dir)
+            for result in runBatch(files, self.target_dir, self.operations):
+                results.append(result)
+                self.updateValueSignal.emit(len(results) * 100 //
+                                            max(1, len(files)))
+                self.updateTextSignal.emit(
+                    "Processed {}".format(result["file"]))
+        except Exception as error:
+            # e.g. a worker process crashed; report it instead of leaving
+            # the GUI waiting for a batch that will never finish
+            self.finishedSignal.emit("Batch stopped: {}".format(error))
+            return
+
+        elapsed = time.perf_counter() - start
+        writeReport(os.path.join(self.target_dir, "batch_report.csv"),
+                    results, elapsed)
+        self.finishedSignal.emit(summary(results, elapsed))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description = "Apply photo editor operations to a folder of images.")
+    parser.add_argument("source", help = "folder of images to process")
+    parser.add_argument("target", help = "folder to write edited images to")
+    parser.add_argument("--ops", help = "JSON file of recorded operations")
+    parser.add_argument("--op", action = "append", default = [],
+                        help = "operation such as rotate:90, "
+                               "flip:horizontal, scale:0.5, blur:3 or "
+                               "brightness_contrast:20,10")
+    parser.add_argument("--pdf", action = "store_true",
+                        help = "export each image to a PDF file instead")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "number of worker processes")
+    args = parser.parse_args(argv)
+
+    try:
+        operations = loadOperations(args.ops) if args.ops else []
+        for operation in operations:
+            checkOperation(operation)
+        operations += [parseOperation(text) for text in args.op]
+        checkFolders(args.source, args.target)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    files = findImages(args.source)
+    results = []
+    start = time.perf_counter()
+
+    for result in runBatch(files, args.target, operations, args.workers,
+                           pdf = args.pdf):
+        results.append(result)
+        status = "ok" if result["ok"] else "FAILED: " + result["error"]
+        print("{:<40} {:>7.3f} s  {}".format(result["file"],
+                                             result["seconds"], status))
+
+    elapsed = time.perf_counter() - start
+    writeReport(os.path.join(args.target, "batch_report.csv"), results,
+                elapsed)
+    print(summary(results, elapsed))
+
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,189 @@
+"""
+Benchmark for the photo editor filters.
+Times the NumPy filters in image_filters.py on a 24 megapixel image and
+compares them with the same filters written with QImage.pixel() and
+QImage.setPixel(). The per-pixel versions take minutes on a full image,
+so by default they run on a strip of rows and the time is scaled up to
+the full image. Use --full-reference to run them on the whole image.
+The results of both versions on the strip are compared, and the largest
+difference is shown. A filter fails if it differs by more than 1, which
+allows for rounding.
+
+    python filters_benchmark.py
+    python filters_benchmark.py --width 6000 --height 4000 --full-reference
+"""
+# import necessary modules
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtGui import QColor, QImage, qRgb
+
+import image_filters
+from image_filters import BLUE, GREEN, RED, imageArray
+
+
+def createTestImage(width, height):
+    """
+    Create an image with gradients and noise, so that no filter can take
+    a shortcut on flat areas.
+    """
+    image = QImage(width, height, QImage.Format_RGB32)
+    pixels = imageArray(image)
+    rng = np.random.default_rng(0)
+
+    x = np.linspace(0, 255, width, dtype = np.float32)
+    y = np.linspace(0, 255, height, dtype = np.float32)[:, None]
+    noise = rng.integers(0, 32, (height, width), dtype = np.uint8)
+    pixels[..., RED] = (x + noise).clip(0, 255).astype(np.uint8)
+    pixels[..., GREEN] = (y + noise).clip(0, 255).astype(np.uint8)
+    pixels[..., BLUE] = ((x + y) / 2).astype(np.uint8)
+    pixels[..., 3] = 255
+
+    return image
+
+
+# Per-pixel reference versions of the filters
+def referenceBrightnessContrast(image, brightness, contrast):
+    result = image.copy()
+    factor = (100.0 + contrast) / 100.0
+
+    def adjust(value):
+        return int(min(255, max(0, (value - 128) * factor + 128 +
+                                brightness)))
+
+    for y in range(result.height()):
+        for x in range(result.width()):
+            color = QColor(result.pixel(x, y))
+            result.setPixel(x, y, qRgb(adjust(color.red()),
+                                       adjust(color.green()),
+                                       adjust(color.blue())))
+    return result
+
+
+def referenceGrayscale(image):
+    result = image.copy()
+
+    for y in range(result.height()):
+        for x in range(result.width()):
+            color = QColor(result.pixel(x, y))
+            luma = int(0.299 * color.red() + 0.587 * color.green() +
+                       0.114 * color.blue() + 0.5)
+            result.setPixel(x, y, qRgb(luma, luma, luma))
+    return result
+
+
+def referenceHistogram(image):
+    counts = [[0] * 256 for _ in range(3)]
+
+    for y in range(image.height()):
+        for x in range(image.width()):
+            color = QColor(image.pixel(x, y))
+            counts[0][color.red()] += 1
+            counts[1][color.green()] += 1
+            counts[2][color.blue()] += 1
+    return counts
+
+
+def referenceBlur(image, radius):
+    # A direct (not separable) 2D convolution, as a naive version would do
+    kernel = image_filters.gaussianKernel(radius)
+    result = image.copy()
+    width, height = image.width(), image.height()
+
+    for y in range(height):
+        for x in range(width):
+            red = green = blue = 0.0
+            for j, weight_y in enumerate(kernel):
+                sy = min(height - 1, max(0, y + j - radius))
+                for i, weight_x in enumerate(kernel):
+                    sx = min(width - 1, max(0, x + i - radius))
+                    color = QColor(image.pixel(sx, sy))
+                    weight = weight_x * weight_y
+                    red += color.red() * weight
+                    green += color.green() * weight
+                    blue += color.blue() * weight
+            result.setPixel(x, y, qRgb(int(red + 0.5), int(green + 0.5),
+                                       int(blue + 0.5)))
+    return result
+
+
+def timeCall(function, *args):
+    """
+    Return the time taken by function(*args), and its result.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def resultArray(result):
+    """
+    Return the result of a filter as an array of ints: the red, green
+    and blue values of an image, or the counts of a histogram.
+    """
+    if isinstance(result, QImage):
+        return imageArray(result, writable = False)[
+            ..., [RED, GREEN, BLUE]].astype(np.int64)
+    return np.asarray(result, np.int64)
+
+
+def largestDifference(result, expected):
+    return int(np.abs(resultArray(result) - resultArray(expected)).max())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark the filters.")
+    parser.add_argument("--width", type = int, default = 6000)
+    parser.add_argument("--height", type = int, default = 4000)
+    parser.add_argument("--sample-rows", type = int, default = 8,
+                        help = "rows used to time the per-pixel versions")
+    parser.add_argument("--full-reference", action = "store_true",
+                        help = "time the per-pixel versions on the full "
+                               "image (very slow)")
+    args = parser.parse_args(argv)
+
+    image = createTestImage(args.width, args.height)
+    if args.full_reference:
+        sample = image
+    else:
+        sample = image.copy(0, 0, args.width, args.sample_rows)
+    scale = image.height() / float(sample.height())
+
+    benchmarks = [
+        ("histogram", image_filters.histogram, referenceHistogram, ()),
+        ("brightness/contrast", image_filters.brightnessContrast,
+         referenceBrightnessContrast, (20, 15)),
+        ("grayscale", image_filters.grayscale, referenceGrayscale, ()),
+        ("gaussian blur r=3", image_filters.gaussianBlur, referenceBlur,
+         (3,)),
+    ]
+
+    print("Image: {} x {} ({:.1f} MP)".format(
+        image.width(), image.height(),
+        image.width() * image.height() / 1e6))
+    if not args.full_reference:
+        print("Per-pixel times measured on {} rows and scaled up".format(
+            sample.height()))
+    print()
+    print("{:<22} {:>12} {:>14} {:>10} {:>9}".format(
+        "filter", "numpy (s)", "per-pixel (s)", "speedup", "max diff"))
+
+    failures = 0
+    for name, function, reference, arguments in benchmarks:
+        fast = timeCall(function, image, *arguments)[0]
+        slow, expected = timeCall(reference, sample, *arguments)
+        slow *= scale
+        difference = largestDifference(function(sample, *arguments),
+                                       expected)
+        failures += difference > 1
+        print("{:<22} {:>12.3f} {:>14.1f} {:>9.0f}x {:>9}{}".format(
+            name, fast, slow, slow / fast, difference,
+            "" if difference <= 1 else "  FAILED"))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,217 @@
+"""
+Colour and tone filters for the photo editor.
+The filters work on the pixels of a QImage through a NumPy array that
+shares memory with the image (no copy is made), so each filter is a few
+vectorised array operations instead of a Python loop over every pixel.
+"""
+# import necessary modules
+import numpy as np
+from PyQt5.QtGui import QImage
+
+# Index of each channel in a Format_ARGB32 or Format_RGB32 pixel, which
+# is stored as 0xAARRGGBB, so the bytes are B, G, R, A on little-endian
+# machines.
+BLUE, GREEN, RED, ALPHA = (0, 1, 2, 3) if np.little_endian else (3, 2, 1, 0)
+
+# Rows blurred at a time by gaussianBlur()
+BLUR_BAND_ROWS = 64
+
+
+def imageArray(image, writable = True):
+    """
+    Return an array of shape (height, width, 4) that is a view of the
+    pixels of image. Writing to the array changes the image. The image
+    must be in Format_RGB32 or Format_ARGB32, see editableImage().
+    If writable is False, constBits() is used so that an image sharing
+    its data with another one isn't detached (copied).
+    """
+    ptr = image.bits() if writable else image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    array = np.frombuffer(ptr, np.uint8).reshape(image.height(),
+                                                 image.bytesPerLine())
+    # Rows can be padded, so drop any bytes past the last pixel
+    return array[:, :image.width() * 4].reshape(image.height(),
+                                                image.width(), 4)
+
+
+def editableImage(image):
+    """
+    Return a copy of image in a 32-bit format that imageArray() can use.
+    Filters edit the copy so the original image is left untouched.
+    """
+    if image.format() in (QImage.Format_RGB32, QImage.Format_ARGB32):
+        return image.copy()
+    return image.convertToFormat(QImage.Format_ARGB32)
+
+
+def applyLookupTable(image, table):
+    """
+    Map the red, green and blue values of every pixel through table,
+    an array of 256 values.
+    """
+    result = editableImage(image)
+    pixels = imageArray(result)
+    table = np.clip(table, 0, 255).astype(np.uint8)
+
+    for channel in (RED, GREEN, BLUE):
+        pixels[..., channel] = table[pixels[..., channel]]
+
+    return result
+
+
+def histogram(image):
+    """
+    Return an array of shape (3, 256) with the number of pixels for each
+    red, green and blue value.
+    """
+    if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32):
+        image = image.convertToFormat(QImage.Format_ARGB32)
+    pixels = imageArray(image, writable = False)
+    return np.stack([np.bincount(pixels[..., channel].ravel(),
+                                 minlength = 256)
+                     for channel in (RED, GREEN, BLUE)])
+
+
+def brightnessContrast(image, brightness, contrast):
+    """
+    Adjust brightness (-255 to 255) and contrast (-100 to 100).
+    """
+    factor = (100.0 + contrast) / 100.0
+    values = np.arange(256, dtype = np.float32)
+    table = (values - 128.0) * factor + 128.0 + brightness
+
+    return applyLookupTable(image, table)
+
+
+def levels(image, black, white, gamma = 1.0):
+    """
+    Stretch the values between black and white to the full 0-255 range,
+    applying gamma to the midtones.
+    """
+    white = max(white, black + 1)
+    values = np.arange(256, dtype = np.float32)
+    normalized = np.clip((values - black) / float(white - black), 0.0, 1.0)
+    table = 255.0 * normalized ** (1.0 / gamma)
+
+    return applyLookupTable(image, table)
+
+
+def autoLevelsOperation(image, clip = 0.005):
+    """
+    Return the levels operation that auto levels would apply to image.
+    The darkest and brightest clip fraction of pixels are clipped.
+    """
+    counts = histogram(image).sum(axis = 0)
+    cumulative = np.cumsum(counts) / float(counts.sum())
+    black = int(np.searchsorted(cumulative, clip))
+    white = int(np.searchsorted(cumulative, 1.0 - clip))
+
+    return ("levels", black, white, 1.0)
+
+
+def autoLevels(image, clip = 0.005):
+    """
+    Stretch the image so that it uses the full range of values.
+    """
+    return levels(image, *autoLevelsOperation(image, clip)[1:])
+
+
+def grayscale(image):
+    """
+    Convert the image to shades of gray using the luma of each pixel.
+    """
+    result = editableImage(image)
+    pixels = imageArray(result)
+
+    luma = (pixels[..., RED] * np.float32(0.299) +
+            pixels[..., GREEN] * np.float32(0.587) +
+            pixels[..., BLUE] * np.float32(0.114))
+    luma = (luma + 0.5).astype(np.uint8)
+    for channel in (RED, GREEN, BLUE):
+        pixels[..., channel] = luma
+
+    return result
+
+
+def gaussianKernel(radius):
+    """
+    Return a normalized 1D gaussian kernel covering +/- radius pixels.
+    """
+    sigma = max(radius / 2.0, 0.5)
+    offsets = np.arange(-radius, radius + 1, dtype = np.float32)
+    kernel = np.exp(-(offsets ** 2) / (2.0 * sigma ** 2))
+    return kernel / kernel.sum()
+
+
+def blurAxis(pixels, kernel, axis):
+    """
+    Convolve pixels with kernel along one axis, repeating the edge pixels.
+    Each tap of the kernel is one vectorised multiply-add of the array.
+    """
+    radius = len(kernel) // 2
+    padding = [(0, 0)] * pixels.ndim
+    padding[axis] = (radius, radius)
+    padded = np.pad(pixels, padding, mode = "edge")
+
+    result = np.zeros(pixels.shape, np.float32)
+    length = pixels.shape[axis]
+    window = [slice(None)] * pixels.ndim
+    for tap, weight in enumerate(kernel):
+        window[axis] = slice(tap, tap + length)
+        result += weight * padded[tuple(window)]
+    return result
+
+
+def gaussianBlur(image, radius):
+    """
+    Blur the image with a gaussian of the given radius. The 2D kernel is
+    separable, so it is applied as a horizontal pass then a vertical pass,
+    which takes 2 * (2r + 1) operations per pixel instead of (2r + 1)^2.
+    The image is blurred in place a band of rows at a time, so only a
+    band is ever held as floats. The horizontal pass of the rows that
+    the next band shares with this one is kept, since this band's
+    result is written over them.
+    """
+    result = editableImage(image)
+    radius = int(radius)
+    if radius < 1:
+        return result
+
+    pixels = imageArray(result)
+    kernel = gaussianKernel(radius)
+    height = pixels.shape[0]
+
+    def blurRows(start, stop):
+        # Rows past the edges repeat the first or last row
+        rows = np.clip(np.arange(start, stop), 0, height - 1)
+        return blurAxis(pixels[rows].astype(np.float32), kernel, 1)
+
+    shared = blurRows(-radius, radius)
+    for top in range(0, height, BLUR_BAND_ROWS):
+        bottom = min(height, top + BLUR_BAND_ROWS)
+        # The rows from top - radius to bottom + radius, blurred across
+        band = np.concatenate([shared, blurRows(top + radius,
+                                                bottom + radius)])
+        shared = band[-2 * radius:]
+
+        blurred = np.zeros((bottom - top,) + band.shape[1:], np.float32)
+        for tap, weight in enumerate(kernel):
+            blurred += weight * band[tap:tap + bottom - top]
+        pixels[top:bottom] = np.clip(blurred + 0.5, 0, 255).astype(np.uint8)
+
+    return result
+
+
+# Filters that can be used as photo editor operations, for example
+# ("brightness_contrast", 20, 10) or ("blur", 3)
+FILTERS = {
+    "brightness_contrast": brightnessContrast,
+    "levels": levels,
+    "auto_levels": autoLevels,
+    "grayscale": grayscale,
+    "blur": gaussianBlur,
+}
+
+# Filters that change each pixel on its own, so they can be applied to
+# every level of a preview pyramid instead of rebuilding it
+POINT_FILTERS = ("brightness_contrast", "levels", "grayscale")
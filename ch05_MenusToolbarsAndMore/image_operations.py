@@ -0,0 +1,91 @@
+"""
+Image editing operations shared by the photo editor GUI and its
+background workers. Edits are described by tuples so that they can be
+queued, recorded and replayed.
+"""
+# import necessary modules
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImageReader, QTransform
+
+from image_filters import FILTERS
+
+# File extensions of the images the editor and batch processing open
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+# The number of required and optional numbers each operation takes.
+# "flip" takes "horizontal" or "vertical" instead.
+OPERATION_ARGUMENTS = {
+    "rotate": (1, 0),
+    "scale": (1, 0),
+    "brightness_contrast": (2, 0),
+    "levels": (2, 1),
+    "auto_levels": (0, 1),
+    "grayscale": (0, 0),
+    "blur": (1, 0)
+}
+
+
+def applyOperation(image, operation):
+    """
+    Return a new QImage with the operation applied to image.
+    Operations are tuples, for example ("rotate", 90),
+    ("flip", "horizontal"), ("scale", 0.5) or one of the filters in
+    image_filters, such as ("blur", 3).
+    """
+    name = operation[0]
+
+    if name == "rotate":
+        transform = QTransform().rotate(operation[1])
+        return image.transformed(transform, Qt.SmoothTransformation)
+    elif name == "flip":
+        # Mirror across the horizontal or vertical axis
+        if operation[1] == "horizontal":
+            return image.mirrored(True, False)
+        else:
+            return image.mirrored(False, True)
+    elif name == "scale":
+        width = max(1, int(image.width() * operation[1]))
+        height = max(1, int(image.height() * operation[1]))
+        return image.scaled(width, height, Qt.IgnoreAspectRatio,
+                            Qt.SmoothTransformation)
+    elif name in FILTERS:
+        return FILTERS[name](image, *operation[1:])
+    else:
+        raise ValueError("Unknown image operation: {}".format(name))
+
+
+def checkOperation(operation):
+    """
+    Raise ValueError if operation isn't one that applyOperation can
+    apply, so that mistakes are found before any images are edited.
+    """
+    if not operation:
+        raise ValueError("Empty image operation")
+    name, arguments = operation[0], operation[1:]
+    if name == "flip":
+        valid = (len(arguments) == 1 and
+                 arguments[0] in ("horizontal", "vertical"))
+    elif name in OPERATION_ARGUMENTS:
+        required, optional = OPERATION_ARGUMENTS[name]
+        valid = (required <= len(arguments) <= required + optional and
+                 all(isinstance(value, (int, float)) and
+                     not isinstance(value, bool) for value in arguments))
+    else:
+        raise ValueError("Unknown image operation: {}".format(name))
+
+    if not valid:
+        raise ValueError("Invalid arguments for {}: {}".format(
+            name, ",".join(str(value) for value in arguments)))
+
+
+def loadImage(file_name):
+    """
+    Decode an image file into a QImage. Returns a null QImage and the
+    error string if the file can't be read.
+    """
+    reader = QImageReader(file_name)
+    # Apply the EXIF orientation of photos taken with cameras and phones
+    reader.setAutoTransform(True)
+    image = reader.read()
+
+    return image, reader.errorString()
@@ -0,0 +1,74 @@
+"""
+Printing and PDF export for the photo editor.
+The full size image is drawn to the printer in horizontal bands, so the
+paint engine only ever converts one band at a time and memory stays
+bounded even for poster sized output.
+"""
+# import necessary modules
+import os
+
+from PyQt5.QtCore import QRect, QSize, QSizeF, Qt
+from PyQt5.QtGui import QGuiApplication, QPageSize, QPainter
+from PyQt5.QtPrintSupport import QPrinter
+
+# Height in pixels of each band of the image sent to the printer
+BAND_HEIGHT = 256
+
+
+def renderImage(printer, image, band_height = BAND_HEIGHT):
+    """
+    Draw image onto printer, scaled to fit the page and keeping its
+    aspect ratio. Returns False if the printer couldn't be opened.
+    """
+    painter = QPainter()
+    if not painter.begin(printer):
+        return False
+
+    # Fit the image inside the viewport, in the same way as when
+    # printing the label's pixmap
+    rect = QRect(painter.viewport())
+    size = QSize(image.size())
+    size.scale(rect.size(), Qt.KeepAspectRatio)
+    painter.setViewport(rect.x(), rect.y(), size.width(), size.height())
+    painter.setWindow(image.rect())
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+    for y in range(0, image.height(), band_height):
+        height = min(band_height, image.height() - y)
+        # copy() shares nothing with the full image, so only this band
+        # is converted by the paint engine
+        band = image.copy(0, y, image.width(), height)
+        painter.drawImage(0, y, band)
+
+    painter.end()
+    return True
+
+
+def exportPdf(image, file_name, resolution = 300):
+    """
+    Write image to a PDF file without showing any dialogs. The page is
+    sized to the image at the given resolution, so nothing is scaled down.
+    """
+    ensureGuiApplication()
+
+    printer = QPrinter(QPrinter.HighResolution)
+    printer.setOutputFormat(QPrinter.PdfFormat)
+    printer.setOutputFileName(file_name)
+    printer.setResolution(resolution)
+    printer.setFullPage(True)
+    page_size = QSizeF(image.width() * 25.4 / resolution,
+                       image.height() * 25.4 / resolution)
+    printer.setPageSize(QPageSize(page_size, QPageSize.Millimeter))
+
+    return renderImage(printer, image)
+
+
+def ensureGuiApplication():
+    """
+    QPrinter needs a QGuiApplication. When there is none, for example in
+    the batch worker processes, create one that doesn't need a display.
+    """
+    if QGuiApplication.instance() is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # Keep a reference so the application isn't deleted
+        ensureGuiApplication.app = QGuiApplication([])
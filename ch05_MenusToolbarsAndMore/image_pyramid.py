@@ -0,0 +1,158 @@
+"""
+Preview pyramid (mipmap) for the photo editor GUI.
+The pyramid holds the full size image plus copies that are each half the
+size of the one before. Scaling for display starts from the smallest copy
+that is still larger than the label, instead of the full size image.
+"""
+# import necessary modules
+import threading
+
+from PyQt5.QtCore import QSize, Qt
+
+from image_filters import POINT_FILTERS, autoLevelsOperation
+from image_operations import applyOperation
+
+# Memory that the downsampled levels are allowed to use, in bytes.
+# The full size image is not counted, since it can't be evicted.
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+class ImagePyramid:
+    """
+    Level 0 is the full size image and level n is 1/2^n of its size. Levels
+    are built once per image and updated along with the edits made to the
+    image. Levels other than 0 can be evicted to stay within the memory
+    budget, and are rebuilt from the nearest larger level when needed.
+    """
+
+    def __init__(self, image, levels = None, min_size = 64,
+                 memory_budget = DEFAULT_MEMORY_BUDGET):
+        self.min_size = min_size
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+
+        if levels is None:
+            levels = [image]
+            # Keep halving until the image is small enough
+            while min(levels[-1].width(), levels[-1].height()) > min_size * 2:
+                levels.append(self.downsample(levels[-1]))
+        self.levels = levels
+
+        # Number of times each level was used, for evicting the least
+        # recently used levels first
+        self.clock = 0
+        self.last_used = [0] * len(levels)
+
+        self.trim()
+
+    @staticmethod
+    def downsample(image):
+        return image.scaled(max(1, image.width() // 2),
+                            max(1, image.height() // 2),
+                            Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+    def image(self):
+        """
+        Return the full size image.
+        """
+        return self.levels[0]
+
+    def level(self, index):
+        """
+        Return the image at level index, rebuilding it if it was evicted.
+        """
+        with self.lock:
+            if self.levels[index] is None:
+                # Find the nearest larger level that is still available
+                source = index - 1
+                while self.levels[source] is None:
+                    source -= 1
+                for i in range(source + 1, index + 1):
+                    self.levels[i] = self.downsample(self.levels[i - 1])
+
+            self.clock += 1
+            self.last_used[index] = self.clock
+            image = self.levels[index]
+
+        self.trim()
+        return image
+
+    def levelFor(self, size):
+        """
+        Return the index of the smallest level that can be scaled to fit
+        inside size without being scaled up.
+        """
+        full = self.levels[0].size()
+        target = full.scaled(size, Qt.KeepAspectRatio)
+
+        for index in range(len(self.levels) - 1, 0, -1):
+            width = max(1, full.width() >> index)
+            height = max(1, full.height() >> index)
+            if width >= target.width() and height >= target.height():
+                return index
+        return 0
+
+    def scaledTo(self, size):
+        """
+        Scale the image to fit inside size, starting from the nearest level.
+        """
+        image = self.level(self.levelFor(size))
+        return image.scaled(QSize(size), Qt.KeepAspectRatio,
+                            Qt.SmoothTransformation)
+
+    def transformed(self, operation):
+        """
+        Return a new pyramid with operation applied. Rotating, flipping and
+        filters that change each pixel on its own are applied to each level
+        that is available, and halving the size
+        reuses level 1 as the new full size image, so the pyramid doesn't
+        have to be rebuilt from scratch.
+        """
+        name = operation[0]
+
+        if name == "auto_levels":
+            # Work out the levels from the full size image, so that every
+            # level is stretched by the same amount
+            operation = autoLevelsOperation(self.levels[0])
+            name = operation[0]
+
+        if name == "scale" and operation[1] == 0.5 and len(self.levels) > 1:
+            levels = [self.level(1)] + self.levels[2:]
+        elif (name == "flip" or name in POINT_FILTERS or
+              (name == "rotate" and operation[1] % 90 == 0)):
+            levels = [None if level is None else
+                      applyOperation(level, operation)
+                      for level in self.levels]
+        else:
+            return ImagePyramid(applyOperation(self.levels[0], operation),
+                                min_size = self.min_size,
+                                memory_budget = self.memory_budget)
+
+        return ImagePyramid(levels[0], levels, self.min_size,
+                            self.memory_budget)
+
+    def byteCount(self):
+        """
+        Return the memory used by the levels that can be evicted.
+        """
+        return sum(level.sizeInBytes() for level in self.levels[1:]
+                   if level is not None)
+
+    def trim(self, memory_budget = None):
+        """
+        Evict the least recently used levels until the pyramid fits
+        within the memory budget.
+        """
+        if memory_budget is not None:
+            self.memory_budget = memory_budget
+
+        with self.lock:
+            used = self.byteCount()
+            candidates = sorted(range(1, len(self.levels)),
+                                key = lambda i: self.last_used[i])
+            for index in candidates:
+                if used <= self.memory_budget:
+                    break
+                if self.levels[index] is not None:
+                    used -= self.levels[index].sizeInBytes()
+                    self.levels[index] = None
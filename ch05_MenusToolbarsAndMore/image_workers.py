@@ -0,0 +1,221 @@
+"""
+Background image processing for the photo editor GUI.
+QPixmap can only be used in the GUI thread, but QImage is safe to use in
+other threads. Decoding, transforming, scaling and encoding are handled by
+QRunnable tasks that run in a QThreadPool, and the results are sent back
+to the GUI thread using signals.
+"""
+# import necessary modules
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from image_operations import applyOperation, loadImage
+from image_pyramid import ImagePyramid
+
+
+class ImageTaskSignals(QObject):
+    """
+    QRunnable does not inherit QObject, so the signals for a task
+    are defined in a separate class.
+    """
+    progress = pyqtSignal(int, int)  # job id, percent complete
+    # job id, ImagePyramid (or QImage for save jobs), display image
+    finished = pyqtSignal(int, object, QImage)
+    saved = pyqtSignal(int, str)  # job id, file name
+    failed = pyqtSignal(int, str)  # job id, error message
+    done = pyqtSignal(int)  # job id, emitted when the task stops running
+
+
+class ImageTask(QRunnable):
+    """
+    Runs one job: decode (if source is a file name), apply each operation,
+    scale a copy for display and optionally encode the result to a file.
+    The source can be a file name, a QImage or an ImagePyramid.
+    The task checks if it has been cancelled between each stage.
+    """
+
+    def __init__(self, job_id, source, operations, display_size = QSize(),
+                 save_file = None):
+        super().__init__()
+        self.job_id = job_id
+        self.source = source
+        self.operations = list(operations)
+        self.display_size = QSize(display_size)
+        self.save_file = save_file
+
+        self.signals = ImageTaskSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask the task to stop. The current stage is allowed to finish,
+        but no further stages are run and no result is emitted.
+        """
+        self.cancelled = True
+
+    def run(self):
+        """
+        The task begins running from here once the pool starts it.
+        """
+        try:
+            self.process()
+        finally:
+            self.signals.done.emit(self.job_id)
+
+    def process(self):
+        # One stage for loading, one per operation, plus display and save
+        stages = 2 + len(self.operations) + (1 if self.save_file else 0)
+        done = 0
+
+        if self.cancelled:
+            return
+
+        if isinstance(self.source, ImagePyramid):
+            pyramid = self.source
+            image = pyramid.image()
+        elif isinstance(self.source, QImage):
+            pyramid = None
+            image = self.source
+        else:
+            pyramid = None
+            image, error = loadImage(self.source)
+            if image.isNull():
+                self.signals.failed.emit(self.job_id, error)
+                return
+        done += 1
+        self.signals.progress.emit(self.job_id, done * 100 // stages)
+
+        # Only jobs that are displayed need a pyramid. It is built once
+        # when the image is loaded and updated along with each edit.
+        if self.display_size.isValid() and pyramid is None:
+            pyramid = ImagePyramid(image)
+
+        for operation in self.operations:
+            if self.cancelled:
+                return
+            if self.display_size.isValid():
+                pyramid = pyramid.transformed(operation)
+                image = pyramid.image()
+            else:
+                image = applyOperation(image, operation)
+            done += 1
+            self.signals.progress.emit(self.job_id, done * 100 // stages)
+
+        if self.cancelled:
+            return
+
+        display = QImage()
+        if self.display_size.isValid():
+            display = pyramid.scaledTo(self.display_size)
+        done += 1
+        self.signals.progress.emit(self.job_id, done * 100 // stages)
+
+        if self.save_file:
+            if self.cancelled:
+                return
+            if not image.save(self.save_file):
+                self.signals.failed.emit(self.job_id,
+                                         "Unable to save image.")
+                return
+            self.signals.saved.emit(self.job_id, self.save_file)
+
+        self.signals.finished.emit(self.job_id, pyramid or image, display)
+
+
+class ImageProcessor(QObject):
+    """
+    Hands jobs to a thread pool and relays their results to the GUI.
+    Submitting a new job cancels the one in flight, and only the results
+    of the newest job are passed on. Save jobs run independently so they
+    are never superseded by later edits.
+    """
+    imageReady = pyqtSignal(object, QImage)  # ImagePyramid, display image
+    imageSaved = pyqtSignal(str)
+    progressChanged = pyqtSignal(int)
+    busyChanged = pyqtSignal(bool)
+    errorOccurred = pyqtSignal(str)
+    # Emitted when the job in flight fails, after errorOccurred
+    jobFailed = pyqtSignal()
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+
+        self.next_job_id = 0
+        self.current_task = None
+        # Keep references to running tasks so Python doesn't delete them
+        self.running = {}
+        self.save_jobs = set()
+
+    def submit(self, source, operations, display_size):
+        """
+        Start a new job that replaces the job currently in flight.
+        """
+        self.cancel()
+        task = self.createTask(source, operations, display_size)
+        self.current_task = task
+        self.busyChanged.emit(True)
+        self.pool.start(task)
+
+    def save(self, source, operations, file_name):
+        """
+        Encode the image to file_name in the background.
+        """
+        task = self.createTask(source, operations, QSize(), file_name)
+        self.save_jobs.add(task.job_id)
+        self.pool.start(task)
+
+    def cancel(self):
+        """
+        Cancel the job in flight, if there is one.
+        """
+        if self.current_task is not None:
+            self.current_task.cancel()
+            self.current_task = None
+            self.busyChanged.emit(False)
+
+    def createTask(self, source, operations, display_size, save_file = None):
+        self.next_job_id += 1
+        task = ImageTask(self.next_job_id, source, operations, display_size,
+                         save_file)
+        task.setAutoDelete(False)
+        task.signals.progress.connect(self.onProgress)
+        task.signals.finished.connect(self.onFinished)
+        task.signals.saved.connect(self.onSaved)
+        task.signals.failed.connect(self.onFailed)
+        task.signals.done.connect(self.onDone)
+        self.running[task.job_id] = task
+
+        return task
+
+    def isCurrent(self, job_id):
+        return (self.current_task is not None and
+                self.current_task.job_id == job_id)
+
+    def onProgress(self, job_id, percent):
+        if self.isCurrent(job_id):
+            self.progressChanged.emit(percent)
+
+    def onFinished(self, job_id, image, display):
+        if self.isCurrent(job_id):
+            self.current_task = None
+            self.busyChanged.emit(False)
+            self.imageReady.emit(image, display)
+
+    def onSaved(self, job_id, file_name):
+        self.imageSaved.emit(file_name)
+
+    def onFailed(self, job_id, message):
+        # Errors from save jobs are always reported
+        if job_id in self.save_jobs:
+            self.errorOccurred.emit(message)
+        elif self.isCurrent(job_id):
+            self.current_task = None
+            self.busyChanged.emit(False)
+            self.errorOccurred.emit(message)
+            self.jobFailed.emit()
+
+    def onDone(self, job_id):
+        # The task has stopped running, so it is safe to release it
+        self.running.pop(job_id, None)
+        self.save_jobs.discard(job_id)
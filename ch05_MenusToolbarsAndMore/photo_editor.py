@@ -4,15 +4,66 @@ written by Joshua Willman
 Featured in "Beginning Pyqt - A Hands-on Approach to GUI Programming"
 """
 # import necessary modules
+import os
 import sys
 
-from PyQt5.QtCore import QRect, QSize, Qt
-from PyQt5.QtGui import QIcon, QPainter, QPixmap, QTransform
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import (QColor, QIcon, QImage, QPainter, QPainterPath,
+                         QPixmap)
 from PyQt5.QtPrintSupport import QPrintDialog, QPrinter
 from PyQt5.QtWidgets import (QAction, QApplication, QDesktopWidget,
-                             QDockWidget, QFileDialog, QLabel, QMainWindow,
-                             QMessageBox, QPushButton, QSizePolicy, QStatusBar,
-                             QToolBar, QVBoxLayout, QWidget)
+                             QDockWidget, QFileDialog, QLabel, QListView,
+                             QMainWindow, QMessageBox, QProgressBar,
+                             QPushButton, QSizePolicy, QSlider, QSpinBox,
+                             QStatusBar, QToolBar, QVBoxLayout, QWidget)
+
+from batch_process import BatchWorker, checkFolders, saveOperations
+from image_filters import histogram
+from image_printing import exportPdf, renderImage
+from image_workers import ImageProcessor
+from thumbnail_cache import THUMBNAIL_SIZE, ThumbnailModel
+
+
+class HistogramWidget(QWidget):
+    """
+    Displays the red, green and blue histograms of an image.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setMinimumSize(130, 80)
+        self.counts = None
+
+    def setHistogram(self, counts):
+        """
+        counts is an array of shape (3, 256), or None to clear the display.
+        """
+        self.counts = counts
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+
+        if self.counts is not None and self.counts.max() > 0:
+            painter.setRenderHint(QPainter.Antialiasing)
+            width, height = self.width(), self.height()
+            peak = float(self.counts.max())
+
+            for counts, color in zip(self.counts, ("#E00C0C", "#12A708",
+                                                   "#2041F1")):
+                path = QPainterPath()
+                path.moveTo(0, height)
+                for value, count in enumerate(counts):
+                    path.lineTo(value * width / 255.0,
+                                height - count / peak * height)
+                path.lineTo(width, height)
+                painter.setPen(QColor(color))
+                painter.drawPath(path)
+
+        painter.setPen(Qt.gray)
+        painter.drawRect(self.rect().adjusted(0, 0, -1, -1))
+        painter.end()
 
 
 class PhotoEditor(QMainWindow):
@@ -30,6 +81,8 @@ class PhotoEditor(QMainWindow):
         self.setWindowTitle('5.2 - Photo Editor GUI')
         self.centerMainWindow()
         self.createToolsDockWidget()
+        self.createFiltersDockWidget()
+        self.createBrowserDockWidget()
         self.createMenu()
         self.createToolBar()
         self.photoEditorWidgets()
@@ -51,12 +104,32 @@ class PhotoEditor(QMainWindow):
         self.save_act.setStatusTip('Save image')
         self.save_act.triggered.connect(self.saveImage)
 
+        self.open_folder_act = QAction("Open Folder...", self)
+        self.open_folder_act.setShortcut('Ctrl+Shift+O')
+        self.open_folder_act.setStatusTip('Browse the images in a folder')
+        self.open_folder_act.triggered.connect(self.openFolder)
+
         self.print_act = QAction(QIcon('images/print.png'), "Print", self)
         self.print_act.setShortcut('Ctrl+P')
         self.print_act.setStatusTip('Print image')
         self.print_act.triggered.connect(self.printImage)
         self.print_act.setEnabled(False)
 
+        self.pdf_act = QAction("Export PDF...", self)
+        self.pdf_act.setStatusTip('Export image to a PDF file')
+        self.pdf_act.triggered.connect(self.exportPdf)
+        self.pdf_act.setEnabled(False)
+
+        self.batch_act = QAction("Batch Process...", self)
+        self.batch_act.setStatusTip('Apply the edits made to this image to '
+                                    'a folder of images')
+        self.batch_act.triggered.connect(self.batchProcess)
+
+        self.save_ops_act = QAction("Save Edits...", self)
+        self.save_ops_act.setStatusTip('Save the edits made to this image '
+                                       'for batch processing')
+        self.save_ops_act.triggered.connect(self.saveOperations)
+
         self.exit_act = QAction(QIcon('images/exit.png'), 'Exit', self)
         self.exit_act.setShortcut('Ctrl+Q')
         self.exit_act.setStatusTip('Quit program')
@@ -96,9 +169,14 @@ class PhotoEditor(QMainWindow):
         # Create file menu and add actions
         file_menu = menu_bar.addMenu('File')
         file_menu.addAction(self.open_act)
+        file_menu.addAction(self.open_folder_act)
         file_menu.addAction(self.save_act)
         file_menu.addSeparator()
         file_menu.addAction(self.print_act)
+        file_menu.addAction(self.pdf_act)
+        file_menu.addSeparator()
+        file_menu.addAction(self.save_ops_act)
+        file_menu.addAction(self.batch_act)
         file_menu.addSeparator()
         file_menu.addAction(self.exit_act)
 
@@ -117,10 +195,27 @@ class PhotoEditor(QMainWindow):
         # Create view menu and add actions
         view_menu = menu_bar.addMenu('View')
         view_menu.addAction(self.toggle_dock_tools_act)
+        view_menu.addAction(self.toggle_dock_filters_act)
+        view_menu.addAction(self.toggle_dock_browser_act)
 
         # Display info about tools, menu, and view in the statusbar
         self.setStatusBar(QStatusBar(self))
 
+        # Progress bar shown in the statusbar while images are processed
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(150)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
+        # A batch has its own progress bar, since it runs alongside edits
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setMaximumWidth(150)
+        self.batch_progress_bar.setRange(0, 100)
+        self.batch_progress_bar.setFormat("Batch %p%")
+        self.batch_progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.batch_progress_bar)
+
     def createToolBar(self):
         """
         Create toolbar for photo editor GUI
@@ -199,11 +294,132 @@ class PhotoEditor(QMainWindow):
         # handles the visibility of the dock widget
         self.toggle_dock_tools_act = self.dock_tools_view.toggleViewAction()
 
+    def createFiltersDockWidget(self):
+        """
+        Set up the dock widget with the histogram and the colour filters.
+        It shares the same area as the tools dock, using tabs.
+        """
+        self.dock_filters_view = QDockWidget()
+        self.dock_filters_view.setWindowTitle("Filters")
+        self.dock_filters_view.setAllowedAreas(Qt.LeftDockWidgetArea |
+                                               Qt.RightDockWidgetArea)
+
+        self.filters_contents = QWidget()
+
+        self.histogram = HistogramWidget()
+
+        # Sliders for brightness and contrast. The edit is made when the
+        # Apply button is clicked.
+        self.brightness_slider = QSlider(Qt.Horizontal)
+        self.brightness_slider.setRange(-100, 100)
+        self.brightness_slider.setStatusTip('Adjust the brightness')
+
+        self.contrast_slider = QSlider(Qt.Horizontal)
+        self.contrast_slider.setRange(-100, 100)
+        self.contrast_slider.setStatusTip('Adjust the contrast')
+
+        self.apply_bc = QPushButton("Apply")
+        self.apply_bc.setStatusTip('Apply brightness and contrast')
+        self.apply_bc.clicked.connect(self.adjustBrightnessContrast)
+
+        self.auto_levels = QPushButton("Auto Levels")
+        self.auto_levels.setMinimumSize(QSize(130, 40))
+        self.auto_levels.setStatusTip('Stretch the image to use the full '
+                                      'range of values')
+        self.auto_levels.clicked.connect(
+            lambda: self.editImage(("auto_levels",)))
+
+        self.grayscale = QPushButton("Grayscale")
+        self.grayscale.setMinimumSize(QSize(130, 40))
+        self.grayscale.setStatusTip('Convert the image to grayscale')
+        self.grayscale.clicked.connect(lambda: self.editImage(("grayscale",)))
+
+        self.blur = QPushButton("Blur")
+        self.blur.setMinimumSize(QSize(130, 40))
+        self.blur.setStatusTip('Apply a gaussian blur')
+        self.blur.clicked.connect(self.blurImage)
+
+        self.blur_radius = QSpinBox()
+        self.blur_radius.setRange(1, 25)
+        self.blur_radius.setValue(3)
+        self.blur_radius.setPrefix("Radius: ")
+
+        dock_v_box = QVBoxLayout()
+        dock_v_box.addWidget(self.histogram)
+        dock_v_box.addWidget(QLabel("Brightness"))
+        dock_v_box.addWidget(self.brightness_slider)
+        dock_v_box.addWidget(QLabel("Contrast"))
+        dock_v_box.addWidget(self.contrast_slider)
+        dock_v_box.addWidget(self.apply_bc)
+        dock_v_box.addStretch(1)
+        dock_v_box.addWidget(self.auto_levels)
+        dock_v_box.addWidget(self.grayscale)
+        dock_v_box.addStretch(1)
+        dock_v_box.addWidget(self.blur_radius)
+        dock_v_box.addWidget(self.blur)
+        dock_v_box.addStretch(6)
+
+        self.filters_contents.setLayout(dock_v_box)
+        self.dock_filters_view.setWidget(self.filters_contents)
+
+        self.addDockWidget(Qt.RightDockWidgetArea, self.dock_filters_view)
+        self.tabifyDockWidget(self.dock_tools_view, self.dock_filters_view)
+        self.dock_tools_view.raise_()
+
+        self.toggle_dock_filters_act = \
+            self.dock_filters_view.toggleViewAction()
+
+    def createBrowserDockWidget(self):
+        """
+        Set up the dock widget with a strip of thumbnails of the images in
+        a folder. Clicking a thumbnail opens the image.
+        """
+        self.dock_browser_view = QDockWidget()
+        self.dock_browser_view.setWindowTitle("Browse")
+        self.dock_browser_view.setAllowedAreas(Qt.TopDockWidgetArea |
+                                               Qt.BottomDockWidgetArea)
+
+        self.thumbnail_model = ThumbnailModel(parent = self)
+
+        self.thumbnail_view = QListView()
+        self.thumbnail_view.setModel(self.thumbnail_model)
+        self.thumbnail_view.setViewMode(QListView.IconMode)
+        self.thumbnail_view.setFlow(QListView.LeftToRight)
+        self.thumbnail_view.setWrapping(False)
+        self.thumbnail_view.setIconSize(THUMBNAIL_SIZE)
+        self.thumbnail_view.setFixedHeight(THUMBNAIL_SIZE.height() + 30)
+        # Every item is the same size, so the view doesn't need to ask
+        # the model for the size of each of the items in the folder
+        self.thumbnail_view.setUniformItemSizes(True)
+        self.thumbnail_view.setLayoutMode(QListView.Batched)
+        self.thumbnail_view.setMovement(QListView.Static)
+        self.thumbnail_view.clicked.connect(self.openThumbnail)
+
+        self.dock_browser_view.setWidget(self.thumbnail_view)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.dock_browser_view)
+
+        self.toggle_dock_browser_act = \
+            self.dock_browser_view.toggleViewAction()
+
     def photoEditorWidgets(self):
         """
         Set up instances of widgets for photo editor GUI
         """
-        self.image = QPixmap()
+        self.image = QImage()
+        # The source and edits of the job in flight. Once the job
+        # finishes, the source is replaced by the result.
+        self.pending_source = None
+        self.pending_operations = []
+        # Every edit made since the image was opened, for batch processing
+        self.operation_log = []
+
+        # Decoding, editing and saving run in a thread pool
+        self.processor = ImageProcessor(self)
+        self.processor.imageReady.connect(self.displayImage)
+        self.processor.progressChanged.connect(self.progress_bar.setValue)
+        self.processor.busyChanged.connect(self.showProgress)
+        self.processor.errorOccurred.connect(self.showError)
+        self.processor.jobFailed.connect(self.jobFailed)
 
         self.image_label = QLabel()
         self.image_label.setAlignment(Qt.AlignCenter)
@@ -228,16 +444,36 @@ class PhotoEditor(QMainWindow):
                 GIF Files (*.gif)")
 
         if image_file:
-            self.image = QPixmap(image_file)
-
-            self.image_label.setPixmap(
-                self.image.scaled(self.image_label.size(),
-                                  Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.loadImageFile(image_file)
         else:
             QMessageBox.information(self, "Error",
                                     "Unable to open image.", QMessageBox.Ok)
 
-        self.print_act.setEnabled(True)
+    def loadImageFile(self, image_file):
+        """
+        Decode the image in the background. Any edits made before
+        the image has loaded are applied once it is ready.
+        """
+        self.pending_source = image_file
+        self.pending_operations = []
+        self.operation_log = []
+        self.processor.submit(image_file, [], self.image_label.size())
+
+    def openFolder(self):
+        """
+        Choose a folder to show in the thumbnail strip.
+        """
+        directory = QFileDialog.getExistingDirectory(self, "Open Folder")
+        if directory:
+            self.thumbnail_model.setDirectory(directory)
+            self.dock_browser_view.setWindowTitle(
+                "Browse - {}".format(os.path.basename(directory)))
+
+    def openThumbnail(self, index):
+        """
+        Open the image whose thumbnail was clicked.
+        """
+        self.loadImageFile(index.data(Qt.UserRole))
 
     def saveImage(self):
         """
@@ -251,8 +487,10 @@ class PhotoEditor(QMainWindow):
                                                         "Files (*.bmp);;\
                 GIF Files (*.gif)")
 
-        if image_file and self.image.isNull() == False:
-            self.image.save(image_file)
+        if image_file and self.pending_source is not None:
+            # Encode in the background, including any unfinished edits
+            self.processor.save(self.pending_source, self.pending_operations,
+                                image_file)
         else:
             QMessageBox.information(self, "Error",
                                     "Unable to save image.", QMessageBox.Ok)
@@ -270,131 +508,200 @@ class PhotoEditor(QMainWindow):
         # Create printer dialog to configure printer
         print_dialog = QPrintDialog(printer)
 
-        # if the dialog is accepted by the user, begin printing
+        # if the dialog is accepted by the user, begin printing.
+        # The full size image is printed, not the scaled copy in the label.
         if (print_dialog.exec_() == QPrintDialog.Accepted):
-            # use QPainter to output a PDF file
-            painter = QPainter()
-            # begin painting device
-            painter.begin(printer)
-            # Set QRect to hold painter's current viewport, which
-            # is the image_label
-            rect = QRect(painter.viewport())
-            # get the size of image_label and use it to set the size
-            # of the viewport
-            size = QSize(self.image_label.pixmap().size())
-            size.scale(rect.size(), Qt.KeepAspectRatio)
-            painter.setViewport(rect.x(), rect.y(), size.width(),
-                                size.height())
-            painter.setWindow(self.image_label.pixmap().rect())
-            # scale the image_label to fit the rect source (0, 0)
-            painter.drawPixmap(0, 0, self.image_label.pixmap())
-            # end painting
-            painter.end()
+            renderImage(printer, self.image)
+
+    def exportPdf(self):
+        """
+        Export the full size image to a PDF file.
+        """
+        pdf_file, _ = QFileDialog.getSaveFileName(self, "Export PDF", "",
+                                                  "PDF Files (*.pdf)")
+
+        if pdf_file and self.image.isNull() == False:
+            if not exportPdf(self.image, pdf_file):
+                QMessageBox.information(self, "Error",
+                                        "Unable to export PDF.",
+                                        QMessageBox.Ok)
 
     def clearImage(self):
         """
         Clears current image in QLabel widget
         """
+        self.processor.cancel()
         self.image_label.clear()
-        self.image = QPixmap()  # reset pixmap so that isNull() = True
+        self.histogram.setHistogram(None)
+        self.image = QImage()  # reset image so that isNull() = True
+        self.pending_source = None
+        self.pending_operations = []
+        self.operation_log = []
+        self.print_act.setEnabled(False)
+        self.pdf_act.setEnabled(False)
 
-    def rotateImage90(self):
+    def editImage(self, operation):
         """
-        Rotate image 90º clockwise
+        Queue an edit to the image. The edit is applied in the background
+        together with any edits that haven't finished yet, replacing the
+        job that is currently in flight.
         """
-        if self.image.isNull() == False:
-            transform90 = QTransform().rotate(90)
-            pixmap = QPixmap(self.image)
+        if self.pending_source is None:
+            # No image to edit
+            return
 
-            rotated = pixmap.transformed(transform90,
-                                         mode = Qt.SmoothTransformation)
+        self.pending_operations.append(operation)
+        self.operation_log.append(operation)
+        self.processor.submit(self.pending_source, self.pending_operations,
+                              self.image_label.size())
 
-            self.image_label.setPixmap(rotated.scaled(self.image_label.size(),
-                                                      Qt.KeepAspectRatio,
-                                                      Qt.SmoothTransformation))
-            self.image = QPixmap(rotated)
-            self.image_label.repaint()  # repaint the child widget
-        else:
-            # No image to rotate
-            pass
+    def rotateImage90(self):
+        """
+        Rotate image 90º clockwise
+        """
+        self.editImage(("rotate", 90))
 
     def rotateImage180(self):
         """
         Rotate image 180º clockwise
         """
-        if self.image.isNull() == False:
-            transform180 = QTransform().rotate(180)
-            pixmap = QPixmap(self.image)
-
-            rotated = pixmap.transformed(transform180,
-                                         mode = Qt.SmoothTransformation)
-
-            self.image_label.setPixmap(rotated.scaled(self.image_label.size(),
-                                                      Qt.KeepAspectRatio,
-                                                      Qt.SmoothTransformation))
-            # .......... To keep being allowed to rotate the image
-            self.image = QPixmap(rotated)
-            self.image_label.repaint()  # repaint the child widget
-        else:
-            # No image to rotate
-            pass
+        self.editImage(("rotate", 180))
 
     def flipImageHorizontal(self):
         """
         Mirror the image across the horizontal axis
         """
-        if self.image.isNull() == False:
-            flip_h = QTransform().scale(-1, 1)
-            pixmap = QPixmap(self.image)
-
-            flipped = pixmap.transformed(flip_h)
-
-            self.image_label.setPixmap(flipped.scaled(self.image_label.size(),
-                                                      Qt.KeepAspectRatio,
-                                                      Qt.SmoothTransformation))
-            self.image = QPixmap(flipped)
-            self.image_label.repaint()
-        else:
-            # No image to flip
-            pass
+        self.editImage(("flip", "horizontal"))
 
     def flipImageVertical(self):
         """
         Mirror the image across the vertical axis
         """
-        if self.image.isNull() == False:
-            flip_v = QTransform().scale(1, -1)
-            pixmap = QPixmap(self.image)
-
-            flipped = pixmap.transformed(flip_v)
-
-            self.image_label.setPixmap(flipped.scaled(self.image_label.size(),
-                                                      Qt.KeepAspectRatio,
-                                                      Qt.SmoothTransformation))
-            self.image = QPixmap(flipped)
-            self.image_label.repaint()
-        else:
-            # No image to flip
-            pass
+        self.editImage(("flip", "vertical"))
 
     def resizeImageHalf(self):
         """
         Resize the image to half its current size.
         """
-        if self.image.isNull() == False:
-            resize = QTransform().scale(0.5, 0.5)
-            pixmap = QPixmap(self.image)
+        self.editImage(("scale", 0.5))
 
-            resized = pixmap.transformed(resize)
+    def adjustBrightnessContrast(self):
+        """
+        Apply the brightness and contrast set with the sliders, then reset
+        the sliders for the next adjustment.
+        """
+        brightness = self.brightness_slider.value()
+        contrast = self.contrast_slider.value()
 
-            self.image_label.setPixmap(resized.scaled(self.image_label.size(),
-                                                      Qt.KeepAspectRatio,
-                                                      Qt.SmoothTransformation))
-            self.image = QPixmap(resized)
-            self.image_label.repaint()
-        else:
-            # No image to resize
-            pass
+        if brightness != 0 or contrast != 0:
+            self.editImage(("brightness_contrast", brightness, contrast))
+        self.brightness_slider.setValue(0)
+        self.contrast_slider.setValue(0)
+
+    def blurImage(self):
+        """
+        Blur the image using the radius in the spin box.
+        """
+        self.editImage(("blur", self.blur_radius.value()))
+
+    def displayImage(self, pyramid, display):
+        """
+        Called when the image processor has finished a job. The edited
+        image becomes the current image and the scaled copy is shown.
+        The pyramid is kept so the next edit can update it instead of
+        scaling the full size image again.
+        """
+        self.image = pyramid.image()
+        self.pending_source = pyramid
+        self.pending_operations = []
+
+        # QPixmap can only be created in the GUI thread
+        self.image_label.setPixmap(QPixmap.fromImage(display))
+        # The display copy is small, so its histogram is quick to count
+        self.histogram.setHistogram(histogram(display))
+        self.print_act.setEnabled(True)
+        self.pdf_act.setEnabled(True)
+
+    def showProgress(self, busy):
+        """
+        Show the progress bar in the status bar while a job is running.
+        """
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(busy)
+
+    def saveOperations(self):
+        """
+        Save the edits made to the current image to a JSON file that can
+        be used with batch_process.py.
+        """
+        ops_file, _ = QFileDialog.getSaveFileName(self, "Save Edits", "",
+                                                  "JSON Files (*.json)")
+        if ops_file:
+            saveOperations(ops_file, self.operation_log)
+
+    def batchProcess(self):
+        """
+        Apply the edits made to the current image to every image in a
+        folder. Images are processed in worker processes, and the edited
+        images and a report are written to the target folder.
+        """
+        if not self.operation_log:
+            QMessageBox.information(self, "Batch Process",
+                                    "Edit an image first. The same edits "
+                                    "will be applied to each image.",
+                                    QMessageBox.Ok)
+            return
+
+        source_dir = QFileDialog.getExistingDirectory(self, "Images to Edit")
+        if not source_dir:
+            return
+        target_dir = QFileDialog.getExistingDirectory(self,
+                                                      "Save Edited Images To")
+        if not target_dir:
+            return
+        try:
+            checkFolders(source_dir, target_dir)
+        except ValueError as error:
+            QMessageBox.information(self, "Batch Process", str(error),
+                                    QMessageBox.Ok)
+            return
+
+        self.batch_act.setEnabled(False)
+        self.batch_worker = BatchWorker(source_dir, target_dir,
+                                        list(self.operation_log))
+        self.batch_worker.updateValueSignal.connect(
+            self.batch_progress_bar.setValue)
+        self.batch_worker.updateTextSignal.connect(
+            self.statusBar().showMessage)
+        self.batch_worker.finishedSignal.connect(self.batchFinished)
+        self.batch_worker.finished.connect(self.batch_worker.deleteLater)
+        self.batch_progress_bar.setValue(0)
+        self.batch_progress_bar.setVisible(True)
+        self.batch_worker.start()
+
+    def batchFinished(self, summary):
+        self.batch_progress_bar.setVisible(False)
+        self.batch_act.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.information(self, "Batch Process", summary,
+                                QMessageBox.Ok)
+
+    def jobFailed(self):
+        """
+        Called when the job in flight fails. If the image couldn't be
+        decoded, forget its file name so that later edits and saves
+        don't refer to it.
+        """
+        if isinstance(self.pending_source, str):
+            self.clearImage()
+
+    def showError(self, message):
+        QMessageBox.information(self, "Error", message, QMessageBox.Ok)
+
+    def closeEvent(self, event):
+        # Let the thumbnail threads finish and close their connections
+        self.thumbnail_model.shutdown()
+        event.accept()
 
     def centerMainWindow(self):
         """
@@ -0,0 +1,350 @@
+"""
+Thumbnail strip and on-disk thumbnail cache for the photo editor.
+Thumbnails are stored in an SQLite database, keyed by a hash of the
+file's contents so that renamed or copied photos don't need new ones.
+The least recently used thumbnails are evicted when the cache grows past
+its size limit. Thumbnails that are missing from the cache are made in a
+background thread pool, using QImageReader.setScaledSize() so that JPEG
+files are decoded at a reduced size.
+"""
+# import necessary modules
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import (QAbstractListModel, QBuffer, QByteArray,
+                          QIODevice, QModelIndex, QObject, QRunnable, QSize,
+                          QStandardPaths, Qt, QThreadPool, pyqtSignal)
+from PyQt5.QtGui import QColor, QImage, QImageReader, QPixmap
+
+from image_operations import IMAGE_EXTENSIONS
+
+THUMBNAIL_SIZE = QSize(96, 96)
+
+# A thumbnail's last used time is only updated when it is older than
+# this many seconds, so that most cache hits don't write to the database
+LAST_USED_RESOLUTION = 60 * 60
+
+# Only the start and end of each file are hashed. That is enough to tell
+# photos apart and avoids reading every byte of a large folder.
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def contentHash(path, size):
+    """
+    Return a hash of the file size and its first and last blocks.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size = 16)
+    with open(path, "rb") as f:
+        digest.update(f.read(HASH_BLOCK_SIZE))
+        if size > HASH_BLOCK_SIZE:
+            f.seek(max(HASH_BLOCK_SIZE, size - HASH_BLOCK_SIZE))
+            digest.update(f.read(HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def defaultCachePath():
+    directory = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    if not directory:
+        directory = os.path.join(os.path.expanduser("~"), ".cache")
+    os.makedirs(directory, exist_ok = True)
+    return os.path.join(directory, "photo_editor_thumbnails.db")
+
+
+class ThumbnailCache:
+    """
+    SQLite database of JPEG encoded thumbnails. The files table remembers
+    the hash of each path, along with its size and modification time,
+    so files that haven't changed aren't hashed again. Each thread gets
+    its own connection, and close() closes all of them.
+    """
+
+    def __init__(self, path = None, max_bytes = 256 * 1024 * 1024):
+        self.path = path or defaultCachePath()
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.connections = []
+
+        db = self.connection()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER,
+                hash TEXT);
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                hash TEXT PRIMARY KEY, data BLOB, bytes INTEGER,
+                last_used REAL);
+            CREATE INDEX IF NOT EXISTS thumbnails_last_used
+                ON thumbnails (last_used);
+        """)
+        db.commit()
+        # Kept up to date by put(), so the table only has to be summed
+        # when the cache may have grown past its limit
+        self.total_bytes = self.totalBytes()
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            # Allow close() to close the connection from another thread
+            db = sqlite3.connect(self.path, timeout = 30,
+                                 check_same_thread = False)
+            # WAL lets the GUI read while the workers write
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+            with self.write_lock:
+                self.connections.append(db)
+        return db
+
+    def close(self):
+        """
+        Close the connections of every thread. The threads must have
+        stopped using the cache.
+        """
+        with self.write_lock:
+            for db in self.connections:
+                db.close()
+            self.connections.clear()
+        self.local = threading.local()
+
+    def fileHash(self, path, stat):
+        """
+        Return the content hash of path, reusing the stored hash if the
+        file's size and modification time haven't changed.
+        """
+        db = self.connection()
+        row = db.execute("SELECT size, mtime, hash FROM files WHERE path=?",
+                         (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        file_hash = contentHash(path, stat.st_size)
+        with self.write_lock:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                       (path, stat.st_size, stat.st_mtime_ns, file_hash))
+            db.commit()
+        return file_hash
+
+    def get(self, file_hash):
+        """
+        Return the encoded thumbnail for file_hash, or None.
+        """
+        db = self.connection()
+        row = db.execute("SELECT data, last_used FROM thumbnails "
+                         "WHERE hash=?", (file_hash,)).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if now - row[1] > LAST_USED_RESOLUTION:
+            with self.write_lock:
+                db.execute("UPDATE thumbnails SET last_used=? WHERE hash=?",
+                           (now, file_hash))
+                db.commit()
+        return row[0]
+
+    def put(self, file_hash, data):
+        """
+        Store an encoded thumbnail, then evict the least recently used
+        thumbnails if the cache is too large.
+        """
+        db = self.connection()
+        with self.write_lock:
+            row = db.execute("SELECT bytes FROM thumbnails WHERE hash=?",
+                             (file_hash,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)",
+                       (file_hash, data, len(data), time.time()))
+            db.commit()
+            self.total_bytes += len(data) - (row[0] if row else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def totalBytes(self):
+        row = self.connection().execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM thumbnails").fetchone()
+        return row[0]
+
+    def evict(self):
+        """
+        Remove the least recently used thumbnails until the cache is
+        back under 90% of its size limit. The total is counted again
+        first, in case another process has changed the cache.
+        """
+        db = self.connection()
+        target = self.max_bytes * 0.9
+        with self.write_lock:
+            total = self.totalBytes()
+            if total <= self.max_bytes:
+                self.total_bytes = total
+                return
+
+            rows = db.execute("SELECT hash, bytes FROM thumbnails "
+                              "ORDER BY last_used").fetchall()
+            evicted = []
+            for file_hash, size in rows:
+                if total <= target:
+                    break
+                evicted.append((file_hash,))
+                total -= size
+            db.executemany("DELETE FROM thumbnails WHERE hash=?", evicted)
+            db.commit()
+            self.total_bytes = total
+
+
+def makeThumbnail(path, size = THUMBNAIL_SIZE):
+    """
+    Decode path at thumbnail size. Setting the scaled size before reading
+    lets the JPEG decoder skip most of the work of a full size decode.
+    """
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    full_size = reader.size()
+    if full_size.isValid():
+        reader.setScaledSize(full_size.scaled(size, Qt.KeepAspectRatio))
+    image = reader.read()
+
+    if not image.isNull() and (image.width() > size.width() or
+                               image.height() > size.height()):
+        image = image.scaled(size, Qt.KeepAspectRatio,
+                             Qt.SmoothTransformation)
+    return image
+
+
+def encodeThumbnail(image):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPG", 85)
+    return bytes(data)
+
+
+class ThumbnailSignals(QObject):
+    # folder generation, file path, thumbnail
+    thumbnailReady = pyqtSignal(int, str, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """
+    Load one thumbnail from the cache, or make it and add it to the cache.
+    """
+
+    def __init__(self, cache, path, signals, generation):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.signals = signals
+        self.generation = generation
+
+    def run(self):
+        try:
+            stat = os.stat(self.path)
+            file_hash = self.cache.fileHash(self.path, stat)
+        except OSError:
+            self.signals.thumbnailReady.emit(self.generation, self.path,
+                                             QImage())
+            return
+
+        data = self.cache.get(file_hash)
+        if data is not None:
+            image = QImage.fromData(data)
+        else:
+            image = makeThumbnail(self.path)
+            if not image.isNull():
+                self.cache.put(file_hash, encodeThumbnail(image))
+
+        self.signals.thumbnailReady.emit(self.generation, self.path, image)
+
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    List model of the images in a folder. A thumbnail is only requested
+    when the view asks for it, which is when its item becomes visible, so
+    opening a large folder only loads the first screen of thumbnails.
+    """
+
+    def __init__(self, cache = None, parent = None):
+        super().__init__(parent)
+        self.cache = cache or ThumbnailCache()
+        self.pool = QThreadPool(self)
+        self.signals = ThumbnailSignals()
+        self.signals.thumbnailReady.connect(self.onThumbnailReady)
+
+        self.paths = []
+        self.rows = {}
+        self.requested = set()
+        # Increased for each folder, so that the thumbnails of the last
+        # folder that are still loading can be ignored
+        self.generation = 0
+        # Thumbnails kept in memory, least recently used first
+        self.pixmaps = OrderedDict()
+        self.max_pixmaps = 2000
+
+        self.placeholder = QPixmap(THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor("#DDDDDD"))
+
+    def setDirectory(self, directory):
+        """
+        Show the images in directory.
+        """
+        # Drop the thumbnails of the last folder that haven't started
+        self.pool.clear()
+        self.generation += 1
+        self.beginResetModel()
+        with os.scandir(directory) as entries:
+            self.paths = sorted(entry.path for entry in entries
+                                if entry.name.lower().endswith(
+                                    IMAGE_EXTENSIONS))
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self.requested.clear()
+        self.pixmaps.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        path = self.paths[index.row()]
+        if role == Qt.DecorationRole:
+            pixmap = self.pixmaps.get(path)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(path)
+                return pixmap
+            if path not in self.requested:
+                self.requested.add(path)
+                self.pool.start(ThumbnailTask(self.cache, path, self.signals,
+                                              self.generation))
+            return self.placeholder
+        elif role == Qt.ToolTipRole:
+            return os.path.basename(path)
+        elif role == Qt.UserRole:
+            return path
+        return None
+
+    def shutdown(self):
+        """
+        Stop loading thumbnails and close the cache.
+        """
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.cache.close()
+
+    def onThumbnailReady(self, generation, path, image):
+        row = self.rows.get(path)
+        if generation != self.generation or row is None:
+            # The folder was changed while the thumbnail was loading
+            return
+
+        self.requested.discard(path)
+        self.pixmaps[path] = QPixmap.fromImage(image) if not image.isNull() \
+            else self.placeholder
+        if len(self.pixmaps) > self.max_pixmaps:
+            self.pixmaps.popitem(last = False)
+
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
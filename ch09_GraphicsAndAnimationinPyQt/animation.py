@@ -5,35 +5,43 @@ Featured in "Beginning Pyqt - A Hands-on Approach to GUI Programming"
 """
 # import necessary modules
 import sys
+import time
 
-from PyQt5.QtCore import (QObject, QPointF, QPropertyAnimation, QRectF,
-                          pyqtProperty)
+from PyQt5.QtCore import QObject, QPointF, QRectF, Qt
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtWidgets import (QApplication, QGraphicsPixmapItem, QGraphicsScene,
-                             QGraphicsView)
+from PyQt5.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
 
+from animation_driver import KeyframeDriver
+from scene_modes import DEFAULT_MODE, applySceneMode
+from sprite_atlas import sprite_cache
 
-# Create Objects class that defines the position property of
-# instances of the class using pyqtProperty.
+
+# Create Objects class that holds the graphics item of an image.
+# The scaled pixmap is shared by all objects with the same image and
+# width, so the image file is only decoded once.
 class Objects(QObject):
 
-    def __init__(self, image_path):
+    def __init__(self, image_path, width = 150, sprites = sprite_cache):
         super().__init__()
 
-        item_pixmap = QPixmap(image_path)
-        resize_item = item_pixmap.scaledToWidth(150)
-        self.item = QGraphicsPixmapItem(resize_item)
-
-    def _set_position(self, position):
-        self.item.setPos(position)
-
-    position = pyqtProperty(QPointF, fset = _set_position)
+        self.item = sprites.createItem(image_path, width)
 
 
 class AnimationScene(QGraphicsView):
 
-    def __init__(self):
+    def __init__(self, cache_background = True):
         super().__init__()
+        # The background is decoded once, and a copy scaled to the size
+        # it is shown at is kept until the view is resized
+        self.cache_background = cache_background
+        self.background = None
+        self.scaled_background = None
+
+        # Time spent painting each frame, shown in the title every second
+        self.frame_count = 0
+        self.frame_time = 0.0
+        self.frames_started = time.perf_counter()
+
         self.initializeView()
 
     def initializeView(self):
@@ -44,6 +52,12 @@ class AnimationScene(QGraphicsView):
         self.setGeometry(100, 100, 700, 450)
         self.setWindowTitle('9.2 - Animation Example')
 
+        if self.cache_background:
+            self.background = QPixmap("images/highway.jpg")
+            # The view keeps the drawn background and only redraws it
+            # when it is resized or scrolled
+            self.setCacheMode(QGraphicsView.CacheBackground)
+
         self.createObjects()
         self.createScene()
 
@@ -52,40 +66,26 @@ class AnimationScene(QGraphicsView):
     def createObjects(self):
         """
         Create instances of the Objects class, and set up the objects
-        animations.
+        animations. One driver moves all of the objects, using the same
+        key times for each of them.
         """
-        # List that holds all of the animations.
-        animations = []
+        self.animation = KeyframeDriver([0.0, 0.3, 0.6, 1.0], 6000,
+                                        parent = self)
 
         # Create the car object and car animation.
         self.car = Objects('images/car.png')
-
-        self.car_anim = QPropertyAnimation(self.car, b"position")
-        self.car_anim.setDuration(6000)
-
-        self.car_anim.setStartValue(QPointF(-50, 350))
-        self.car_anim.setKeyValueAt(0.3, QPointF(150, 350))
-        self.car_anim.setKeyValueAt(0.6, QPointF(170, 350))
-        self.car_anim.setEndValue(QPointF(750, 350))
+        self.animation.addItem(self.car.item,
+                               [QPointF(-50, 350), QPointF(150, 350),
+                                QPointF(170, 350), QPointF(750, 350)])
 
         # Create the tree object and tree animation.
         self.tree = Objects('images/trees.png')
+        self.animation.addItem(self.tree.item,
+                               [QPointF(750, 150), QPointF(170, 150),
+                                QPointF(150, 150), QPointF(-150, 150)])
 
-        self.tree_anim = QPropertyAnimation(self.tree, b"position")
-        self.tree_anim.setDuration(6000)
-
-        self.tree_anim.setStartValue(QPointF(750, 150))
-        self.tree_anim.setKeyValueAt(0.3, QPointF(170, 150))
-        self.tree_anim.setKeyValueAt(0.6, QPointF(150, 150))
-        self.tree_anim.setEndValue(QPointF(-150, 150))
-
-        # Add animations to the animations list, and start the
-        # animations once the program begins running.
-        animations.append(self.car_anim)
-        animations.append(self.tree_anim)
-
-        for anim in animations:
-            anim.start()
+        # Start the animations once the program begins running.
+        self.animation.start()
 
     def createScene(self):
         """
@@ -97,6 +97,25 @@ class AnimationScene(QGraphicsView):
         self.scene.addItem(self.car.item)
         self.scene.addItem(self.tree.item)
         self.setScene(self.scene)
+        # Both of the items move, so none of them are cached
+        applySceneMode(self, DEFAULT_MODE)
+
+    def scaledBackground(self):
+        """
+        Return the background scaled to the size of the scene rect on
+        the screen, scaling it again only if that size has changed.
+        """
+        scene_rect = self.transform().mapRect(self.scene.sceneRect())
+        size = (scene_rect.size() * self.devicePixelRatioF()).toSize()
+        if self.scaled_background is None or \
+                self.scaled_background.size() != size:
+            self.scaled_background = self.background.scaled(
+                size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        return self.scaled_background
+
+    def resizeEvent(self, event):
+        self.scaled_background = None
+        super().resizeEvent(event)
 
     def drawBackground(self, painter, rect):
         """
@@ -104,12 +123,37 @@ class AnimationScene(QGraphicsView):
         """
         scene_rect = self.scene.sceneRect()
 
-        background = QPixmap("images/highway.jpg")
+        if self.cache_background:
+            background = self.scaledBackground()
+        else:
+            background = QPixmap("images/highway.jpg")
         bg_rectf = QRectF(background.rect())
         painter.drawPixmap(scene_rect, background, bg_rectf)
 
+    def paintEvent(self, event):
+        """
+        Time each frame, and show the frame rate and the mean time spent
+        painting a frame in the title bar once a second.
+        """
+        start = time.perf_counter()
+        super().paintEvent(event)
+        now = time.perf_counter()
+        self.frame_time += now - start
+        self.frame_count += 1
+
+        if now - self.frames_started >= 1.0:
+            self.setWindowTitle(
+                "9.2 - Animation Example - {:.0f} fps, {:.2f} ms/frame".format(
+                    self.frame_count / (now - self.frames_started),
+                    1000 * self.frame_time / self.frame_count))
+            self.frame_count = 0
+            self.frame_time = 0.0
+            self.frames_started = now
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
-    window = AnimationScene()
+    # Run with --no-cache to compare with decoding the background for
+    # every frame
+    window = AnimationScene(cache_background = "--no-cache" not in sys.argv)
     sys.exit(app.exec_())
\ No newline at end of file
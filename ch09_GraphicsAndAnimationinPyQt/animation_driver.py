@@ -0,0 +1,110 @@
+"""
+Keyframe animation for many graphics items at once.
+A QPropertyAnimation for each item means one timer callback and one
+Python property call per item for every frame. KeyframeDriver instead
+ticks once per frame from a single QTimer, finds the position of every
+item from arrays of keyframes with NumPy, and then moves all of the
+items in one loop.
+"""
+# import necessary modules
+import time
+
+import numpy as np
+from PyQt5.QtCore import QElapsedTimer, QObject, QTimer, pyqtSignal
+
+# Time between frames in milliseconds
+FRAME_INTERVAL = 16
+
+
+class KeyframeDriver(QObject):
+    """
+    Moves items along paths that share key_times, a list of times from 0
+    to 1 like the steps of QPropertyAnimation.setKeyValueAt(). Positions
+    between keyframes are interpolated linearly. Each item can start its
+    path part of the way through with a phase between 0 and 1. With loop
+    set, the items go around their paths until stop() is called.
+    """
+    finished = pyqtSignal()
+
+    def __init__(self, key_times, duration, loop = False, parent = None):
+        super().__init__(parent)
+        self.key_times = np.asarray(key_times, float)
+        self.duration = duration
+        self.loop = loop
+
+        self.items = []
+        self.paths = np.empty((0, len(self.key_times), 2))
+        self.phases = np.empty(0)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL)
+        self.timer.timeout.connect(self.tick)
+        self.clock = QElapsedTimer()
+        # Seconds taken by the last tick to move the items
+        self.tick_time = 0.0
+
+    def addItems(self, items, paths, phases = None):
+        """
+        Add items with their paths, an array of shape (len(items),
+        len(key_times), 2) with the (x, y) position at each keyframe.
+        """
+        paths = np.asarray(paths, float).reshape(len(items),
+                                                 len(self.key_times), 2)
+        if phases is None:
+            phases = np.zeros(len(items))
+        self.items.extend(items)
+        self.paths = np.concatenate([self.paths, paths])
+        self.phases = np.concatenate([self.phases, phases])
+
+    def addItem(self, item, points, phase = 0.0):
+        """
+        Add one item, with a QPointF for each keyframe.
+        """
+        self.addItems([item], [[(point.x(), point.y()) for point in points]],
+                      [phase])
+
+    def positionsAt(self, progress):
+        """
+        Return the position of each item when it is progress (an array
+        with a value from 0 to 1 for each item) along its path.
+        """
+        key_times = self.key_times
+        segment = np.clip(np.searchsorted(key_times, progress, "right") - 1,
+                          0, len(key_times) - 2)
+        start = key_times[segment]
+        fraction = np.clip((progress - start) /
+                           (key_times[segment + 1] - start), 0.0, 1.0)
+
+        rows = np.arange(len(self.items))
+        first = self.paths[rows, segment]
+        last = self.paths[rows, segment + 1]
+        return first + (last - first) * fraction[:, None]
+
+    def start(self):
+        self.clock.start()
+        self.timer.start()
+        self.tick()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        """
+        Move every item to where it is at the current time.
+        """
+        started = time.perf_counter()
+        elapsed = self.clock.elapsed() / float(self.duration)
+        progress = self.phases + elapsed
+        if self.loop:
+            progress %= 1.0
+        else:
+            progress = np.minimum(progress, 1.0)
+
+        positions = self.positionsAt(progress).tolist()
+        for item, (x, y) in zip(self.items, positions):
+            item.setPos(x, y)
+        self.tick_time = time.perf_counter() - started
+
+        if not self.loop and elapsed >= 1.0:
+            self.timer.stop()
+            self.finished.emit()
@@ -0,0 +1,129 @@
+"""
+Stress test for KeyframeDriver.
+Moves thousands of car and tree sprites around looping paths with one
+driver, and shows the frame rate in the title bar. With --seconds the
+test quits after that long and prints the frame rate and the times
+taken to move the items and to paint each frame.
+
+    python animation_stress.py
+    python animation_stress.py --items 10000 --seconds 5
+    QT_QPA_PLATFORM=offscreen python animation_stress.py --seconds 5
+"""
+# import necessary modules
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
+
+from animation_driver import KeyframeDriver
+from scene_modes import (DEFAULT_MODE, INDEX_METHODS, UPDATE_MODES,
+                         applySceneMode)
+from sprite_atlas import sprite_cache
+
+SPRITES = ['images/car.png', 'images/trees.png']
+KEY_TIMES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+class StressScene(QGraphicsView):
+
+    def __init__(self, count, width = 1200, height = 700,
+                 mode = DEFAULT_MODE):
+        super().__init__()
+        self.setGeometry(100, 100, width, height)
+        self.setWindowTitle('Animation Stress Test')
+
+        # Every item moves, so there are no static items to cache
+        self.scene = QGraphicsScene(0, 0, width, height, self)
+        self.setScene(self.scene)
+        applySceneMode(self, mode)
+
+        self.paint_times = []
+        self.tick_times = []
+        self.frames_started = time.perf_counter()
+        self.frame_count = 0
+
+        self.createItems(count, width, height)
+        self.show()
+
+    def createItems(self, count, width, height):
+        """
+        Add count sprites, each going around a random loop of keyframes
+        and starting at a random point of it.
+        """
+        rng = np.random.default_rng(0)
+        self.animation = KeyframeDriver(KEY_TIMES, 8000, loop = True,
+                                        parent = self)
+        items = []
+        for i in range(count):
+            item = sprite_cache.createItem(SPRITES[i % len(SPRITES)], 40)
+            self.scene.addItem(item)
+            items.append(item)
+
+        paths = rng.uniform(0, 1, (count, len(KEY_TIMES), 2)) * \
+            [width - 40, height - 40]
+        # Go back to the start at the end of each loop
+        paths[:, -1] = paths[:, 0]
+        self.animation.addItems(items, paths, rng.uniform(0, 1, count))
+
+        # Connected after the driver, so this runs after each tick
+        self.animation.timer.timeout.connect(
+            lambda: self.tick_times.append(self.animation.tick_time))
+        self.animation.start()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        now = time.perf_counter()
+        self.paint_times.append(now - start)
+
+        self.frame_count += 1
+        if now - self.frames_started >= 1.0:
+            self.setWindowTitle("Animation Stress Test - {} items, "
+                                "{:.0f} fps".format(
+                                    len(self.animation.items),
+                                    self.frame_count /
+                                    (now - self.frames_started)))
+            self.frame_count = 0
+            self.frames_started = now
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Animate many items.")
+    parser.add_argument("--items", type = int, default = 10000)
+    parser.add_argument("--seconds", type = float, default = 0,
+                        help = "quit after this long and print the results")
+    parser.add_argument("--index", choices = INDEX_METHODS,
+                        default = DEFAULT_MODE[0])
+    parser.add_argument("--update", choices = UPDATE_MODES,
+                        default = DEFAULT_MODE[1])
+    args = parser.parse_args(argv[1:])
+
+    app = QApplication(argv)
+    window = StressScene(args.items, mode = (args.index, args.update,
+                                             DEFAULT_MODE[2]))
+
+    if args.seconds > 0:
+        started = time.perf_counter()
+        QTimer.singleShot(int(args.seconds * 1000), app.quit)
+    app.exec_()
+
+    if args.seconds > 0:
+        elapsed = time.perf_counter() - started
+        ticks = np.array(window.tick_times) * 1000
+        paints = np.array(window.paint_times) * 1000
+        print("{} items, {} sprite decodes".format(args.items,
+                                                   sprite_cache.decodes))
+        print("frames: {} ({:.1f} fps)".format(len(paints),
+                                               len(paints) / elapsed))
+        print("move items: mean {:.1f} ms, max {:.1f} ms".format(
+            ticks.mean(), ticks.max()))
+        print("paint:      mean {:.1f} ms, max {:.1f} ms".format(
+            paints.mean(), paints.max()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
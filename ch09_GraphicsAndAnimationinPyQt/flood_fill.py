@@ -0,0 +1,171 @@
+"""
+Scanline flood fill for the painter GUI's bucket fill and magic wand.
+The image is read through a NumPy view of its pixels. Every pixel is
+first compared with the colour under the mouse in one pass. Each row of
+matching pixels is then split into spans, and the fill moves from span
+to span through the spans that overlap them in the rows above and
+below, so Python only loops over spans instead of pixels.
+"""
+# import necessary modules
+import numpy as np
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage
+
+# Rows compared at a time when matching with a tolerance
+BLOCK_ROWS = 64
+
+
+def pixelArray(image):
+    """
+    Return a writable array of shape (height, width) that shares its
+    memory with image, which must be a 32-bit format. Each value is a
+    pixel as 0xAARRGGBB.
+    """
+    pointer = image.bits()
+    pointer.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(pointer, np.uint32).reshape(
+        image.height(), image.bytesPerLine() // 4)
+    return pixels[:, :image.width()]
+
+
+def matchMask(pixels, x, y, tolerance = 0):
+    """
+    Return a mask of the pixels whose channels are all within tolerance
+    of the pixel at (x, y).
+    """
+    if tolerance <= 0:
+        return pixels == pixels[y, x]
+
+    # Work on the bytes of each row, with the limits for the four
+    # channels repeated across the row. Subtracting low wraps values
+    # below it around to large numbers, so one comparison checks both
+    # limits. The rows are done in blocks that fit in the CPU cache.
+    height, width = pixels.shape
+    channels = pixels.view(np.uint8)
+    seed = channels[y, 4 * x:4 * x + 4].astype(int)
+    low = np.maximum(0, seed - tolerance)
+    high = np.minimum(255, seed + tolerance)
+    low_row = np.tile(low.astype(np.uint8), width)
+    range_row = np.tile((high - low).astype(np.uint8), width)
+
+    mask = np.empty(pixels.shape, bool)
+    block = np.empty((min(height, BLOCK_ROWS), width * 4), np.uint8)
+    for top in range(0, height, BLOCK_ROWS):
+        rows = channels[top:top + BLOCK_ROWS]
+        difference = block[:len(rows)]
+        np.subtract(rows, low_row, out = difference)
+        inside = difference.view(bool)
+        np.less_equal(difference, range_row, out = inside)
+        # A pixel matches when all four of its bytes are True (1)
+        np.equal(inside.view(np.uint32), 0x01010101,
+                 out = mask[top:top + BLOCK_ROWS])
+    return mask
+
+
+def rowSpans(mask):
+    """
+    Return the row, start and end (exclusive) of each run of True values
+    in mask, sorted by row and then by start.
+    """
+    # Put the rows one after the other with a False value between them,
+    # so that every run starts and ends at a change of value
+    height, width = mask.shape
+    flat = np.zeros(height * (width + 1) + 1, bool)
+    flat[1:].reshape(height, width + 1)[:, :width] = mask
+    changes = np.flatnonzero(flat[1:] != flat[:-1])
+
+    rows, starts = np.divmod(changes[0::2], width + 1)
+    ends = changes[1::2] - rows * (width + 1)
+    return rows, starts, ends
+
+
+def floodFill(pixels, x, y, tolerance = 0):
+    """
+    Find the area of pixels connected to (x, y), where connected pixels
+    share an edge and match the colour at (x, y). Returns a mask of the
+    area, cropped to the rectangle that contains it, and that rectangle.
+    """
+    height, width = pixels.shape
+    rows, starts, ends = rowSpans(matchMask(pixels, x, y, tolerance))
+
+    # Number the pixels row after row, with a gap after each row, so
+    # that the spans of the row above or below (r +/- 1) a span can be
+    # found for every span at once. The spans that overlap a span are
+    # those that end after it starts and start before it ends.
+    row_length = width + 1
+    first_pixels = rows * row_length + starts
+    last_pixels = rows * row_length + ends
+    neighbours = []
+    for step in (-row_length, row_length):
+        low = np.searchsorted(last_pixels, first_pixels + step, "right")
+        high = np.searchsorted(first_pixels, last_pixels + step, "left")
+        # Lists are used in the loop, since Python reads them much
+        # faster than arrays
+        neighbours += [low.tolist(), high.tolist()]
+    above_low, above_high, below_low, below_high = neighbours
+
+    seed = int(np.searchsorted(first_pixels, y * row_length + x,
+                               "right")) - 1
+    filled = bytearray(len(rows))
+    filled[seed] = 1
+    stack = [seed]
+    found = [seed]
+
+    while stack:
+        span = stack.pop()
+        for other in range(above_low[span], above_high[span]):
+            if not filled[other]:
+                filled[other] = 1
+                stack.append(other)
+                found.append(other)
+        for other in range(below_low[span], below_high[span]):
+            if not filled[other]:
+                filled[other] = 1
+                stack.append(other)
+                found.append(other)
+
+    # Sorting the spans puts them in the order of the pixels
+    found = np.sort(found)
+    rows, starts, ends = rows[found], starts[found], ends[found]
+    top, left = rows.min(), starts.min()
+    bounds = QRect(int(left), int(top), int(ends.max() - left),
+                   int(rows.max() - top + 1))
+
+    # Lay the rows of the mask out one after the other, with one spare
+    # pixel at the end of each so that spans never touch. The mask is
+    # then runs of False and True that change at the start and end of
+    # each span, and each run is made with one repeat.
+    row_width = bounds.width() + 1
+    offsets = (rows - top) * row_width - left
+    changes = np.empty(2 * len(found) + 2, np.int64)
+    changes[0] = 0
+    changes[1:-1:2] = offsets + starts
+    changes[2:-1:2] = offsets + ends
+    changes[-1] = bounds.height() * row_width
+    values = np.zeros(len(changes) - 1, bool)
+    values[1::2] = True
+    mask = np.repeat(values, np.diff(changes)).reshape(bounds.height(),
+                                                       row_width)
+    return mask[:, :-1], bounds
+
+
+def maskImage(mask, color):
+    """
+    Return an image the size of mask, in color where mask is True and
+    transparent elsewhere.
+    """
+    height, width = mask.shape
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    premultiplied = QColor(color).toRgb()
+    alpha = premultiplied.alpha()
+    value = (alpha << 24 |
+             premultiplied.red() * alpha // 255 << 16 |
+             premultiplied.green() * alpha // 255 << 8 |
+             premultiplied.blue() * alpha // 255)
+    # Every pixel is written, so the image doesn't need to be cleared.
+    # The mask is copied in as 0 and 1, then multiplied in place, which
+    # is faster than multiplying the bool array directly.
+    pixels = pixelArray(image)
+    np.copyto(pixels, mask, casting = "unsafe")
+    pixels *= np.uint32(value)
+    return image
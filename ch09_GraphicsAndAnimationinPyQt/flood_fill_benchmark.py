@@ -0,0 +1,212 @@
+"""
+Benchmark for the painter's bucket fill.
+Times the scanline flood fill in flood_fill.py on a 4K canvas with
+shapes drawn on it, and compares it with a naive recursive fill that
+reads pixels with QImage.pixel(). The recursive version can only handle
+small areas before it runs out of stack, so by default it runs on a
+crop of the canvas and the time is scaled up by the number of pixels.
+The whole bucket fill of the painter GUI is timed as well, from the
+click to the fill being painted into the tiles, with the time of each
+step: flattening the layers, the flood fill, making the image of the
+mask and painting it.
+
+    python flood_fill_benchmark.py
+    python flood_fill_benchmark.py --shapes 300 --tolerance 0
+"""
+# import necessary modules
+import argparse
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRect, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter
+from PyQt5.QtWidgets import QApplication
+
+from flood_fill import floodFill, maskImage, pixelArray
+
+
+def createTestCanvas(width, height, shapes):
+    """
+    Draw antialiased ellipses, some filled, on a white canvas so that the
+    fill has edges and holes to go around.
+    """
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.white)
+    rng = random.Random(0)
+
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    for i in range(shapes):
+        painter.setPen(QColor(rng.randint(0, 255), 0, 0))
+        if i % 2:
+            painter.setBrush(QColor(0, rng.randint(0, 255), 0))
+        else:
+            painter.setBrush(Qt.NoBrush)
+        painter.drawEllipse(rng.randint(0, width), rng.randint(0, height),
+                            rng.randint(10, 400), rng.randint(10, 400))
+    painter.end()
+    return image
+
+
+def referenceFill(image, x, y, tolerance):
+    """
+    Naive recursive flood fill, returning the filled area as a set.
+    """
+    target = QColor(image.pixel(x, y))
+    filled = set()
+
+    def matches(px, py):
+        color = QColor(image.pixel(px, py))
+        return (abs(color.red() - target.red()) <= tolerance and
+                abs(color.green() - target.green()) <= tolerance and
+                abs(color.blue() - target.blue()) <= tolerance and
+                abs(color.alpha() - target.alpha()) <= tolerance)
+
+    def fill(px, py):
+        if px < 0 or py < 0 or px >= image.width() or \
+                py >= image.height() or (px, py) in filled or \
+                not matches(px, py):
+            return
+        filled.add((px, py))
+        fill(px + 1, py)
+        fill(px - 1, py)
+        fill(px, py + 1)
+        fill(px, py - 1)
+
+    fill(x, y)
+    return filled
+
+
+def runWithLargeStack(function, *args):
+    """
+    Run function in a thread with a large stack, so that deep recursion
+    doesn't crash Python.
+    """
+    result = []
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 1000000))
+    threading.stack_size(512 * 1024 * 1024)
+    thread = threading.Thread(target = lambda: result.append(function(*args)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def timeCall(function, *args, repeat = 1):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def timeGuiFill(image, tolerance, repeat = 5):
+    """
+    Click the bucket fill at the top left of a painter canvas showing
+    image at full size. Returns the best time of the whole click and of
+    each step it takes, in seconds.
+    """
+    from painter import PainterWindow
+
+    window = PainterWindow()
+    canvas = window.canvas
+    canvas.resize(image.size())
+    canvas.tiles.paint(image.rect(), lambda painter:
+                       painter.drawImage(0, 0, image))
+    canvas.tiles.endPainting()
+    canvas.selectDrawingTool("fill")
+    canvas.fill_tolerance = tolerance
+    pos = QPointF(0, 0)
+
+    region = canvas.fillRegion(pos)
+    flattened = canvas.flattenImage(region)
+    mask, bounds = floodFill(pixelArray(flattened), 0, 0, tolerance)
+
+    def timeUndone(function, *args):
+        # Undo each click, without timing the undo
+        best = float("inf")
+        for i in range(repeat):
+            start = time.perf_counter()
+            function(*args)
+            best = min(best, time.perf_counter() - start)
+            canvas.undo()
+        return best
+
+    times = [
+        ("whole click", timeUndone(canvas.useAreaTool, pos)),
+        ("  flatten", timeCall(canvas.flattenImage, region,
+                               repeat = repeat)),
+        ("  flood fill", timeCall(floodFill, pixelArray(flattened), 0, 0,
+                                  tolerance, repeat = repeat)),
+        ("  mask image", timeCall(maskImage, mask, canvas.pen_color,
+                                  repeat = repeat)),
+        ("  paint mask", timeUndone(canvas.fillMask, mask, bounds,
+                                    canvas.pen_color)),
+    ]
+    window.close()
+    return times
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark the fill.")
+    parser.add_argument("--width", type = int, default = 3840)
+    parser.add_argument("--height", type = int, default = 2160)
+    parser.add_argument("--shapes", type = int, default = 60)
+    parser.add_argument("--tolerance", type = int, default = 32)
+    parser.add_argument("--sample-size", type = int, default = 160,
+                        help = "size of the crop used to time the "
+                               "recursive version")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(
+        ["flood_fill_benchmark", "-platform", "offscreen"])
+
+    image = createTestCanvas(args.width, args.height, args.shapes)
+    pixels = pixelArray(image)
+    sample = image.copy(QRect(0, 0, args.sample_size, args.sample_size))
+    sample_pixels = pixelArray(sample)
+
+    # Check that both versions fill the same area of the crop
+    mask, bounds = floodFill(sample_pixels, 0, 0, args.tolerance)
+    expected = runWithLargeStack(referenceFill, sample, 0, 0,
+                                 args.tolerance)
+    found = {(int(x) + bounds.x(), int(y) + bounds.y())
+             for y, x in zip(*np.nonzero(mask))}
+    if found != expected:
+        print("The fills don't match")
+        return 1
+
+    fast = timeCall(floodFill, pixels, 0, 0, args.tolerance, repeat = 5)
+    mask, bounds = floodFill(pixels, 0, 0, args.tolerance)
+    filled = int(mask.sum())
+
+    slow = runWithLargeStack(timeCall, referenceFill, sample, 0, 0,
+                             args.tolerance)
+    slow *= filled / float(len(expected))
+
+    print("Canvas: {} x {}, {} shapes, tolerance {}".format(
+        args.width, args.height, args.shapes, args.tolerance))
+    print("Filled {:.1f}% of the canvas".format(
+        100.0 * filled / (args.width * args.height)))
+    print("Recursive time measured on {} pixels and scaled up".format(
+        len(expected)))
+    print()
+    print("{:<12} {:>12}".format("fill", "time (ms)"))
+    print("{:<12} {:>12.1f}".format("scanline", fast * 1000))
+    print("{:<12} {:>12.1f}".format("recursive", slow * 1000))
+    print("speedup: {:.0f}x".format(slow / fast))
+
+    # The time to paint the mask includes making the mask image
+    print()
+    print("Bucket fill in the painter")
+    print("{:<12} {:>12}".format("step", "time (ms)"))
+    for name, seconds in timeGuiFill(image, args.tolerance):
+        print("{:<12} {:>12.1f}".format(name, seconds * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,228 @@
+"""
+Colour statistics for the RGB demo.
+The image is converted to 32-bit RGB once when it is loaded, and read
+through a NumPy view of its pixels after that, so looking at the colours
+around the mouse doesn't convert or copy the image again.
+
+The dominant palette of the image is found from random samples of its
+pixels in a background task. A median cut of a small sample gives a
+first palette quickly, which mini-batch k-means then refines on a larger
+sample, sending the palette back to the GUI after each few batches.
+"""
+# import necessary modules
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QColor, QImage
+
+# Pixels used for the first palette and for the refined one
+QUICK_SAMPLES = 20000
+FULL_SAMPLES = 1000000
+# k-means batches, and how often the palette is sent while refining
+BATCH_SIZE = 10000
+BATCHES = 60
+BATCHES_PER_UPDATE = 15
+# Bits kept of each channel when finding the most common colour of an
+# area, so that colours that differ by a little noise count as the same
+DOMINANT_BITS = 5
+
+
+def unpackRGB(values):
+    """
+    Return an array of shape (n, 3) with the red, green and blue values
+    of 0xAARRGGBB pixel values.
+    """
+    values = np.asarray(values, np.uint32).ravel()
+    return np.column_stack([(values >> 16) & 0xFF, (values >> 8) & 0xFF,
+                            values & 0xFF])
+
+
+def toColor(rgb):
+    return QColor(*(int(round(value)) for value in rgb))
+
+
+class ImageColors:
+    """
+    The pixels of an image as an array of shape (height, width), with
+    each value a pixel as 0xFFRRGGBB. A null image gives an empty array.
+    """
+
+    def __init__(self, image):
+        if image.isNull():
+            self.image = QImage()
+            self.pixels = np.empty((0, 0), np.uint32)
+            return
+        # Keep the converted image, since the array shares its memory
+        self.image = image.convertToFormat(QImage.Format_RGB32)
+        pointer = self.image.constBits()
+        pointer.setsize(self.image.sizeInBytes())
+        pixels = np.frombuffer(pointer, np.uint32).reshape(
+            self.image.height(), self.image.bytesPerLine() // 4)
+        self.pixels = pixels[:, :self.image.width()]
+
+    def valid(self, x, y):
+        height, width = self.pixels.shape
+        return 0 <= x < width and 0 <= y < height
+
+    def pixel(self, x, y):
+        return QColor(int(self.pixels[y, x]))
+
+    def region(self, x, y, size):
+        """
+        Return the pixels of the size x size square centred on (x, y),
+        cut off at the edges of the image. For an even size, the square
+        has one more pixel before (x, y) than after it.
+        """
+        before, after = size // 2, size - size // 2
+        return self.pixels[max(0, y - before):y + after,
+                           max(0, x - before):x + after]
+
+    def regionStats(self, x, y, size):
+        """
+        Return the mean, median and most common colour of the size x size
+        square centred on (x, y). In a photo almost every pixel differs
+        a little, so the colours are put in bins of DOMINANT_BITS bits per
+        channel, and the most common colour is the mean of the fullest
+        bin.
+        """
+        rgb = unpackRGB(self.region(x, y, size))
+        shift = 8 - DOMINANT_BITS
+        bins = rgb >> shift
+        bins = ((bins[:, 0] << DOMINANT_BITS | bins[:, 1]) <<
+                DOMINANT_BITS | bins[:, 2])
+        fullest = np.bincount(bins).argmax()
+        return (toColor(rgb.mean(axis = 0)),
+                toColor(np.median(rgb, axis = 0)),
+                toColor(rgb[bins == fullest].mean(axis = 0)))
+
+
+def samplePixels(pixels, count, rng):
+    """
+    Return the RGB values of count pixels chosen at random, or of every
+    pixel in random order if there are fewer than count, as floats.
+    """
+    if pixels.size <= count:
+        return unpackRGB(rng.permutation(pixels.ravel())).astype(float)
+    height, width = pixels.shape
+    rows = rng.integers(0, height, count)
+    columns = rng.integers(0, width, count)
+    return unpackRGB(pixels[rows, columns]).astype(float)
+
+
+def medianCut(rgb, count):
+    """
+    Return up to count colours for rgb, an array of shape (n, 3), by
+    splitting the box of colours with the widest range of values at its
+    median until there are count boxes.
+    """
+    boxes = [rgb]
+    while len(boxes) < count:
+        ranges = [np.ptp(box, axis = 0) for box in boxes]
+        widest = [box_range.max() if len(box) > 1 else -1
+                  for box, box_range in zip(boxes, ranges)]
+        index = int(np.argmax(widest))
+        if widest[index] <= 0:
+            break
+
+        box = boxes.pop(index)
+        channel = ranges[index].argmax()
+        half = len(box) // 2
+        order = np.argpartition(box[:, channel], half)
+        boxes += [box[order[:half]], box[order[half:]]]
+    return np.array([box.mean(axis = 0) for box in boxes])
+
+
+def nearest(rgb, centers, chunk = 262144):
+    """
+    Return the index of the closest of centers for each colour in rgb.
+    """
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 doesn't change which
+    # center is closest
+    squares = (centers ** 2).sum(axis = 1)
+    labels = np.empty(len(rgb), int)
+    for start in range(0, len(rgb), chunk):
+        distances = squares - 2 * rgb[start:start + chunk] @ centers.T
+        labels[start:start + chunk] = distances.argmin(axis = 1)
+    return labels
+
+
+def kMeansStep(rgb, centers, counts):
+    """
+    Move centers toward the mean of the colours of the batch rgb that are
+    closest to them. counts is the number of colours each center has
+    been moved by so far, and sets how far it moves. Both are updated in
+    place.
+    """
+    labels = nearest(rgb, centers)
+    batch_counts = np.bincount(labels, minlength = len(centers))
+    sums = np.column_stack([np.bincount(labels, rgb[:, channel],
+                                        len(centers))
+                            for channel in range(3)])
+    used = batch_counts > 0
+    counts += batch_counts
+    rate = (batch_counts[used] / counts[used])[:, None]
+    centers[used] += rate * (sums[used] / batch_counts[used][:, None] -
+                             centers[used])
+
+
+def palette(rgb, centers):
+    """
+    Return a list of (QColor, share) for centers, where share is the
+    fraction of rgb closest to that colour, most common first.
+    """
+    shares = np.bincount(nearest(rgb, centers),
+                         minlength = len(centers)) / float(len(rgb))
+    return [(toColor(centers[index]), float(shares[index]))
+            for index in np.argsort(-shares) if shares[index] > 0]
+
+
+class PaletteTaskSignals(QObject):
+    """
+    QRunnable does not inherit QObject, so the signals for a task
+    are defined in a separate class.
+    """
+    # job id, list of (QColor, share), True for the final palette
+    paletteReady = pyqtSignal(int, object, bool)
+
+
+class PaletteTask(QRunnable):
+    """
+    Finds the count most common colours of image_colors. The palette is
+    sent with paletteReady after the median cut, while k-means refines
+    it and once more when it is done.
+    """
+
+    def __init__(self, job_id, image_colors, count):
+        super().__init__()
+        self.job_id = job_id
+        self.image_colors = image_colors
+        self.count = count
+
+        self.signals = PaletteTaskSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        rng = np.random.default_rng(0)
+        pixels = self.image_colors.pixels
+
+        quick = samplePixels(pixels, QUICK_SAMPLES, rng)
+        centers = medianCut(quick, self.count)
+        self.signals.paletteReady.emit(self.job_id, palette(quick, centers),
+                                       False)
+
+        full = samplePixels(pixels, FULL_SAMPLES, rng)
+        counts = np.zeros(len(centers), int)
+        for batch in range(1, BATCHES + 1):
+            if self.cancelled:
+                return
+            start = rng.integers(0, max(1, len(full) - BATCH_SIZE))
+            kMeansStep(full[start:start + BATCH_SIZE], centers, counts)
+            if batch % BATCHES_PER_UPDATE == 0 and batch < BATCHES:
+                self.signals.paletteReady.emit(
+                    self.job_id, palette(quick, centers), False)
+
+        if not self.cancelled:
+            self.signals.paletteReady.emit(self.job_id,
+                                           palette(full, centers), True)
@@ -0,0 +1,131 @@
+"""
+Layer compositing for the painter GUI.
+Drawing every layer for each repaint gets slower with each layer added.
+While the user draws, only the active layer changes, so the layers below
+it and the layers above it are each flattened into one cached tile per
+tile position. A repaint then draws three tiles at each position: the
+layers below, the active layer and the layers above. The cached tiles
+are kept for each mip level, and are removed one tile position at a
+time when a layer other than the active one changes there. Everything
+is drawn with QPainter on QImages, so no GPU is needed.
+"""
+# import necessary modules
+from collections import OrderedDict
+
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+from tiled_canvas import MAX_MIP_LEVEL, TILE_FORMAT, mipLevel
+
+
+class FlattenedTiles:
+    """
+    Cached tiles of a group of layers drawn on top of each other, keyed
+    by (level, tx, ty), least recently used first. A key holds None when
+    the layers are empty there.
+    """
+
+    def __init__(self, max_tiles = 512):
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+
+    def clear(self):
+        self.tiles.clear()
+
+    def invalidate(self, key):
+        """
+        Remove the tiles of each level that include the level 0 tile key.
+        """
+        tx, ty = key
+        for level in range(MAX_MIP_LEVEL + 1):
+            self.tiles.pop((level, tx >> level, ty >> level), None)
+
+    def tile(self, layers, level, tx, ty):
+        """
+        Return the tile at (tx, ty) of the given level with layers drawn
+        on top of each other, or None if they are all empty there.
+        """
+        key = (level, tx, ty)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+
+        image = None
+        for layer in layers:
+            if not layer.visible:
+                continue
+            child = layer.tiles.mip(level, tx, ty)
+            if child is None:
+                continue
+            if image is None:
+                size = layer.tiles.tile_size
+                image = QImage(size, size, TILE_FORMAT)
+                image.fill(Qt.transparent)
+                painter = QPainter(image)
+            painter.setOpacity(layer.opacity)
+            painter.drawImage(0, 0, child)
+        if image is not None:
+            painter.end()
+
+        self.tiles[key] = image
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last = False)
+        return image
+
+
+class LayerCompositor:
+    """
+    Draws a list of layers with the layers below and above the active
+    one flattened. Call clear() when the active layer changes or layers
+    are added or removed, and invalidateLayer() when a layer that isn't
+    the active one changes.
+    """
+
+    def __init__(self, max_tiles = 512):
+        self.below = FlattenedTiles(max_tiles)
+        self.above = FlattenedTiles(max_tiles)
+
+    def clear(self):
+        self.below.clear()
+        self.above.clear()
+
+    def invalidate(self, key):
+        self.below.invalidate(key)
+        self.above.invalidate(key)
+
+    def invalidateLayer(self, layer):
+        """
+        Remove the cached tiles wherever layer has been drawn on.
+        """
+        for key in layer.tiles.keys():
+            self.invalidate(key)
+
+    def render(self, painter, layers, active, area, zoom):
+        """
+        Draw the part of the layers inside area (in canvas coordinates).
+        layers[active] is drawn as it is, and the rest from the cache.
+        painter must already be scaled by zoom.
+        """
+        below, layer, above = layers[:active], layers[active], \
+            layers[active + 1:]
+        level = mipLevel(zoom)
+        size = layer.tiles.tile_size << level
+
+        for ty in range(int(area.top() // size),
+                        int(area.bottom() // size) + 1):
+            for tx in range(int(area.left() // size),
+                            int(area.right() // size) + 1):
+                target = QRectF(tx * size, ty * size, size, size)
+                image = self.below.tile(below, level, tx, ty)
+                if image is not None:
+                    painter.drawImage(target, image)
+
+                image = layer.tiles.mip(level, tx, ty)
+                if image is not None and layer.visible:
+                    painter.setOpacity(layer.opacity)
+                    painter.drawImage(target, image)
+                    painter.setOpacity(1.0)
+
+                image = self.above.tile(above, level, tx, ty)
+                if image is not None:
+                    painter.drawImage(target, image)
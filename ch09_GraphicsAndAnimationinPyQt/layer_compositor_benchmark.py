@@ -0,0 +1,135 @@
+"""
+Benchmark for the painter's layer compositing.
+Fills a stack of layers with random strokes and times repainting a
+screen sized view of them while a stroke is drawn on the middle layer,
+once by drawing every layer and once with LayerCompositor. Everything is
+drawn into a QImage, so the timings are for CPU raster painting.
+
+    python layer_compositor_benchmark.py
+    python layer_compositor_benchmark.py --layers 10 50 100 --zoom 0.5
+"""
+# import necessary modules
+import argparse
+import random
+import sys
+import time
+
+from PyQt5.QtCore import QPointF, QRect, QRectF, Qt
+from PyQt5.QtGui import QColor, QGuiApplication, QImage, QPainter, QPen
+
+from layer_compositor import LayerCompositor
+from layered_document import Layer
+from tiled_canvas import TILE_FORMAT
+
+
+def createLayers(count, width, height, strokes):
+    """
+    Return count layers, each with strokes random lines drawn on it.
+    """
+    rng = random.Random(count)
+    layers = []
+    for i in range(count):
+        layer = Layer("Layer {}".format(i + 1), i)
+        for j in range(strokes):
+            x1, y1 = rng.uniform(0, width), rng.uniform(0, height)
+            x2, y2 = rng.uniform(0, width), rng.uniform(0, height)
+            pen = QPen(QColor(rng.randint(0, 255), rng.randint(0, 255),
+                              rng.randint(0, 255), rng.randint(64, 255)),
+                       rng.uniform(2, 30), Qt.SolidLine, Qt.RoundCap)
+
+            def draw(painter, x1 = x1, y1 = y1, x2 = x2, y2 = y2,
+                     pen = pen):
+                painter.setRenderHint(QPainter.Antialiasing)
+                painter.setPen(pen)
+                painter.drawLine(QPointF(x1, y1), QPointF(x2, y2))
+
+            bounds = QRectF(QPointF(x1, y1), QPointF(x2, y2)).normalized()
+            margin = int(pen.widthF()) + 2
+            layer.tiles.paint(bounds.toAlignedRect().adjusted(
+                -margin, -margin, margin, margin), draw)
+        layer.tiles.endPainting()
+        layers.append(layer)
+    return layers
+
+
+def paintAll(painter, layers, active, area, zoom):
+    for layer in layers:
+        if layer.visible:
+            painter.setOpacity(layer.opacity)
+            layer.tiles.render(painter, area, zoom)
+    painter.setOpacity(1.0)
+
+
+def timeFrames(render, layers, active, width, height, zoom, frames):
+    """
+    Draw a short stroke on the active layer before each frame, then
+    repaint the view. Returns the time of the first frame and the mean
+    time of the others, in seconds.
+    """
+    target = QImage(width, height, TILE_FORMAT)
+    area = QRectF(0, 0, width / zoom, height / zoom)
+    pen = QPen(Qt.black, 8, Qt.SolidLine, Qt.RoundCap)
+    times = []
+    for frame in range(frames):
+        x = area.width() * frame / frames
+
+        def draw(painter, x = x):
+            painter.setPen(pen)
+            painter.drawLine(QPointF(x, area.height() / 2),
+                             QPointF(x + 20, area.height() / 2 + 20))
+
+        layers[active].tiles.paint(QRect(int(x) - 10, int(
+            area.height() / 2) - 10, 50, 50), draw)
+        layers[active].tiles.endPainting()
+
+        start = time.perf_counter()
+        target.fill(Qt.white)
+        painter = QPainter(target)
+        painter.scale(zoom, zoom)
+        render(painter, layers, active, area, zoom)
+        painter.end()
+        times.append(time.perf_counter() - start)
+    return times[0], sum(times[1:]) / (len(times) - 1)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark layers.")
+    parser.add_argument("--layers", type = int, nargs = "+",
+                        default = [10, 50])
+    parser.add_argument("--width", type = int, default = 1920)
+    parser.add_argument("--height", type = int, default = 1080)
+    parser.add_argument("--strokes", type = int, default = 20,
+                        help = "strokes drawn on each layer")
+    parser.add_argument("--zoom", type = float, default = 1.0)
+    parser.add_argument("--frames", type = int, default = 30)
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication.instance() or QGuiApplication(
+        ["layer_compositor_benchmark", "-platform", "offscreen"])
+
+    print("View: {} x {} at zoom {}, {} strokes per layer, {} frames".format(
+        args.width, args.height, args.zoom, args.strokes, args.frames))
+    print()
+    print("{:>6} {:<12} {:>16} {:>16}".format(
+        "layers", "compositing", "first frame (ms)", "per frame (ms)"))
+
+    for count in args.layers:
+        layers = createLayers(count, args.width / args.zoom,
+                              args.height / args.zoom, args.strokes)
+        active = count // 2
+        naive = timeFrames(paintAll, layers, active, args.width,
+                           args.height, args.zoom, args.frames)
+        compositor = LayerCompositor()
+        cached = timeFrames(compositor.render, layers, active, args.width,
+                            args.height, args.zoom, args.frames)
+
+        for name, (first, mean) in (("all layers", naive),
+                                    ("cached", cached)):
+            print("{:>6} {:<12} {:>16.1f} {:>16.1f}".format(
+                count, name, first * 1000, mean * 1000))
+        print("{:>6} speedup: {:.1f}x".format("", naive[1] / cached[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,228 @@
+"""
+Layers and the layered document format for the painter GUI.
+A document is a zip file. manifest/<n>.json lists the layers and, for
+each layer, the zip entry that holds each of its tiles. Tiles are stored
+as raw premultiplied ARGB pixels, compressed by the zip file.
+
+Opening a document only reads the manifest. Each tile is read from the
+zip file the first time it is drawn, so only the tiles that are shown
+are decoded. Saving again appends the tiles that changed since the last
+save and a new manifest to the end of the zip file, so it takes time in
+proportion to what changed. The highest numbered manifest is the current
+one. When most of the file is old tiles and manifests, it is rewritten.
+"""
+# import necessary modules
+import json
+import os
+import tempfile
+import zipfile
+from functools import partial
+
+from PyQt5.QtGui import QImage
+
+from stroke_model import StrokeDocument
+from tiled_canvas import TILE_FORMAT, TileStore
+
+FORMAT_VERSION = 1
+
+# Rewrite the whole file when it is this many times the size of the
+# entries it still uses
+COMPACT_RATIO = 2.0
+
+
+class Layer:
+    """
+    A layer of the drawing. Each layer has its own tiles and undo history.
+    """
+
+    def __init__(self, name, layer_id, tiles = None):
+        self.name = name
+        self.id = layer_id
+        self.tiles = tiles if tiles is not None else TileStore()
+        self.visible = True
+        self.opacity = 1.0
+
+        self.document = StrokeDocument()
+        self.raster_history = None
+
+
+def tileEntry(layer_id, key, generation):
+    return "layers/{}/{}_{}_{}".format(layer_id, key[0], key[1], generation)
+
+
+class LayerFile:
+    """
+    A layered document on disk. Use load() to open it and save() to write
+    layers to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = None
+        self.generation = 0
+        # Zip entry of each tile, for each layer id
+        self.entries = {}
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+
+    def load(self):
+        """
+        Read the manifest and return the document's layers, with their
+        tiles added unloaded.
+        """
+        self.close()
+        try:
+            self.zip = zipfile.ZipFile(self.path, "r")
+        except zipfile.BadZipFile:
+            raise ValueError("{} is not a layered document".format(
+                self.path))
+        manifests = [name for name in self.zip.namelist()
+                     if name.startswith("manifest/")]
+        if not manifests:
+            self.close()
+            raise ValueError("{} is not a layered document".format(
+                self.path))
+        latest = max(manifests,
+                     key = lambda name: int(name.split("/")[1].split(".")[0]))
+        manifest = json.loads(self.zip.read(latest))
+        self.generation = manifest["generation"]
+
+        layers = []
+        self.entries = {}
+        for info in manifest["layers"]:
+            layer = Layer(info["name"], info["id"],
+                          TileStore(manifest["tile_size"]))
+            layer.visible = info["visible"]
+            layer.opacity = info["opacity"]
+
+            entries = {}
+            for tx, ty, entry in info["tiles"]:
+                entries[(tx, ty)] = entry
+                layer.tiles.addUnloaded((tx, ty), partial(
+                    self.readTile, entry, layer.tiles.tile_size))
+            self.entries[layer.id] = entries
+            layers.append(layer)
+        return layers
+
+    def readTile(self, entry, size):
+        data = self.zip.read(entry)
+        # Copy so the tile doesn't point into the bytes object
+        return QImage(data, size, size, size * 4, TILE_FORMAT).copy()
+
+    def save(self, layers):
+        """
+        Write layers to the file. If the file was opened or saved before,
+        only the tiles changed since then are written.
+        """
+        if self.zip is None:
+            self.rewrite(layers)
+            return
+
+        # The file is only opened for writing while saving, so opening a
+        # document never changes it, and read-only files can be opened.
+        # Tiles that aren't loaded yet are read from the same zip file.
+        # It is opened before the read-only one is closed, so that the
+        # document can still be read if it can't be written to.
+        writer = zipfile.ZipFile(self.path, "a")
+        self.zip.close()
+        self.zip = writer
+        self.generation += 1
+        for layer in layers:
+            entries = self.entries.setdefault(layer.id, {})
+            if not layer.tiles.dirty:
+                continue
+            for key in layer.tiles.dirty:
+                data = layer.tiles.tileBytes(key)
+                if data is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = tileEntry(layer.id, key, self.generation)
+                    self.zip.writestr(entries[key], data,
+                                      zipfile.ZIP_DEFLATED, 1)
+            layer.tiles.dirty.clear()
+
+        ids = {layer.id for layer in layers}
+        for layer_id in list(self.entries):
+            if layer_id not in ids:
+                del self.entries[layer_id]
+        self.writeManifest(self.zip, layers)
+
+        # Closing writes the zip file's directory
+        self.zip.close()
+        self.zip = zipfile.ZipFile(self.path, "r")
+        if self.fileSize() > COMPACT_RATIO * self.usedSize() + 1024 * 1024:
+            self.rewrite(layers)
+
+    def saveAs(self, path, layers):
+        """
+        Write layers to a new file, which is used from then on.
+        """
+        self.path = path
+        self.rewrite(layers)
+
+    def rewrite(self, layers):
+        """
+        Write a new file with only the entries that are used. Tiles that
+        haven't changed are copied from the old file without decoding.
+        """
+        self.generation += 1
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(suffix = ".tmp",
+                                             dir = directory)
+        os.close(handle)
+
+        entries = {}
+        with zipfile.ZipFile(temp_path, "w") as new_zip:
+            for layer in layers:
+                old_entries = self.entries.get(layer.id, {})
+                layer_entries = entries[layer.id] = {}
+                for key in layer.tiles.keys():
+                    if key in old_entries and key not in layer.tiles.dirty:
+                        entry = old_entries[key]
+                        data = self.zip.read(entry)
+                    else:
+                        entry = tileEntry(layer.id, key, self.generation)
+                        data = layer.tiles.tileBytes(key)
+                    layer_entries[key] = entry
+                    new_zip.writestr(entry, data, zipfile.ZIP_DEFLATED, 1)
+                layer.tiles.dirty.clear()
+
+            self.entries = entries
+            self.writeManifest(new_zip, layers)
+
+        self.close()
+        os.replace(temp_path, self.path)
+        self.zip = zipfile.ZipFile(self.path, "r")
+
+    def writeManifest(self, zip_file, layers):
+        manifest = {
+            "version": FORMAT_VERSION,
+            "generation": self.generation,
+            "tile_size": layers[0].tiles.tile_size if layers else 0,
+            "layers": [{
+                "id": layer.id,
+                "name": layer.name,
+                "visible": layer.visible,
+                "opacity": layer.opacity,
+                "tiles": [[key[0], key[1], entry] for key, entry in
+                          sorted(self.entries[layer.id].items())]
+            } for layer in layers]
+        }
+        zip_file.writestr("manifest/{}.json".format(self.generation),
+                          json.dumps(manifest), zipfile.ZIP_DEFLATED)
+
+    def fileSize(self):
+        return os.path.getsize(self.path)
+
+    def usedSize(self):
+        """
+        Return the compressed size of the tiles the manifest uses.
+        """
+        used = 0
+        for entries in self.entries.values():
+            for entry in entries.values():
+                used += self.zip.getinfo(entry).compress_size
+        return used
@@ -8,7 +8,7 @@ import sys
 
 from PyQt5.QtCore import QPoint, QRect, Qt
 from PyQt5.QtGui import (QBrush, QColor, QFont, QLinearGradient, QPainter,
-                         QPainterPath, QPen, QPolygon)
+                         QPainterPath, QPen, QPixmap, QPolygon)
 from PyQt5.QtWidgets import QApplication, QWidget
 
 
@@ -34,14 +34,40 @@ class Drawing(QWidget):
         self.red = '#E00C0C'
         self.orange = '#FF930A'
 
+        # The drawing never changes, so it is drawn once into a pixmap
+        # that each paint event copies to the widget. The pixmap is made
+        # again when the size or the device pixel ratio changes.
+        self.cache = None
+
         self.show()
 
     def paintEvent(self, event):
         """
         Create QPainter object and handle paint events.
         """
+        ratio = self.devicePixelRatioF()
+        if self.cache is None or self.cache.devicePixelRatio() != ratio:
+            self.cache = self.renderDrawing(ratio)
+
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.cache)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.cache = None
+        super().resizeEvent(event)
+
+    def renderDrawing(self, ratio):
+        """
+        Return a pixmap with the drawing on a transparent background, with
+        ratio device pixels for each pixel.
+        """
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+
         painter = QPainter()
-        painter.begin(self)
+        painter.begin(pixmap)
         # Use antialiasing to smooth curved edges
         painter.setRenderHint(QPainter.Antialiasing)
 
@@ -56,6 +82,7 @@ class Drawing(QWidget):
         self.drawGradients(painter)
 
         painter.end()
+        return pixmap
 
     def drawPoints(self, painter):
         """
@@ -202,7 +229,8 @@ class Drawing(QWidget):
         """
         height, width = self.height(), self.width()
 
-        center_x, center_y = (width / 2), height - 100
+        # QPoint only takes ints, so the centre is found with //
+        center_x, center_y = (width // 2), height - 100
         radius_x, radius_y = 60, 60
 
         pen = QPen(Qt.black, 2, Qt.SolidLine)
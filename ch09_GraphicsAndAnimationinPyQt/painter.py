@@ -6,46 +6,170 @@ Featured in "Beginning Pyqt - A Hands-on Approach to GUI Programming"
 # import necessary modules
 import os
 import sys
+import time
+from collections import deque
 
-from PyQt5.QtCore import QPoint, QRect, QSize, Qt
-from PyQt5.QtGui import (QColor, QFont, QIcon, QPainter, QPen, QPixmap)
-from PyQt5.QtWidgets import (QAction, QApplication, QColorDialog, QFileDialog,
-                             QLabel, QMainWindow, QStatusBar, QToolBar,
-                             QToolTip)
+from PyQt5.QtCore import (QEvent, QPointF, QRect, QRectF, QSize, Qt, QTimer,
+                          pyqtSignal)
+from PyQt5.QtGui import QColor, QFont, QIcon, QImage, QPainter, QPen
+from PyQt5.QtWidgets import (QAction, QApplication, QColorDialog, QDockWidget,
+                             QFileDialog, QHBoxLayout, QLabel, QListWidget,
+                             QListWidgetItem, QMainWindow, QMessageBox,
+                             QPushButton, QSpinBox, QStatusBar, QToolBar,
+                             QToolTip, QVBoxLayout, QWidget)
+
+from flood_fill import floodFill, maskImage, pixelArray
+from layer_compositor import LayerCompositor
+from layered_document import Layer, LayerFile
+from raster_history import RasterHistory
+from stroke_engine import StrokeEngine, drawSamples
+from stroke_model import ERASER_SIZE, Stroke
+
+# Queued stroke points are drawn once per frame, about 60 times a second
+FRAME_INTERVAL = 16
+
+# Area in the top left corner of the canvas used by the performance overlay
+OVERLAY_RECT = QRect(0, 0, 330, 22)
+
+# Colour used to show the area selected with the magic wand
+SELECTION_COLOR = QColor(0, 120, 215, 80)
+
+# Limits for zooming with the mouse wheel
+MIN_ZOOM = 1 / 64
+MAX_ZOOM = 16
+
+# Most canvas pixels the bucket fill and magic wand work on at once.
+# Zoomed out, far more than this is on screen, so they only use the part
+# around the click.
+FILL_MAX_PIXELS = 4096 * 4096
+
+
+class RateCounter:
+    """
+    Counts how many times something happened in the last second.
+    """
+
+    def __init__(self):
+        self.times = deque()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.times.append(now)
+        self.expire(now)
+
+    def expire(self, now):
+        while self.times and now - self.times[0] > 1.0:
+            self.times.popleft()
+
+    def rate(self):
+        self.expire(time.perf_counter())
+        return len(self.times)
 
 
 # Creates widget to be drawn on.
 class Canvas(QLabel):
+    # Emitted when layers are added, removed or selected
+    layersChanged = pyqtSignal()
 
     def __init__(self, parent):
         super().__init__(parent)
         width, height = 900, 600
 
         self.parent = parent
-        self.parent.setFixedSize(width, height)
+        self.parent.resize(width, height)
 
-        # Create pixmap object that will act as the canvas
-        pixmap = QPixmap(width, height)  # width, height
-        pixmap.fill(Qt.white)
-        self.setPixmap(pixmap)
+        # The canvas has no fixed size. Each layer is stored in tiles that
+        # are only created where something is drawn, and the widget shows
+        # part of it, moved by offset (in canvas coordinates) and zoom.
+        # self.tiles is the tiles of the layer being drawn on.
+        self.layers = [Layer("Layer 1", 0)]
+        self.next_layer_id = 1
+        self.active_layer = 0
+        # Layered document the drawing was opened from or saved to
+        self.layer_file = None
+        # Keeps the layers below and above the active one flattened
+        self.compositor = LayerCompositor()
+        self.offset = QPointF(0, 0)
+        self.zoom = 1.0
+        self.pan_pos = None
 
-        # Keep track of the mouse for getting mouse coordinates
+        # Keep track of the mouse for getting mouse coordinates. The label
+        # is added to the status bar once by the main window, and its text
+        # is updated at most once per frame with the latest position.
         self.mouse_track_label = QLabel()
         self.setMouseTracking(True)
+        self.status_pos = None
+
+        self.status_timer = QTimer(self)
+        self.status_timer.setSingleShot(True)
+        self.status_timer.setInterval(FRAME_INTERVAL)
+        self.status_timer.timeout.connect(self.updateStatus)
 
         # Initialize variables
         self.antialiasing_status = False
         self.eraser_selected = False
+        self.stroke_eraser_selected = False
+        self.fill_selected = False
+        self.wand_selected = False
+
+        # Colours within this distance of the one clicked on are included
+        # by the bucket fill and the magic wand
+        self.fill_tolerance = 32
+
+        # Area selected with the magic wand, as a mask and its position
+        self.selection_mask = None
+        self.selection_rect = QRect()
+        self.selection_image = None
+
+        # Every stroke is also recorded as a vector stroke in the layer's
+        # document, which is used to redraw parts of the canvas for undo
+        # and redo
+        self.current_stroke = None
+        self.erased_strokes = []
+
+        # For raster only drawing, undo can instead save the tiles that
+        # each stroke changes. Set by setRasterHistory().
+        self.use_raster_history = False
 
-        self.last_mouse_pos = QPoint()
+        self.last_mouse_pos = QPointF()
         self.drawing = False
+        self.selectLayer(0)
         self.pen_color = Qt.black
         self.pen_width = 2
 
+        # Mouse positions received since the last frame was drawn. They are
+        # drawn together once per frame. The tiles keep their painters
+        # open until the stroke ends, and stroke_setup sets up each one.
+        self.stroke_setup = None
+        self.pending_points = []
+        self.pending_pressures = []
+        self.pending_since = None
+
+        # Smooths the pen's strokes and sets their width from the
+        # pressure of a tablet pen
+        self.stroke_engine = StrokeEngine()
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(FRAME_INTERVAL)
+        self.frame_timer.timeout.connect(self.flushStroke)
+
+        # Frame rate, mouse event rate and input latency overlay
+        self.show_overlay = False
+        self.paint_rate = RateCounter()
+        self.event_rate = RateCounter()
+        self.flushed_at = None
+        self.latency = 0.0
+
     def selectDrawingTool(self, tool):
         """
         Determine which tool in the toolbar has been selected.
         """
+        self.stroke_eraser_selected = False
+        if tool != "color":
+            self.fill_selected = False
+            self.wand_selected = False
+
         if tool == "pencil":
             self.eraser_selected = False
             self.pen_width = 2
@@ -54,6 +178,18 @@ class Canvas(QLabel):
             self.pen_width = 8
         elif tool == "eraser":
             self.eraser_selected = True
+        elif tool == "stroke_eraser":
+            # Removes whole strokes that the eraser touches. There are no
+            # strokes to remove with the raster history, so it acts like
+            # the normal eraser.
+            self.eraser_selected = self.raster_history is not None
+            self.stroke_eraser_selected = self.raster_history is None
+        elif tool == "fill":
+            self.eraser_selected = False
+            self.fill_selected = True
+        elif tool == "magic_wand":
+            self.eraser_selected = False
+            self.wand_selected = True
         elif tool == "color":
             self.eraser_selected = False
             color = QColorDialog.getColor()
@@ -65,52 +201,546 @@ class Canvas(QLabel):
         Handle mouse movements.
         Track coordinates of mouse in window and display in the status bar.
         """
-        mouse_pos = event.pos()
+        self.event_rate.tick()
+        mouse_pos = self.toCanvas(event.pos())
 
-        if (event.buttons() and Qt.LeftButton) and self.drawing:
-            self.mouse_pos = event.pos()
+        if (event.buttons() & Qt.LeftButton) and self.drawing:
             self.drawOnCanvas(mouse_pos)
+        elif (event.buttons() & Qt.MiddleButton) and self.pan_pos is not None:
+            self.pan(event.pos())
+
+        # Only the last position before the timer fires is shown
+        self.status_pos = mouse_pos
+        if not self.status_timer.isActive():
+            self.status_timer.start()
 
+    def updateStatus(self):
+        """
+        Show the latest mouse coordinates in the status bar.
+        """
+        if self.status_pos is None:
+            return
         self.mouse_track_label.setVisible(True)
-        sb_text = "Mouse Coordinates: ({}, {})".format(mouse_pos.x(),
-                                                       mouse_pos.y())
+        sb_text = "Mouse Coordinates: ({}, {})".format(
+            int(self.status_pos.x()), int(self.status_pos.y()))
         self.mouse_track_label.setText(sb_text)
-        self.parent.status_bar.addWidget(self.mouse_track_label)
+        self.status_pos = None
+
+        if self.show_overlay:
+            self.update(OVERLAY_RECT)
+
+    def tabletEvent(self, event):
+        """
+        Draw with a tablet pen, using its pressure. Accepting the event
+        stops Qt from also sending it as a mouse event.
+        """
+        pos = self.toCanvas(event.posF())
+        if event.type() == QEvent.TabletPress and \
+                event.button() == Qt.LeftButton:
+            if self.useAreaTool(pos):
+                event.accept()
+                return
+            self.beginStroke(pos, event.pressure())
+            self.drawing = True
+        elif event.type() == QEvent.TabletMove and self.drawing:
+            self.drawOnCanvas(pos, event.pressure())
+        elif event.type() == QEvent.TabletRelease and self.drawing:
+            self.endStroke()
+            self.drawing = False
+        event.accept()
 
-    def drawOnCanvas(self, points):
+    def drawOnCanvas(self, points, pressure = 1.0):
         """
-        Performs drawing on canvas.
+        Queue a point of the stroke. Points are drawn once per frame by
+        flushStroke(), rather than for every mouse move event.
         """
-        painter = QPainter(self.pixmap())
+        if not self.pending_points:
+            self.pending_since = time.perf_counter()
+        self.pending_points.append(points)
+        self.pending_pressures.append(pressure)
 
-        if self.antialiasing_status:
-            painter.setRenderHint(QPainter.Antialiasing)
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
 
-        if self.eraser_selected == False:
-            pen = QPen(QColor(self.pen_color), self.pen_width)
+    def beginStroke(self, pos, pressure = 1.0):
+        """
+        Set up the painting of a stroke. pos is in canvas coordinates.
+        """
+        pen = QPen(QColor(self.pen_color), self.pen_width, Qt.SolidLine,
+                   Qt.RoundCap, Qt.RoundJoin)
+        antialiasing = self.antialiasing_status
+        erasing = self.eraser_selected
+
+        def setup(painter):
+            # Called for the painter of each tile the stroke touches
             painter.setPen(pen)
-            painter.drawLine(self.last_mouse_pos, points)
+            if antialiasing:
+                painter.setRenderHint(QPainter.Antialiasing)
+            if erasing:
+                # The eraser makes the canvas transparent again
+                painter.setCompositionMode(QPainter.CompositionMode_Clear)
+
+        self.stroke_setup = setup
+        self.last_mouse_pos = pos
+
+        if self.raster_history is not None:
+            self.raster_history.beginStep()
+        elif not self.stroke_eraser_selected:
+            tool = "eraser" if self.eraser_selected else "pen"
+            self.current_stroke = Stroke(tool, self.pen_color,
+                                         self.pen_width,
+                                         self.antialiasing_status)
+        self.stroke_engine.begin(pos.x(), pos.y(), pressure)
+
+    def endStroke(self):
+        """
+        Draw any points that are left and close the tiles' painters.
+        """
+        self.flushStroke()
+        if self.stroke_setup is not None and not self.eraser_selected and \
+                not self.stroke_eraser_selected:
+            dirty = self.drawSamples(self.stroke_engine.finish())
+            if not dirty.isEmpty():
+                self.update(self.toWidget(dirty))
+        self.tiles.endPainting()
+        self.stroke_setup = None
+
+        if self.current_stroke is not None:
+            self.document.addStroke(self.current_stroke)
+            self.current_stroke = None
+        if self.erased_strokes:
+            self.document.recordRemoval(self.erased_strokes)
+            self.erased_strokes = []
+        if self.raster_history is not None:
+            self.raster_history.endStep(self.tiles)
+
+    def flushStroke(self):
+        """
+        Draw the points queued since the last frame, then repaint only
+        the area that they cover.
+        """
+        self.frame_timer.stop()
+        if not self.pending_points or self.stroke_setup is None:
+            return
+
+        points = self.pending_points
+        pressures = self.pending_pressures
+        self.pending_points = []
+        self.pending_pressures = []
 
+        if self.current_stroke is not None and self.eraser_selected:
+            for point in points:
+                self.current_stroke.addPoint(point.x(), point.y())
+
+        if self.stroke_eraser_selected:
+            # Remove the strokes under the eraser, then redraw the area
+            # they covered from the strokes that are left
+            dirty = QRect()
+            for point in points:
+                eraser = QRectF(point.x(), point.y(), ERASER_SIZE,
+                                ERASER_SIZE).toAlignedRect()
+                hits = self.document.hitTest(eraser)
+                self.erased_strokes.extend(hits)
+                dirty = dirty.united(
+                    self.document.removeStrokes(hits, record = False))
+            if not dirty.isEmpty():
+                self.tiles.paint(dirty, lambda painter:
+                                 self.document.render(painter, dirty),
+                                 self.stroke_setup)
+        elif self.eraser_selected == False:
+            # The whole frame's points are smoothed together
+            samples = self.stroke_engine.add([point.x() for point in points],
+                                             [point.y() for point in points],
+                                             pressures)
+            dirty = self.drawSamples(samples)
             # Update the mouse's position for next movement
-            self.last_mouse_pos = points
-        elif self.eraser_selected == True:
+            self.last_mouse_pos = points[-1]
+        else:
             # Use the eraser
-            eraser = QRect(points.x(), points.y(), 12, 12)
-            painter.eraseRect(eraser)
+            erasers = [QRectF(point.x(), point.y(), ERASER_SIZE, ERASER_SIZE)
+                       for point in points]
+            dirty = QRect()
+            for eraser in erasers:
+                dirty = dirty.united(eraser.toAlignedRect())
+            self.captureArea(dirty)
 
-        painter.end()
-        self.update()
+            def erase(painter):
+                for eraser in erasers:
+                    painter.fillRect(eraser, Qt.white)
+            self.tiles.paint(dirty, erase, self.stroke_setup)
+
+        self.flushed_at = self.pending_since
+        self.update(self.toWidget(dirty))
+        if self.show_overlay:
+            self.update(OVERLAY_RECT)
+
+    def drawSamples(self, samples):
+        """
+        Draw smoothed samples of the pen's stroke and add them to the
+        vector stroke. Returns the area that was painted.
+        """
+        if len(samples) < 2:
+            return QRect()
+
+        # Each group of samples starts where the last one ended
+        stroke = self.current_stroke
+        if stroke is not None:
+            start = 1 if stroke.pointCount() else 0
+            for x, y, pressure in samples[start:].tolist():
+                stroke.addPoint(x, y, pressure)
+
+        # Include half of the pen width on each side, plus a pixel
+        # for antialiasing
+        margin = self.pen_width // 2 + 2
+        left, top = samples[:, :2].min(axis = 0)
+        right, bottom = samples[:, :2].max(axis = 0)
+        dirty = QRectF(left, top, right - left, bottom - top
+                       ).toAlignedRect().adjusted(-margin, -margin,
+                                                  margin, margin)
+        self.captureArea(dirty)
+
+        self.tiles.paint(dirty, lambda painter:
+                         drawSamples(painter, samples, self.pen_width),
+                         self.stroke_setup)
+        return dirty
+
+    def captureArea(self, rect):
+        """
+        Save the tiles under rect for undo, before painting into rect.
+        """
+        if self.raster_history is not None:
+            self.raster_history.capture(self.tiles, rect)
+        else:
+            self.document.capture(self.tiles, rect)
+
+    def useAreaTool(self, pos):
+        """
+        Use the bucket fill or the magic wand at pos, if one is selected.
+        Both work on the part of the canvas that is on screen, as it looks
+        with all of the visible layers, up to FILL_MAX_PIXELS of it
+        around pos. Returns True if a tool was used.
+        """
+        if not (self.fill_selected or self.wand_selected):
+            return False
+
+        region = self.fillRegion(pos)
+        x, y = int(pos.x()) - region.x(), int(pos.y()) - region.y()
+        if not (0 <= x < region.width() and 0 <= y < region.height()):
+            return True
+
+        image = self.flattenImage(region)
+        mask, bounds = floodFill(pixelArray(image), x, y,
+                                 self.fill_tolerance)
+        bounds.translate(region.topLeft())
+        if self.fill_selected:
+            self.fillMask(mask, bounds, self.pen_color)
+        else:
+            self.setSelection(mask, bounds)
+        return True
+
+    def fillRegion(self, pos):
+        """
+        Return the area of the canvas the area tools work on for a click
+        at pos: the area on screen, shrunk around pos to FILL_MAX_PIXELS
+        if it is larger.
+        """
+        region = self.visibleRect()
+        pixels = region.width() * region.height()
+        if pixels > FILL_MAX_PIXELS:
+            scale = (FILL_MAX_PIXELS / pixels) ** 0.5
+            size = region.size() * scale
+            window = QRectF(pos.x() - size.width() / 2,
+                            pos.y() - size.height() / 2,
+                            size.width(), size.height())
+            # Keep the window on screen, so it is only cut short when
+            # the click is near the edge
+            window.moveLeft(min(max(window.left(), region.left()),
+                                region.right() - window.width()))
+            window.moveTop(min(max(window.top(), region.top()),
+                               region.bottom() - window.height()))
+            region = window
+        return region.toAlignedRect()
+
+    def fillMask(self, mask, rect, color):
+        """
+        Paint color into the area of mask, which covers rect of the canvas.
+        """
+        image = maskImage(mask, color)
+        if self.raster_history is not None:
+            self.raster_history.beginStep()
+        self.captureArea(rect)
+
+        self.tiles.paint(rect, lambda painter:
+                         painter.drawImage(rect.topLeft(), image))
+        self.tiles.endPainting()
+
+        if self.raster_history is not None:
+            self.raster_history.endStep(self.tiles)
+        else:
+            # Record the fill so that it can be undone like a stroke
+            stroke = Stroke("fill", color, 0)
+            stroke.image = image
+            stroke.addPoint(rect.left(), rect.top())
+            stroke.addPoint(rect.left() + rect.width(),
+                            rect.top() + rect.height())
+            self.document.addStroke(stroke)
+        self.update(self.toWidget(rect))
+
+    def setSelection(self, mask, rect):
+        """
+        Select the area of mask, which covers rect of the canvas.
+        """
+        self.clearSelection()
+        self.selection_mask = mask
+        self.selection_rect = rect
+        self.selection_image = maskImage(mask, SELECTION_COLOR)
+        self.update(self.toWidget(rect))
+
+    def clearSelection(self):
+        if self.selection_mask is not None:
+            self.update(self.toWidget(self.selection_rect))
+        self.selection_mask = None
+        self.selection_rect = QRect()
+        self.selection_image = None
+
+    def fillSelection(self):
+        """
+        Fill the area selected with the magic wand with the pen colour.
+        """
+        if self.selection_mask is not None and not self.drawing:
+            self.fillMask(self.selection_mask, self.selection_rect,
+                          self.pen_color)
 
     def newCanvas(self):
         """
         Clears the current canvas.
         """
-        self.pixmap().fill(Qt.white)
+        if self.drawing:
+            return
+        self.clearSelection()
+        self.setLayers([Layer("Layer 1", 0)])
+        if self.layer_file is not None:
+            self.layer_file.close()
+            self.layer_file = None
+
+    # Layers
+    def setLayers(self, layers):
+        """
+        Replace all of the layers, and draw on the top one.
+        """
+        for layer in layers:
+            if self.use_raster_history:
+                layer.raster_history = RasterHistory()
+        self.layers = layers
+        self.next_layer_id = max(layer.id for layer in layers) + 1
+        self.selectLayer(len(layers) - 1)
         self.update()
 
+    def selectLayer(self, index):
+        """
+        Draw on the layer at index. Layer 0 is the bottom layer.
+        """
+        if self.drawing or not 0 <= index < len(self.layers):
+            return
+        self.active_layer = index
+        self.compositor.clear()
+        layer = self.layers[index]
+        self.tiles = layer.tiles
+        self.document = layer.document
+        self.raster_history = layer.raster_history
+        self.layersChanged.emit()
+
+    def addLayer(self):
+        """
+        Add an empty layer above the one being drawn on.
+        """
+        if self.drawing:
+            return
+        layer = Layer("Layer {}".format(self.next_layer_id + 1),
+                      self.next_layer_id)
+        if self.use_raster_history:
+            layer.raster_history = RasterHistory()
+        self.next_layer_id += 1
+        self.layers.insert(self.active_layer + 1, layer)
+        self.selectLayer(self.active_layer + 1)
+
+    def removeLayer(self):
+        """
+        Remove the layer being drawn on, unless it is the only one.
+        """
+        if self.drawing or len(self.layers) == 1:
+            return
+        layer = self.layers.pop(self.active_layer)
+        self.update(self.toWidget(layer.tiles.contentBounds()))
+        self.selectLayer(max(0, self.active_layer - 1))
+
+    def setLayerVisible(self, index, visible):
+        layer = self.layers[index]
+        if layer.visible != visible:
+            layer.visible = visible
+            self.compositor.invalidateLayer(layer)
+            self.update(self.toWidget(layer.tiles.contentBounds()))
+
+    def contentBounds(self):
+        """
+        Return the area drawn on in any layer, or the area on screen if
+        nothing has been drawn.
+        """
+        bounds = QRect()
+        for layer in self.layers:
+            bounds = bounds.united(layer.tiles.contentBounds())
+        if bounds.isEmpty():
+            bounds = self.visibleRect().toAlignedRect()
+        return bounds
+
+    def flattenImage(self, rect):
+        """
+        Return an image of rect with the visible layers drawn over white.
+        """
+        image = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.translate(-rect.topLeft())
+        # The tiles of a layer don't overlap, so they can be drawn with
+        # the layer's opacity one by one, without first putting the
+        # layer together in an image of its own
+        for layer in self.layers:
+            if layer.visible:
+                painter.setOpacity(layer.opacity)
+                for key in layer.tiles.keysIn(rect):
+                    tile = layer.tiles.tile(key)
+                    if tile is not None:
+                        painter.drawImage(
+                            layer.tiles.tileRect(key).topLeft(), tile)
+        painter.end()
+        return image
+
+    def setRasterHistory(self, state):
+        """
+        Switch between undo with vector strokes and undo with saved
+        tiles. The history of the previous mode is cleared.
+        """
+        if self.drawing:
+            return
+        self.use_raster_history = state
+        for layer in self.layers:
+            layer.document.clear()
+            if layer.raster_history is not None:
+                layer.raster_history.clear()
+            layer.raster_history = RasterHistory() if state else None
+        self.raster_history = self.layers[self.active_layer].raster_history
+        self.stroke_eraser_selected = False
+
+    def undo(self):
+        """
+        Undo the last stroke. Only the area the stroke covered is redrawn,
+        using the strokes found there by the spatial index.
+        """
+        if self.drawing:
+            return
+        if self.raster_history is not None:
+            self.update(self.toWidget(self.raster_history.undo(self.tiles)))
+        else:
+            self.redrawArea(self.document.undo())
+
+    def redo(self):
+        if self.drawing:
+            return
+        if self.raster_history is not None:
+            self.update(self.toWidget(self.raster_history.redo(self.tiles)))
+        else:
+            self.redrawArea(self.document.redo())
+
+    def redrawArea(self, rect):
+        if rect.isEmpty():
+            return
+
+        self.tiles.paint(rect, lambda painter:
+                         self.document.render(painter, rect))
+        self.tiles.endPainting()
+        self.update(self.toWidget(rect))
+
+    # Converting between widget and canvas coordinates
+    def toCanvas(self, pos):
+        return QPointF(pos) / self.zoom + self.offset
+
+    def toWidget(self, rect):
+        """
+        Return the area of the widget that shows rect of the canvas.
+        """
+        top_left = (QPointF(rect.topLeft()) - self.offset) * self.zoom
+        return QRectF(top_left, QRectF(rect).size() * self.zoom
+                      ).toAlignedRect().adjusted(-1, -1, 1, 1)
+
+    def visibleRect(self, rect = None):
+        """
+        Return the area of the canvas shown in rect of the widget, or in
+        the whole widget.
+        """
+        rect = QRectF(rect if rect is not None else self.rect())
+        return QRectF(self.toCanvas(rect.topLeft()), rect.size() / self.zoom)
+
+    def pan(self, pos):
+        """
+        Move the view with the mouse. The pixels already on screen are
+        scrolled, so only the area that comes into view is drawn.
+        """
+        delta = pos - self.pan_pos
+        self.pan_pos = pos
+        self.offset -= QPointF(delta) / self.zoom
+        self.scroll(delta.x(), delta.y())
+        if self.show_overlay:
+            self.update(OVERLAY_RECT)
+
+    def wheelEvent(self, event):
+        """
+        Zoom in or out around the mouse cursor.
+        """
+        steps = event.angleDelta().y() / 120
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom * 1.25 ** steps))
+        if zoom == self.zoom:
+            return
+        anchor = self.toCanvas(event.pos())
+        self.zoom = zoom
+        self.offset = anchor - QPointF(event.pos()) / zoom
+        self.update()
+
+    def exportScaled(self, scale = 2):
+        """
+        Save the drawing at a higher resolution by replaying its strokes.
+        """
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Export", os.path.curdir + "/untitled@{}x.png".format(scale),
+            "PNG Format (*.png)")
+
+        if file_name:
+            bounds = self.contentBounds()
+            image = QImage(bounds.size() * scale,
+                           QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.white)
+            painter = QPainter(image)
+
+            # Each layer is drawn on its own, so that its eraser strokes
+            # don't erase the layers below it
+            layer_image = QImage(image.size(), image.format())
+            for layer in self.layers:
+                if not layer.visible:
+                    continue
+                layer_image.fill(Qt.transparent)
+                layer_painter = QPainter(layer_image)
+                layer_painter.scale(scale, scale)
+                layer_painter.translate(-bounds.topLeft())
+                layer.document.renderAll(layer_painter, layer.tiles)
+                layer_painter.end()
+
+                painter.setOpacity(layer.opacity)
+                painter.drawImage(0, 0, layer_image)
+            painter.end()
+            image.save(file_name, "png")
+
     def saveFile(self):
         """
-        Save a .png image file of current pixmap area.
+        Save a .png image file of the current canvas.
         """
         file_format = "png"
         default_name = os.path.curdir + "/untitled." + file_format
@@ -119,37 +749,134 @@ class Canvas(QLabel):
                                                    "PNG Format (*.png)")
 
         if file_name:
-            self.pixmap().save(file_name, file_format)
+            # Only the area that has been drawn on is saved
+            self.flattenImage(self.contentBounds()).save(file_name,
+                                                         file_format)
+
+    def openDocument(self):
+        """
+        Open a layered document. Its tiles are loaded as they are shown.
+        """
+        if self.drawing:
+            return
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "Open Document", os.path.curdir,
+            "Layered Document (*.layers)")
+
+        if file_name:
+            layer_file = LayerFile(file_name)
+            try:
+                layers = layer_file.load()
+            except (OSError, ValueError, KeyError) as error:
+                QMessageBox.warning(self, "Error",
+                                    "Unable to open document.\n{}".format(
+                                        error))
+                return
+
+            self.clearSelection()
+            if self.layer_file is not None:
+                self.layer_file.close()
+            self.layer_file = layer_file
+            self.setLayers(layers)
+
+    def saveDocument(self, save_as = False):
+        """
+        Save the layers to a layered document. Saving to the same document
+        again only writes the tiles that changed.
+        """
+        if self.drawing:
+            return
+        if self.layer_file is None or save_as:
+            file_name, _ = QFileDialog.getSaveFileName(
+                self, "Save Document", os.path.curdir + "/untitled.layers",
+                "Layered Document (*.layers)")
+            if not file_name:
+                return
+            if self.layer_file is None:
+                self.layer_file = LayerFile(file_name)
+                self.layer_file.save(self.layers)
+            else:
+                self.layer_file.saveAs(file_name, self.layers)
+        else:
+            self.layer_file.save(self.layers)
 
     def mousePressEvent(self, event):
         """
         Handle when mouse is pressed.
         """
         if event.button() == Qt.LeftButton:
-            self.last_mouse_pos = event.pos()
+            if self.useAreaTool(self.toCanvas(event.pos())):
+                return
+            self.beginStroke(self.toCanvas(event.pos()))
             self.drawing = True
+        elif event.button() == Qt.MiddleButton:
+            self.pan_pos = event.pos()
 
     def mouseReleaseEvent(self, event):
         """
         Handle when mouse is released.
         Check when eraser is no longer being used.
         """
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.LeftButton and self.drawing:
+            self.endStroke()
             self.drawing = False
+        elif event.button() == Qt.MiddleButton:
+            self.pan_pos = None
         elif self.eraser_selected == True:
             self.eraser_selected = False
 
+    def setOverlayVisible(self, state):
+        self.show_overlay = state
+        self.update(OVERLAY_RECT)
+
     def paintEvent(self, event):
         """
         Create QPainter object.
         This is to prevent the chance of the painting being lost
-        if the user changes windows.
+        if the user changes windows. Only the tiles under event.rect()
+        are drawn.
         """
+        self.paint_rate.tick()
         painter = QPainter(self)
 
         target_rect = QRect()
         target_rect = event.rect()
-        painter.drawPixmap(target_rect, self.pixmap(), target_rect)
+        painter.fillRect(target_rect, Qt.white)
+
+        painter.save()
+        if self.zoom < 1.0:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.scale(self.zoom, self.zoom)
+        painter.translate(-self.offset)
+        self.compositor.render(painter, self.layers, self.active_layer,
+                               self.visibleRect(target_rect), self.zoom)
+        if self.selection_image is not None:
+            painter.drawImage(self.selection_rect.topLeft(),
+                              self.selection_image)
+        painter.restore()
+
+        if self.show_overlay:
+            self.drawOverlay(painter)
+        painter.end()
+
+    def drawOverlay(self, painter):
+        """
+        Display the number of paint events and mouse move events in the
+        last second, and the time between the first mouse event of a frame
+        and its paint event.
+        """
+        now = time.perf_counter()
+        if self.flushed_at is not None:
+            self.latency = (now - self.flushed_at) * 1000
+            self.flushed_at = None
+
+        painter.fillRect(OVERLAY_RECT, QColor(0, 0, 0, 160))
+        painter.setPen(Qt.white)
+        painter.drawText(OVERLAY_RECT.adjusted(6, 0, 0, 0),
+                         Qt.AlignVCenter,
+                         "{} fps   {} events/s   {:.1f} ms latency".format(
+                             self.paint_rate.rate(), self.event_rate.rate(),
+                             self.latency))
 
 
 class PainterWindow(QMainWindow):
@@ -171,6 +898,7 @@ class PainterWindow(QMainWindow):
         self.createCanvas()
         self.createMenu()
         self.createToolbar()
+        self.createLayersDock()
 
         self.show()
 
@@ -196,14 +924,56 @@ class PainterWindow(QMainWindow):
         save_file_act.setShortcut('Ctrl+S')
         save_file_act.triggered.connect(self.canvas.saveFile)
 
+        open_document_act = QAction('Open Document...', self)
+        open_document_act.setShortcut('Ctrl+O')
+        open_document_act.triggered.connect(self.canvas.openDocument)
+
+        save_document_act = QAction('Save Document', self)
+        save_document_act.setShortcut('Ctrl+Shift+S')
+        save_document_act.triggered.connect(
+            lambda: self.canvas.saveDocument())
+
+        save_document_as_act = QAction('Save Document As...', self)
+        save_document_as_act.triggered.connect(
+            lambda: self.canvas.saveDocument(save_as = True))
+
+        export_act = QAction('Export at 2x', self)
+        export_act.triggered.connect(lambda: self.canvas.exportScaled(2))
+
         quit_act = QAction("Quit", self)
         quit_act.setShortcut('Ctrl+Q')
         quit_act.triggered.connect(self.close)
 
+        # Create edit menu actions
+        undo_act = QAction('Undo', self)
+        undo_act.setShortcut('Ctrl+Z')
+        undo_act.triggered.connect(self.canvas.undo)
+
+        redo_act = QAction('Redo', self)
+        redo_act.setShortcut('Ctrl+Shift+Z')
+        redo_act.triggered.connect(self.canvas.redo)
+
+        fill_selection_act = QAction('Fill Selection', self)
+        fill_selection_act.setShortcut('Ctrl+Shift+F')
+        fill_selection_act.triggered.connect(self.canvas.fillSelection)
+
+        deselect_act = QAction('Deselect', self)
+        deselect_act.setShortcut('Ctrl+D')
+        deselect_act.triggered.connect(self.canvas.clearSelection)
+
         # Create tool menu actions
         anti_al_act = QAction('AntiAliasing', self, checkable = True)
         anti_al_act.triggered.connect(self.turnAntialiasingOn)
 
+        raster_history_act = QAction('Raster Undo History', self,
+                                     checkable = True)
+        raster_history_act.setStatusTip('Undo by saving the tiles each '
+                                        'stroke changes')
+        raster_history_act.triggered.connect(self.canvas.setRasterHistory)
+
+        overlay_act = QAction('Performance Overlay', self, checkable = True)
+        overlay_act.triggered.connect(self.canvas.setOverlayVisible)
+
         # Create the menu bar
         menu_bar = self.menuBar()
         menu_bar.setNativeMenuBar(False)
@@ -211,16 +981,33 @@ class PainterWindow(QMainWindow):
         # Create file menu and add actions
         file_menu = menu_bar.addMenu('File')
         file_menu.addAction(new_act)
+        file_menu.addAction(open_document_act)
+        file_menu.addSeparator()
         file_menu.addAction(save_file_act)
+        file_menu.addAction(save_document_act)
+        file_menu.addAction(save_document_as_act)
+        file_menu.addAction(export_act)
         file_menu.addSeparator()
         file_menu.addAction(quit_act)
 
+        # Create edit menu and add actions
+        edit_menu = menu_bar.addMenu('Edit')
+        edit_menu.addAction(undo_act)
+        edit_menu.addAction(redo_act)
+        edit_menu.addSeparator()
+        edit_menu.addAction(fill_selection_act)
+        edit_menu.addAction(deselect_act)
+        edit_menu.addSeparator()
+        edit_menu.addAction(raster_history_act)
+
         # Create tools menu and add actions
         file_menu = menu_bar.addMenu('Tools')
         file_menu.addAction(anti_al_act)
+        file_menu.addAction(overlay_act)
 
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
+        self.status_bar.addWidget(self.canvas.mouse_track_label)
 
     def createToolbar(self):
         """
@@ -249,6 +1036,32 @@ class PainterWindow(QMainWindow):
         eraser_act.triggered.connect(
             lambda: self.canvas.selectDrawingTool("eraser"))
 
+        stroke_eraser_act = QAction(QIcon("icons/eraser.png"),
+                                    "Stroke Eraser", tool_bar)
+        stroke_eraser_act.setToolTip(
+            'Use the <b>Stroke Eraser</b> to remove whole strokes.')
+        stroke_eraser_act.triggered.connect(
+            lambda: self.canvas.selectDrawingTool("stroke_eraser"))
+
+        fill_act = QAction("Fill", tool_bar)
+        fill_act.setToolTip('Use the <b>Bucket Fill</b> to fill an area '
+                            'with the pen color.')
+        fill_act.triggered.connect(
+            lambda: self.canvas.selectDrawingTool("fill"))
+
+        wand_act = QAction("Wand", tool_bar)
+        wand_act.setToolTip('Use the <b>Magic Wand</b> to select an area '
+                            'of similar color.')
+        wand_act.triggered.connect(
+            lambda: self.canvas.selectDrawingTool("magic_wand"))
+
+        tolerance_spinbox = QSpinBox()
+        tolerance_spinbox.setRange(0, 255)
+        tolerance_spinbox.setValue(self.canvas.fill_tolerance)
+        tolerance_spinbox.setToolTip('<b>Tolerance</b> of the fill and the '
+                                     'magic wand.')
+        tolerance_spinbox.valueChanged.connect(self.setFillTolerance)
+
         color_act = QAction(QIcon("icons/colors.png"), "Colors", tool_bar)
         color_act.setToolTip('Choose a <b>Color</b> from the Color dialog.')
         color_act.triggered.connect(
@@ -257,8 +1070,74 @@ class PainterWindow(QMainWindow):
         tool_bar.addAction(pencil_act)
         tool_bar.addAction(marker_act)
         tool_bar.addAction(eraser_act)
+        tool_bar.addAction(stroke_eraser_act)
+        tool_bar.addAction(fill_act)
+        tool_bar.addAction(wand_act)
+        tool_bar.addWidget(tolerance_spinbox)
         tool_bar.addAction(color_act)
 
+    def createLayersDock(self):
+        """
+        Create the dock widget that lists the layers, top layer first.
+        The check box of each layer shows or hides it.
+        """
+        self.layer_list = QListWidget()
+        self.layer_list.currentRowChanged.connect(self.layerRowChanged)
+        self.layer_list.itemChanged.connect(self.layerItemChanged)
+
+        add_layer_button = QPushButton("Add")
+        add_layer_button.clicked.connect(self.canvas.addLayer)
+        remove_layer_button = QPushButton("Remove")
+        remove_layer_button.clicked.connect(self.canvas.removeLayer)
+
+        buttons_h_box = QHBoxLayout()
+        buttons_h_box.addWidget(add_layer_button)
+        buttons_h_box.addWidget(remove_layer_button)
+
+        layers_v_box = QVBoxLayout()
+        layers_v_box.addWidget(self.layer_list)
+        layers_v_box.addLayout(buttons_h_box)
+
+        layers_container = QWidget()
+        layers_container.setLayout(layers_v_box)
+
+        layers_dock = QDockWidget("Layers")
+        layers_dock.setAllowedAreas(Qt.LeftDockWidgetArea |
+                                    Qt.RightDockWidgetArea)
+        layers_dock.setWidget(layers_container)
+        self.addDockWidget(Qt.RightDockWidgetArea, layers_dock)
+
+        self.canvas.layersChanged.connect(self.updateLayerList)
+        self.updateLayerList()
+
+    def updateLayerList(self):
+        """
+        Fill the list with the canvas's layers.
+        """
+        layers = self.canvas.layers
+        self.layer_list.blockSignals(True)
+        self.layer_list.clear()
+        for layer in reversed(layers):
+            item = QListWidgetItem(layer.name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if layer.visible else Qt.Unchecked)
+            self.layer_list.addItem(item)
+        self.layer_list.setCurrentRow(len(layers) - 1 -
+                                      self.canvas.active_layer)
+        self.layer_list.blockSignals(False)
+
+    def layerRowChanged(self, row):
+        if row >= 0:
+            self.canvas.selectLayer(len(self.canvas.layers) - 1 - row)
+
+    def layerItemChanged(self, item):
+        row = self.layer_list.row(item)
+        self.canvas.setLayerVisible(len(self.canvas.layers) - 1 - row,
+                                    item.checkState() == Qt.Checked)
+
+    def setFillTolerance(self, value):
+        self.canvas.fill_tolerance = value
+
     def turnAntialiasingOn(self, state):
         """
         Turn anitaliasing on or off.
@@ -274,6 +1153,7 @@ class PainterWindow(QMainWindow):
         Hide mouse coordinates in status bar if mouse leaves
         the window.
         """
+        self.canvas.status_pos = None
         self.canvas.mouse_track_label.setVisible(False)
 
 
@@ -0,0 +1,197 @@
+"""
+Raster undo history for the painter GUI.
+Instead of saving a copy of the whole canvas for each step, only the
+tiles of the canvas that a stroke touches are saved, before and after
+the stroke, compressed with zlib. Tiles that were empty are saved as
+None, so they take no space. When the history uses more memory than its
+limit, the oldest steps are moved to a temporary file and read back from
+there if they are undone. The file is rewritten without the steps that
+have been dropped once they make up most of it.
+"""
+# import necessary modules
+import tempfile
+import zlib
+
+from PyQt5.QtCore import QRect
+
+# The spill file is compacted when it is larger than this and more than
+# half of it belongs to dropped steps
+SPILL_COMPACT_SIZE = 4 * 1024 * 1024
+
+
+def compress(data):
+    return None if data is None else zlib.compress(data, 1)
+
+
+class RasterHistory:
+    """
+    Undo and redo for a TileStore canvas using tile level differences.
+    Call beginStep() when a stroke starts, capture() with the area about
+    to be painted before painting it, and endStep() when it ends.
+    """
+
+    def __init__(self, memory_limit = 32 * 1024 * 1024, max_steps = 500):
+        self.memory_limit = memory_limit
+        self.max_steps = max_steps
+
+        # Each step is a list of [tile key, before, after]. before and
+        # after are compressed bytes, (offset, length) in the spill file,
+        # or None for an empty tile
+        self.undo_stack = []
+        self.redo_stack = []
+        self.memory_used = 0
+        self.spill_file = None
+        # Bytes written to the spill file, and those still in the history
+        self.spill_size = 0
+        self.spill_used = 0
+
+        self.before = None
+
+    def beginStep(self):
+        self.before = {}
+
+    def capture(self, store, rect):
+        """
+        Save the tiles of store under rect that haven't been saved yet
+        during this step. Must be called before painting into rect.
+        """
+        if self.before is None:
+            return
+        for key in store.keysIn(rect):
+            if key not in self.before:
+                self.before[key] = store.tileBytes(key)
+
+    def endStep(self, store):
+        """
+        Compare the saved tiles with the store and add a step with the
+        tiles that changed.
+        """
+        if not self.before:
+            self.before = None
+            return
+
+        step = []
+        for key, before in self.before.items():
+            after = store.tileBytes(key)
+            if after != before:
+                step.append([key, compress(before), compress(after)])
+        self.before = None
+
+        if step:
+            self.undo_stack.append(step)
+            self.memory_used += self.stepBytes(step)
+            self.clearRedo()
+            if len(self.undo_stack) > self.max_steps:
+                self.dropStep(self.undo_stack.pop(0))
+            self.spill()
+            if self.spill_size > max(SPILL_COMPACT_SIZE,
+                                     2 * self.spill_used):
+                self.compactSpill()
+
+    @staticmethod
+    def stepBytes(step):
+        return sum(len(data) for entry in step for data in entry[1:]
+                   if isinstance(data, bytes))
+
+    def dropStep(self, step):
+        self.memory_used -= self.stepBytes(step)
+        self.spill_used -= sum(data[1] for entry in step
+                               for data in entry[1:]
+                               if isinstance(data, tuple))
+
+    def clearRedo(self):
+        for step in self.redo_stack:
+            self.dropStep(step)
+        self.redo_stack.clear()
+
+    def spill(self):
+        """
+        Move the oldest steps to the spill file until the history is back
+        under its memory limit.
+        """
+        for step in self.undo_stack:
+            if self.memory_used <= self.memory_limit:
+                break
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile()
+
+            for entry in step:
+                for i in (1, 2):
+                    if isinstance(entry[i], bytes):
+                        self.memory_used -= len(entry[i])
+                        entry[i] = self.writeSpill(entry[i])
+
+    def writeSpill(self, data):
+        """
+        Append data to the end of the spill file and return its offset
+        and length.
+        """
+        self.spill_file.seek(self.spill_size)
+        self.spill_file.write(data)
+        location = (self.spill_size, len(data))
+        self.spill_size += len(data)
+        self.spill_used += len(data)
+        return location
+
+    def compactSpill(self):
+        """
+        Copy the data of the steps still in the history to a new spill
+        file, leaving behind the data of dropped steps.
+        """
+        old_file = self.spill_file
+        self.spill_file = tempfile.TemporaryFile()
+        self.spill_size = 0
+        self.spill_used = 0
+        for step in self.undo_stack + self.redo_stack:
+            for entry in step:
+                for i in (1, 2):
+                    if isinstance(entry[i], tuple):
+                        offset, length = entry[i]
+                        old_file.seek(offset)
+                        entry[i] = self.writeSpill(old_file.read(length))
+        old_file.close()
+
+    def read(self, data):
+        if data is None:
+            return None
+        if isinstance(data, bytes):
+            return zlib.decompress(data)
+        offset, length = data
+        self.spill_file.seek(offset)
+        return zlib.decompress(self.spill_file.read(length))
+
+    def restore(self, store, step, index):
+        """
+        Write the before (index 1) or after (index 2) tiles of step back
+        into store. Returns the area that changed.
+        """
+        dirty = QRect()
+        for entry in step:
+            store.setTileBytes(entry[0], self.read(entry[index]))
+            dirty = dirty.united(store.tileRect(entry[0]))
+        return dirty
+
+    def undo(self, store):
+        if not self.undo_stack:
+            return QRect()
+        step = self.undo_stack.pop()
+        self.redo_stack.append(step)
+        return self.restore(store, step, 1)
+
+    def redo(self, store):
+        if not self.redo_stack:
+            return QRect()
+        step = self.redo_stack.pop()
+        self.undo_stack.append(step)
+        return self.restore(store, step, 2)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.memory_used = 0
+        self.before = None
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+        self.spill_size = 0
+        self.spill_used = 0
@@ -0,0 +1,359 @@
+"""
+Offscreen rendering and performance checks for the QPainter examples.
+Each case builds a painter widget in a fixed state without showing a
+window, renders it into a QImage and compares the result with a golden
+image in golden/, pixel by pixel within a tolerance. It then renders the
+widget again a number of times, timing each paint and tracing the memory
+that Python allocates with tracemalloc, and compares the allocations
+with those recorded with the golden images. Paint times depend on the
+machine, so they are only compared with --timings, on the machine that
+recorded them. Images that differ are saved to the --output folder.
+The undo checks draw on the painter's canvas, undo and check that it
+looks as it did before.
+
+    python render_regression.py            check every case
+    python render_regression.py --update   record new golden images
+    python render_regression.py --timings  also check the paint times
+    python render_regression.py paint_basics hangman_full undo_after_load
+
+The exit status is 1 if any case fails, so it can be run on a plain
+Linux machine with no display.
+"""
+# import necessary modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt5.QtCore import QEvent, QPointF, QRect, Qt
+from PyQt5.QtGui import QImage, QMouseEvent
+from PyQt5.QtWidgets import QApplication
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(HERE, "golden")
+TIMINGS_FILE = os.path.join(GOLDEN_DIR, "timings.json")
+sys.path.insert(0, os.path.join(HERE, "..", "ch12_ExtraProjects"))
+
+
+# Cases. Each returns the widget to render, in the state to check.
+def paintBasics():
+    from paint_basics import Drawing
+    return Drawing()
+
+
+def hangmanLabel(parts):
+    from hangman import DrawingLabel
+    label = DrawingLabel(None)
+    label.resize(400, 220)
+    label.empty_list = list(parts)
+    label.incorrect_letter = bool(parts)
+    return label
+
+
+def mouseEvent(event_type, x, y):
+    button = Qt.LeftButton
+    buttons = Qt.NoButton if event_type == QEvent.MouseButtonRelease \
+        else button
+    return QMouseEvent(event_type, QPointF(x, y), button, buttons,
+                       Qt.NoModifier)
+
+
+def drawStroke(canvas, points):
+    """
+    Draw a stroke through points with the mouse, one frame for every
+    few points so that the result doesn't depend on timers.
+    """
+    canvas.mousePressEvent(mouseEvent(QEvent.MouseButtonPress,
+                                      *points[0]))
+    for i, point in enumerate(points[1:]):
+        canvas.mouseMoveEvent(mouseEvent(QEvent.MouseMove, *point))
+        if i % 4 == 3:
+            canvas.flushStroke()
+    canvas.mouseReleaseEvent(mouseEvent(QEvent.MouseButtonRelease,
+                                        *points[-1]))
+
+
+def painterCanvas():
+    from painter import PainterWindow
+    window = PainterWindow()
+    window.resize(700, 500)
+    # Let the layouts give the canvas its size before drawing on it
+    QApplication.processEvents()
+    canvas = window.canvas
+
+    canvas.selectDrawingTool("pencil")
+    drawStroke(canvas, [(40 + i * 5, 60 + (i % 10) * 6) for i in range(100)])
+    canvas.selectDrawingTool("marker")
+    canvas.pen_color = Qt.red
+    drawStroke(canvas, [(60 + i * 4, 300 - i * 2) for i in range(110)])
+    canvas.selectDrawingTool("eraser")
+    drawStroke(canvas, [(200, 40 + i * 4) for i in range(80)])
+
+    canvas.addLayer()
+    canvas.selectDrawingTool("marker")
+    canvas.pen_color = Qt.blue
+    drawStroke(canvas, [(80 + i * 4, 120 + i * 2) for i in range(100)])
+    canvas.selectDrawingTool("fill")
+    canvas.pen_color = Qt.green
+    canvas.mousePressEvent(mouseEvent(QEvent.MouseButtonPress, 560, 380))
+    canvas.mouseReleaseEvent(mouseEvent(QEvent.MouseButtonRelease,
+                                        560, 380))
+    # Keep the window alive along with its canvas
+    canvas.window_ref = window
+    return canvas
+
+
+# Undo checks. Each returns a list of problems.
+def newPainter():
+    from painter import PainterWindow
+    window = PainterWindow()
+    window.resize(700, 500)
+    QApplication.processEvents()
+    return window
+
+
+def checkUndo(canvas, draw):
+    """
+    Call draw(canvas), then undo it and redo it. Returns the problems
+    found: the canvas should look as it did before after the undo, and
+    as it did after drawing after the redo.
+    """
+    area = QRect(0, 0, 600, 400)
+    before = canvas.flattenImage(area)
+    draw(canvas)
+    drawn = canvas.flattenImage(area)
+    problems = []
+    if drawn == before:
+        problems.append("nothing drawn")
+    canvas.undo()
+    if canvas.flattenImage(area) != before:
+        problems.append("undo changed other paint")
+    canvas.redo()
+    if canvas.flattenImage(area) != drawn:
+        problems.append("redo differs")
+    return problems
+
+
+def drawCrossingStroke(canvas):
+    canvas.selectDrawingTool("marker")
+    canvas.pen_color = Qt.red
+    drawStroke(canvas, [(50 + i * 4, 100 + i) for i in range(100)])
+
+
+def fillCanvas(canvas):
+    canvas.selectDrawingTool("fill")
+    canvas.pen_color = Qt.green
+    canvas.mousePressEvent(mouseEvent(QEvent.MouseButtonPress, 300, 200))
+    canvas.mouseReleaseEvent(mouseEvent(QEvent.MouseButtonRelease,
+                                        300, 200))
+
+
+def undoAfterLoad():
+    """
+    Undo a stroke drawn over a document that was saved and opened again,
+    whose paint isn't made of recorded strokes.
+    """
+    from layered_document import LayerFile
+    window = newPainter()
+    canvas = window.canvas
+    canvas.selectDrawingTool("pencil")
+    drawStroke(canvas, [(100, 40 + i * 3) for i in range(100)])
+
+    with tempfile.TemporaryDirectory() as directory:
+        layer_file = LayerFile(os.path.join(directory, "undo.layers"))
+        layer_file.save(canvas.layers)
+        canvas.setLayers(layer_file.load())
+        problems = checkUndo(canvas, drawCrossingStroke)
+        layer_file.close()
+    window.close()
+    return problems
+
+
+def undoAfterRaster():
+    """
+    Undo a fill over paint drawn while undo used saved tiles, which are
+    thrown away when switching back to undo with strokes.
+    """
+    window = newPainter()
+    canvas = window.canvas
+    canvas.setRasterHistory(True)
+    canvas.selectDrawingTool("pencil")
+    drawStroke(canvas, [(100, 40 + i * 3) for i in range(100)])
+    canvas.setRasterHistory(False)
+
+    problems = checkUndo(canvas, fillCanvas)
+    window.close()
+    return problems
+
+
+UNDO_CHECKS = {
+    "undo_after_load": undoAfterLoad,
+    "undo_raster_fill": undoAfterRaster
+}
+
+
+CASES = {
+    "paint_basics": paintBasics,
+    "hangman_empty": lambda: hangmanLabel([]),
+    "hangman_full": lambda: hangmanLabel(["head", "body", "right_arm",
+                                          "left_arm", "right_leg",
+                                          "left_leg"]),
+    "painter_canvas": painterCanvas
+}
+
+
+def renderWidget(widget):
+    """
+    Return an image of widget, drawn over white.
+    """
+    image = QImage(widget.size(), QImage.Format_ARGB32)
+    image.fill(Qt.white)
+    widget.render(image)
+    return image
+
+
+def imageArray(image):
+    image = image.convertToFormat(QImage.Format_ARGB32)
+    pointer = image.constBits()
+    pointer.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(pointer, np.uint8).reshape(
+        image.height(), image.bytesPerLine())[:, :image.width() * 4]
+    return pixels.reshape(image.height(), image.width(), 4).astype(int)
+
+
+def compareImages(image, golden, tolerance):
+    """
+    Return the largest difference of any channel, and the fraction of
+    pixels with a channel that differs by more than tolerance.
+    """
+    if image.size() != golden.size():
+        return 255, 1.0
+    difference = np.abs(imageArray(image) - imageArray(golden)).max(axis = 2)
+    return int(difference.max()), float((difference > tolerance).mean())
+
+
+def measurePaints(widget, repeat):
+    """
+    Render widget repeat times. Returns the median time per paint in
+    seconds, and the bytes allocated by Python per paint and at most
+    while painting, as traced by tracemalloc.
+    """
+    image = QImage(widget.size(), QImage.Format_ARGB32)
+    times = []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_size = tracemalloc.get_traced_memory()[0]
+    allocated = 0
+    for i in range(repeat):
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        widget.render(image)
+        times.append(time.perf_counter() - start)
+        allocated += max(0, tracemalloc.get_traced_memory()[0] - before)
+    peak = tracemalloc.get_traced_memory()[1] - start_size
+    tracemalloc.stop()
+    return float(np.median(times)), allocated // repeat, peak
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Check the painters.")
+    parser.add_argument("cases", nargs = "*",
+                        help = "cases to run, all if none are given: " +
+                               ", ".join(list(CASES) + list(UNDO_CHECKS)))
+    parser.add_argument("--update", action = "store_true",
+                        help = "record new golden images and timings")
+    parser.add_argument("--tolerance", type = int, default = 8,
+                        help = "largest channel difference allowed")
+    parser.add_argument("--max-fraction", type = float, default = 0.001,
+                        help = "fraction of pixels allowed to differ")
+    parser.add_argument("--timings", action = "store_true",
+                        help = "fail cases that paint slower than recorded")
+    parser.add_argument("--time-slack", type = float, default = 3.0,
+                        help = "allowed slowdown over the recorded timings")
+    parser.add_argument("--output", default = os.path.join(
+                            tempfile.gettempdir(), "render_regression"),
+                        help = "folder to save images that differ to")
+    parser.add_argument("--repeat", type = int, default = 50)
+    args = parser.parse_args(argv)
+    for name in args.cases:
+        if name not in CASES and name not in UNDO_CHECKS:
+            parser.error("unknown case: {}".format(name))
+
+    app = QApplication.instance() or QApplication(["render_regression"])
+    args.output = os.path.abspath(args.output)
+    os.chdir(HERE)
+    os.makedirs(GOLDEN_DIR, exist_ok = True)
+    timings = {}
+    if os.path.exists(TIMINGS_FILE):
+        with open(TIMINGS_FILE) as timings_file:
+            timings = json.load(timings_file)
+
+    if args.cases:
+        cases = [name for name in args.cases if name in CASES]
+        checks = [name for name in args.cases if name in UNDO_CHECKS]
+    else:
+        cases, checks = list(CASES), list(UNDO_CHECKS)
+
+    failures = 0
+    print("{:<16} {:>6} {:>9} {:>10} {:>11} {:>10}  {}".format(
+        "case", "diff", "changed", "paint (ms)", "alloc/paint",
+        "peak alloc", "result"))
+    for name in cases:
+        widget = CASES[name]()
+        app.processEvents()
+        image = renderWidget(widget)
+        paint_time, allocated, peak = measurePaints(widget, args.repeat)
+        golden_file = os.path.join(GOLDEN_DIR, name + ".png")
+
+        problems = []
+        if args.update:
+            image.save(golden_file)
+            timings[name] = {"paint_time": paint_time,
+                             "allocated": allocated}
+            largest, changed = 0, 0.0
+        elif not os.path.exists(golden_file):
+            problems.append("no golden image")
+            largest, changed = 0, 0.0
+        else:
+            largest, changed = compareImages(image, QImage(golden_file),
+                                             args.tolerance)
+            if changed > args.max_fraction:
+                problems.append("image differs")
+                os.makedirs(args.output, exist_ok = True)
+                image.save(os.path.join(args.output, name + ".failed.png"))
+
+            recorded = timings.get(name)
+            if recorded is not None:
+                if args.timings and \
+                        paint_time > recorded["paint_time"] * args.time_slack:
+                    problems.append("slower")
+                # Allow for a small amount of noise in the allocations
+                if allocated > recorded["allocated"] * args.time_slack + \
+                        1024:
+                    problems.append("allocates more")
+
+        failures += bool(problems)
+        print("{:<16} {:>6} {:>8.3%} {:>10.3f} {:>11} {:>10}  {}".format(
+            name, largest, changed, paint_time * 1000, allocated, peak,
+            ", ".join(problems) or ("updated" if args.update else "ok")))
+        widget.close()
+
+    for name in checks:
+        problems = UNDO_CHECKS[name]()
+        failures += bool(problems)
+        print("{:<16} {}".format(name, ", ".join(problems) or "ok"))
+
+    if args.update:
+        with open(TIMINGS_FILE, "w") as timings_file:
+            json.dump(timings, timings_file, indent = 4, sort_keys = True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
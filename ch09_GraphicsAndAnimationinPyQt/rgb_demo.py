@@ -5,50 +5,203 @@ Featured in "Beginning Pyqt - A Hands-on Approach to GUI Programming"
 """
 # import necessary modules
 import sys
+import time
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThreadPool
 from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QLabel, QWidget)
+from PyQt5.QtWidgets import (QApplication, QComboBox, QFormLayout,
+                             QHBoxLayout, QLabel, QScrollArea, QSpinBox,
+                             QVBoxLayout, QWidget)
 
-from rgb_slider import RGBSlider, style_sheet
+from image_colors import ImageColors, PaletteTask
+from rgb_slider import ColorSwatch, RGBSlider, style_sheet
+
+# Colours that can be picked from the image
+PICK_MODES = ["Pixel", "Mean", "Median", "Dominant"]
+# Number of colours in the image's palette
+PALETTE_SIZE = 8
 
 
 class loadImage(QWidget):
 
-    def __init__(self):
+    def __init__(self, file_name = "images/chameleon.png"):
         super().__init__()
+        self.file_name = file_name
+
+        # The palette is found in the background
+        self.pool = QThreadPool(self)
+        self.palette_task = None
+        self.next_job_id = 0
+
         self.initializeUI()
 
     def initializeUI(self):
         """
-        Initialize the window and display its contents to the screen. 
+        Initialize the window and display its contents to the screen.
         """
         self.setMinimumSize(225, 300)
         self.setWindowTitle('9.3 - Custom Widget')
 
-        # Load image
-        image = QImage("images/chameleon.png")
+        # Load image. Its pixels are converted once for the colour picker.
+        image = QImage(self.file_name)
+        self.image_colors = ImageColors(image)
 
         # Create instance of RGB slider widget
-        rgb_slider = RGBSlider(image)
+        self.rgb_slider = RGBSlider(image)
 
         image_label = QLabel()
         image_label.setAlignment(Qt.AlignTop)
         image_label.setPixmap(QPixmap().fromImage(image))
-        # Reimplement the label's mousePressEvent
-        image_label.mousePressEvent = rgb_slider.getPixelValues
+        # Reimplement the label's mouse events
+        image_label.setMouseTracking(True)
+        image_label.mousePressEvent = self.pickColor
+        image_label.mouseMoveEvent = self.showHoverColors
+
+        # Large images can be scrolled
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(image_label)
+
+        # Widgets for picking the colour of an area of the image
+        self.pick_mode_combo = QComboBox()
+        self.pick_mode_combo.addItems(PICK_MODES)
+
+        self.area_spinbox = QSpinBox()
+        self.area_spinbox.setRange(1, 51)
+        self.area_spinbox.setSingleStep(2)
+        self.area_spinbox.setValue(5)
+        self.area_spinbox.setSuffix(" px")
+
+        self.hover_label = QLabel()
+        self.hover_label.setMinimumWidth(200)
+
+        picker_form = QFormLayout()
+        picker_form.addRow("Pick", self.pick_mode_combo)
+        picker_form.addRow("Area", self.area_spinbox)
+        picker_form.addRow(self.hover_label)
+
+        # Swatches for the palette of the image. Clicking one picks its
+        # colour.
+        palette_h_box = QHBoxLayout()
+        palette_h_box.setSpacing(2)
+        self.palette_swatches = []
+        for i in range(PALETTE_SIZE):
+            swatch = ColorSwatch(Qt.lightGray)
+            swatch.setFixedSize(24, 24)
+            swatch.mousePressEvent = \
+                lambda event, swatch = swatch: \
+                self.rgb_slider.color_state.setColor(swatch.color())
+            palette_h_box.addWidget(swatch)
+            self.palette_swatches.append(swatch)
+        self.palette_label = QLabel()
+
+        v_box = QVBoxLayout()
+        v_box.addWidget(self.rgb_slider)
+        v_box.addLayout(picker_form)
+        v_box.addWidget(QLabel("Dominant Palette"))
+        v_box.addLayout(palette_h_box)
+        v_box.addWidget(self.palette_label)
 
         h_box = QHBoxLayout()
-        h_box.addWidget(rgb_slider)
-        h_box.addWidget(image_label)
+        h_box.addLayout(v_box)
+        h_box.addWidget(scroll_area, 1)
 
         self.setLayout(h_box)
 
+        if image.isNull():
+            # The image couldn't be read, so there is no palette to find
+            self.palette_label.setText("Unable to load {}".format(
+                self.file_name))
+        else:
+            self.findPalette()
+
         self.show()
 
+    def findPalette(self):
+        """
+        Start finding the palette of the image in the background,
+        replacing any search already running.
+        """
+        if self.palette_task is not None:
+            self.palette_task.cancel()
+        self.next_job_id += 1
+        # Keep a reference to the task so Python doesn't delete it
+        self.palette_task = PaletteTask(self.next_job_id, self.image_colors,
+                                        PALETTE_SIZE)
+        self.palette_task.setAutoDelete(False)
+        self.palette_task.signals.paletteReady.connect(self.showPalette)
+        self.palette_started = time.perf_counter()
+        self.palette_label.setText("Finding palette...")
+        self.pool.start(self.palette_task)
+
+    def showPalette(self, job_id, palette, final):
+        """
+        Display the colours of a palette, first or refined, and the
+        time since the search started.
+        """
+        if self.palette_task is None or job_id != self.palette_task.job_id:
+            return
+        for i, swatch in enumerate(self.palette_swatches):
+            if i < len(palette):
+                color, share = palette[i]
+                swatch.setColor(color)
+                swatch.setToolTip("{} ({:.0%})".format(color.name(), share))
+            else:
+                swatch.setColor(Qt.lightGray)
+                swatch.setToolTip("")
+
+        elapsed = (time.perf_counter() - self.palette_started) * 1000
+        if final:
+            text = "Palette found in {:.0f} ms"
+        else:
+            text = "Refining palette... ({:.0f} ms)"
+        self.palette_label.setText(text.format(elapsed))
+
+    def closeEvent(self, event):
+        if self.palette_task is not None:
+            self.palette_task.cancel()
+        self.pool.waitForDone()
+        event.accept()
+
+    def pickColor(self, event):
+        """
+        Set the slider's colour from the pixel clicked, or from the
+        colours of the area around it.
+        """
+        x, y = event.x(), event.y()
+        if not self.image_colors.valid(x, y):
+            return
+
+        mode = self.pick_mode_combo.currentIndex()
+        if mode == 0:
+            color = self.image_colors.pixel(x, y)
+        else:
+            color = self.image_colors.regionStats(
+                x, y, self.area_spinbox.value())[mode - 1]
+        self.rgb_slider.color_state.setColor(color)
+
+    def showHoverColors(self, event):
+        """
+        Display the colours of the pixel under the mouse and of the area
+        around it.
+        """
+        x, y = event.x(), event.y()
+        if not self.image_colors.valid(x, y):
+            self.hover_label.clear()
+            return
+
+        size = self.area_spinbox.value()
+        mean, median, dominant = self.image_colors.regionStats(x, y, size)
+        self.hover_label.setText(
+            "({}, {}) {}\n{} x {} mean {}\nmedian {} dominant {}".format(
+                x, y, self.image_colors.pixel(x, y).name(), size, size,
+                mean.name(), median.name(), dominant.name()))
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     app.setStyleSheet(style_sheet)
-    window = loadImage()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if len(sys.argv) > 1:
+        window = loadImage(sys.argv[1])
+    else:
+        window = loadImage()
+    sys.exit(app.exec_())
@@ -6,10 +6,11 @@ Featured in "Beginning Pyqt - A Hands-on Approach to GUI Programming"
 # import necessary modules
 import sys
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QFont, QImage, QPixmap, qRgb
+from PyQt5.QtCore import QObject, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor, QFont, QPainter
 from PyQt5.QtWidgets import (QApplication, QGridLayout, QHBoxLayout, QLabel,
-                             QSlider, QSpinBox, QVBoxLayout, QWidget)
+                             QSizePolicy, QSlider, QSpinBox, QVBoxLayout,
+                             QWidget)
 
 style_sheet = """
     QSlider:groove:horizontal{
@@ -75,6 +76,73 @@ style_sheet = """
 """
 
 
+class ColorState(QObject):
+    """
+    The colour shown by an RGBSlider. The sliders, spinboxes and image
+    change it with setColor() or the set methods for each channel, and
+    colorChanged is emitted once for each change to a different colour.
+    """
+    colorChanged = pyqtSignal(QColor)
+
+    def __init__(self, color = Qt.black, parent = None):
+        super().__init__(parent)
+        self._color = QColor(color)
+        # Number of times the colour has changed
+        self.change_count = 0
+
+    def color(self):
+        return QColor(self._color)
+
+    def setColor(self, color):
+        # Only the RGB values are used, so the colour is always opaque
+        color = QColor(color)
+        color = QColor(color.red(), color.green(), color.blue())
+        if color == self._color:
+            return
+        self._color = color
+        self.change_count += 1
+        self.colorChanged.emit(QColor(color))
+
+    def setRed(self, value):
+        self.setColor(QColor(value, self._color.green(), self._color.blue()))
+
+    def setGreen(self, value):
+        self.setColor(QColor(self._color.red(), value, self._color.blue()))
+
+    def setBlue(self, value):
+        self.setColor(QColor(self._color.red(), self._color.green(), value))
+
+
+class ColorSwatch(QWidget):
+    """
+    Displays a solid colour. The brush is kept between paint events, so
+    changing the colour doesn't create any images.
+    """
+
+    def __init__(self, color = Qt.black, parent = None):
+        super().__init__(parent)
+        self._brush = QBrush(QColor(color))
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # Every pixel is painted, so Qt doesn't need to clear the widget
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def sizeHint(self):
+        return QSize(100, 100)
+
+    def color(self):
+        return self._brush.color()
+
+    def setColor(self, color):
+        if QColor(color) != self._brush.color():
+            self._brush.setColor(QColor(color))
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), self._brush)
+        painter.end()
+
+
 class RGBSlider(QWidget):
 
     def __init__(self, _image = None, *args, **kwargs):
@@ -90,8 +158,14 @@ class RGBSlider(QWidget):
         self.setMinimumSize(225, 300)
         self.setWindowTitle('9.3 - RGB Slider')
 
-        # Store the current pixel value
-        self.current_val = QColor()
+        # Store the current pixel value. The sliders, spinboxes and
+        # image all change color_state, which updates the widgets.
+        self.current_val = QColor(Qt.black)
+        self.color_state = ColorState(self.current_val, self)
+        self.color_state.colorChanged.connect(self.updateColorInfo)
+
+        # Number of times the displayed colour has been updated
+        self.color_updates = 0
 
         self.setupWidgets()
 
@@ -101,14 +175,9 @@ class RGBSlider(QWidget):
         """
         Create instances of widgets and arrange them in layouts.
         """
-        # Image that will display the current color set by
+        # Swatch that will display the current color set by
         # slider/spin_box values
-        self.color_display = QImage(100, 100, QImage.Format_RGBX64)
-        self.color_display.fill(Qt.black)
-
-        self.cd_label = QLabel()
-        self.cd_label.setPixmap(QPixmap.fromImage(self.color_display))
-        self.cd_label.setScaledContents(True)
+        self.color_swatch = ColorSwatch(self.current_val)
 
         # Create RGB sliders and spinboxes
         red_label = QLabel("Red")
@@ -163,77 +232,53 @@ class RGBSlider(QWidget):
         grid.addWidget(hex_container, 6, 0, 1, 0)
 
         # Use [] to pass arguments to the valueChanged signal
-        # The sliders and spinboxes for each color should display the
-        # same values and be updated at the same time.
-        self.red_slider.valueChanged['int'].connect(self.updateRedSpinBox)
-        self.red_spinbox.valueChanged['int'].connect(self.updateRedSlider)
+        # The sliders and spinboxes only change the colour state. When
+        # it changes, updateColorInfo() sets the values of all of them.
+        self.red_slider.valueChanged['int'].connect(self.color_state.setRed)
+        self.red_spinbox.valueChanged['int'].connect(self.color_state.setRed)
 
-        self.green_slider.valueChanged['int'].connect(self.updateGreenSpinBox)
-        self.green_spinbox.valueChanged['int'].connect(self.updateGreenSlider)
+        self.green_slider.valueChanged['int'].connect(
+            self.color_state.setGreen)
+        self.green_spinbox.valueChanged['int'].connect(
+            self.color_state.setGreen)
 
-        self.blue_slider.valueChanged['int'].connect(self.updateBlueSpinBox)
-        self.blue_spinbox.valueChanged['int'].connect(self.updateBlueSlider)
+        self.blue_slider.valueChanged['int'].connect(
+            self.color_state.setBlue)
+        self.blue_spinbox.valueChanged['int'].connect(
+            self.color_state.setBlue)
 
         # Create container for rgb widgets
         rgb_widgets = QWidget()
         rgb_widgets.setLayout(grid)
 
         v_box = QVBoxLayout()
-        v_box.addWidget(self.cd_label)
+        v_box.addWidget(self.color_swatch)
         v_box.addWidget(rgb_widgets)
 
         self.setLayout(v_box)
 
-    # The following methods update the red, green and blue
-    # sliders and spinboxes.
-    def updateRedSpinBox(self, value):
-        self.red_spinbox.setValue(value)
-        self.redValue(value)
-
-    def updateRedSlider(self, value):
-        self.red_slider.setValue(value)
-        self.redValue(value)
-
-    def updateGreenSpinBox(self, value):
-        self.green_spinbox.setValue(value)
-        self.greenValue(value)
-
-    def updateGreenSlider(self, value):
-        self.green_slider.setValue(value)
-        self.greenValue(value)
-
-    def updateBlueSpinBox(self, value):
-        self.blue_spinbox.setValue(value)
-        self.blueValue(value)
-
-    def updateBlueSlider(self, value):
-        self.blue_slider.setValue(value)
-        self.blueValue(value)
-
-    # Create new colors based upon the changes to the RGB values
-    def redValue(self, value):
-        new_color = qRgb(value, self.current_val.green(),
-                         self.current_val.blue())
-        self.updateColorInfo(new_color)
-
-    def greenValue(self, value):
-        new_color = qRgb(self.current_val.red(), value,
-                         self.current_val.blue())
-        self.updateColorInfo(new_color)
-
-    def blueValue(self, value):
-        new_color = qRgb(self.current_val.red(), self.current_val.green(),
-                         value)
-        self.updateColorInfo(new_color)
-
     def updateColorInfo(self, color):
         """
-        Update color displayed in image and set the hex values accordingly.
+        Update the sliders and spinboxes, color displayed in swatch and set
+        the hex values accordingly. Signals from the sliders and spinboxes
+        are blocked while they are set, so that they don't change the
+        colour again.
         """
+        self.color_updates += 1
         self.current_val = QColor(color)
-        self.color_display.fill(color)
 
-        self.cd_label.setPixmap(QPixmap.fromImage(self.color_display))
+        values = (self.current_val.red(), self.current_val.green(),
+                  self.current_val.blue())
+        widgets = ((self.red_slider, self.red_spinbox),
+                   (self.green_slider, self.green_spinbox),
+                   (self.blue_slider, self.blue_spinbox))
+        for value, channel_widgets in zip(values, widgets):
+            for widget in channel_widgets:
+                widget.blockSignals(True)
+                widget.setValue(value)
+                widget.blockSignals(False)
+
+        self.color_swatch.setColor(self.current_val)
         self.hex_values_label.setText("{}".format(self.current_val.name()))
 
     def getPixelValues(self, event):
@@ -252,18 +297,7 @@ class RGBSlider(QWidget):
         # valid() returns true if the point selected is a valid
         # coordinate pair within the image
         if self._image.valid(x, y):
-            self.current_val = QColor(self._image.pixel(x, y))
-
-            red_val = self.current_val.red()
-            green_val = self.current_val.green()
-            blue_val = self.current_val.blue()
-
-            self.updateRedSpinBox(red_val)
-            self.updateRedSlider(red_val)
-            self.updateGreenSpinBox(green_val)
-            self.updateGreenSlider(green_val)
-            self.updateBlueSpinBox(blue_val)
-            self.updateBlueSlider(blue_val)
+            self.color_state.setColor(QColor(self._image.pixel(x, y)))
 
 
 if __name__ == '__main__':
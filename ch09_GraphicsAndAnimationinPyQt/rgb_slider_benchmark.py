@@ -0,0 +1,89 @@
+"""
+Benchmark for the RGB slider's colour swatch.
+Sweeps the red slider from 0 to 255 and repaints the swatch after each
+step, the way a drag does. It is run once with the ColorSwatch widget
+and once with the old swatch, a QLabel showing a pixmap made from a
+filled QImage for every change, and prints the updates per second.
+
+    python rgb_slider_benchmark.py
+    python rgb_slider_benchmark.py --sweeps 20
+"""
+# import necessary modules
+import argparse
+import sys
+import time
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication, QLabel
+
+from rgb_slider import RGBSlider
+
+
+class ImageSwatch(QLabel):
+    """
+    The swatch RGBSlider used before ColorSwatch, for comparison.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.color_display = QImage(100, 100, QImage.Format_RGBX64)
+        self.color_display.fill(Qt.black)
+        self.setPixmap(QPixmap.fromImage(self.color_display))
+        self.setScaledContents(True)
+
+    def setColor(self, color):
+        self.color_display.fill(color)
+        self.setPixmap(QPixmap.fromImage(self.color_display))
+
+
+def sweep(window, sweeps):
+    """
+    Move the red slider from 0 to 255 sweeps times, repainting the
+    swatch each step. Returns the number of updates per second.
+    """
+    swatch = window.color_swatch
+    updates = 0
+    start = time.perf_counter()
+    for i in range(sweeps):
+        for value in range(256):
+            window.red_slider.setValue(value)
+            swatch.repaint()
+            updates += 1
+    return updates / (time.perf_counter() - start)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark the swatch.")
+    parser.add_argument("--sweeps", type = int, default = 10)
+    sweeps = parser.parse_args(argv).sweeps
+
+    app = QApplication.instance() or QApplication(
+        ["rgb_slider_benchmark", "-platform", "offscreen"])
+
+    window = RGBSlider()
+    window.resize(300, 400)
+    app.processEvents()
+    swatch_rate = sweep(window, sweeps)
+    updates = window.color_updates
+
+    # Put the old swatch in place of the new one
+    old_swatch = ImageSwatch()
+    window.layout().replaceWidget(window.color_swatch, old_swatch)
+    window.color_swatch.hide()
+    window.color_swatch = old_swatch
+    app.processEvents()
+    image_rate = sweep(window, sweeps)
+
+    print("{} sweeps of 0-255, {} colour updates per run".format(
+        sweeps, updates))
+    print()
+    print("{:<16} {:>12}".format("swatch", "updates/s"))
+    print("{:<16} {:>12.0f}".format("ColorSwatch", swatch_rate))
+    print("{:<16} {:>12.0f}".format("QImage + QPixmap", image_rate))
+    print("speedup: {:.1f}x".format(swatch_rate / image_rate))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
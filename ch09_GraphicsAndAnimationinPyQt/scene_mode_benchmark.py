@@ -0,0 +1,159 @@
+"""
+Benchmark for the scene modes in scene_modes.py.
+Records the positions of moving sprites for a number of frames, then
+plays the same recording back in a view with every combination of item
+index, viewport update mode and cache mode for the static sprites. Each
+frame moves the items and waits for the view to paint, and the mean and
+worst frame times of each combination are printed, fastest first, with
+the number of frames the view didn't paint.
+
+    python scene_mode_benchmark.py
+    python scene_mode_benchmark.py --moving 5000 --static 500 --frames 60
+"""
+# import necessary modules
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
+
+from animation_driver import KeyframeDriver
+from scene_modes import (CACHE_MODES, INDEX_METHODS, UPDATE_MODES,
+                         applySceneMode)
+from sprite_atlas import sprite_cache
+
+SPRITES = ['images/car.png', 'images/trees.png']
+KEY_TIMES = [0.0, 0.25, 0.5, 0.75, 1.0]
+# Seconds to wait for the view to paint a frame. A frame where nothing
+# on screen changed, such as with --moving 0, is never painted.
+FRAME_TIMEOUT = 1.0
+
+
+class BenchmarkView(QGraphicsView):
+    """
+    A view that counts its paint events.
+    """
+
+    def __init__(self, scene):
+        super().__init__(scene)
+        self.paint_count = 0
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        self.paint_count += 1
+
+
+def recordAnimation(count, frames, width, height):
+    """
+    Return the positions of count items for each frame, as an array of
+    shape (frames, count, 2), using a KeyframeDriver with random loops.
+    """
+    rng = np.random.default_rng(0)
+    driver = KeyframeDriver(KEY_TIMES, 1000, loop = True)
+    paths = rng.uniform(0, 1, (count, len(KEY_TIMES), 2)) * \
+        [width - 40, height - 40]
+    paths[:, -1] = paths[:, 0]
+    driver.addItems([None] * count, paths, rng.uniform(0, 1, count))
+    return np.array([driver.positionsAt((driver.phases + frame /
+                                         float(frames)) % 1.0)
+                     for frame in range(frames)])
+
+
+def createView(moving, static, width, height):
+    """
+    Return a view of a scene with moving sprites and static sprites
+    spread over it, and the two lists of items.
+    """
+    rng = np.random.default_rng(1)
+    scene = QGraphicsScene(0, 0, width, height)
+    moving_items, static_items = [], []
+    for i in range(moving + static):
+        item = sprite_cache.createItem(SPRITES[i % len(SPRITES)], 40)
+        scene.addItem(item)
+        if i < moving:
+            moving_items.append(item)
+        else:
+            item.setPos(*rng.uniform(0, 1, 2) * [width - 40, height - 40])
+            static_items.append(item)
+
+    view = BenchmarkView(scene)
+    view.resize(width, height)
+    return view, moving_items, static_items
+
+
+def playBack(app, view, items, recording):
+    """
+    Move the items to each frame of the recording and wait until the
+    view has painted it, or for FRAME_TIMEOUT seconds. Returns the time
+    of each frame that was painted in seconds, and the number of frames
+    that weren't.
+    """
+    times = []
+    missed = 0
+    for positions in recording.tolist():
+        start = time.perf_counter()
+        deadline = start + FRAME_TIMEOUT
+        painted = view.paint_count
+        for item, (x, y) in zip(items, positions):
+            item.setPos(x, y)
+        while view.paint_count == painted and \
+                time.perf_counter() < deadline:
+            app.processEvents()
+        if view.paint_count == painted:
+            missed += 1
+        else:
+            times.append(time.perf_counter() - start)
+    return times, missed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark scene modes.")
+    parser.add_argument("--moving", type = int, default = 2000)
+    parser.add_argument("--static", type = int, default = 2000)
+    parser.add_argument("--frames", type = int, default = 40)
+    parser.add_argument("--width", type = int, default = 1200)
+    parser.add_argument("--height", type = int, default = 700)
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(
+        ["scene_mode_benchmark", "-platform", "offscreen"])
+
+    recording = recordAnimation(args.moving, args.frames, args.width,
+                                args.height)
+    results = []
+    for mode in itertools.product(INDEX_METHODS, UPDATE_MODES, CACHE_MODES):
+        view, moving_items, static_items = createView(
+            args.moving, args.static, args.width, args.height)
+        applySceneMode(view, mode, static_items)
+        view.show()
+        app.processEvents()
+
+        # The first frames fill the caches, so they aren't counted
+        times, missed = playBack(app, view, moving_items, recording)
+        times = times[2:] or [float("nan")]
+        results.append((np.mean(times), np.max(times), missed, mode))
+
+        view.close()
+        view.scene().clear()
+        view.deleteLater()
+        app.processEvents()
+
+    print("{} moving and {} static sprites, {} x {}, {} frames".format(
+        args.moving, args.static, args.width, args.height, args.frames))
+    print()
+    print("{:<6} {:<9} {:<7} {:>10} {:>10} {:>6} {:>7}".format(
+        "index", "update", "cache", "mean (ms)", "max (ms)", "fps",
+        "missed"))
+    # Modes whose frames were never painted sort last
+    results.sort(key = lambda result: (np.isnan(result[0]), result[0]))
+    for mean, worst, missed, (index, update, cache) in results:
+        print("{:<6} {:<9} {:<7} {:>10.1f} {:>10.1f} {:>6.0f} {:>7}".format(
+            index, update, cache, mean * 1000, worst * 1000, 1 / mean,
+            missed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
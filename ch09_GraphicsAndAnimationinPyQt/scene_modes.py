@@ -0,0 +1,53 @@
+"""
+Scene settings for animated graphics views.
+QGraphicsScene keeps its items in a BSP tree by default, which has to be
+updated every time an item moves, and QGraphicsView works out which
+parts of the viewport need to be redrawn from the areas the items
+covered. Neither pays off when most items move every frame. A scene
+mode picks the item index, how the view decides what to redraw, and
+how sprites that don't move are cached. scene_mode_benchmark.py times
+every combination.
+"""
+# import necessary modules
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsScene, QGraphicsView
+
+INDEX_METHODS = {
+    "bsp": QGraphicsScene.BspTreeIndex,
+    "none": QGraphicsScene.NoIndex
+}
+
+UPDATE_MODES = {
+    "full": QGraphicsView.FullViewportUpdate,
+    "minimal": QGraphicsView.MinimalViewportUpdate,
+    "bounding": QGraphicsView.BoundingRectViewportUpdate,
+    "smart": QGraphicsView.SmartViewportUpdate
+}
+
+CACHE_MODES = {
+    "none": QGraphicsItem.NoCache,
+    "item": QGraphicsItem.ItemCoordinateCache,
+    "device": QGraphicsItem.DeviceCoordinateCache
+}
+
+# Settings for scenes where most items move. With its defaults (2000
+# moving and 2000 static sprites, offscreen), scene_mode_benchmark.py
+# gave 4.3 ms a frame for these settings, the same as with "bounding"
+# updates. The same settings with a BSP index took 14.3 ms, and
+# "minimal" or "smart" updates took 37-51 ms.
+DEFAULT_MODE = ("none", "full", "none")
+
+
+def applySceneMode(view, mode = DEFAULT_MODE, static_items = ()):
+    """
+    Set the item index of the view's scene, the view's update mode and
+    the cache mode of static_items, the items that don't move, from
+    mode, a tuple of keys of INDEX_METHODS, UPDATE_MODES and
+    CACHE_MODES.
+    """
+    index, update, cache = mode
+    # The views in these examples keep their scene in a scene attribute,
+    # which hides the scene() method
+    QGraphicsView.scene(view).setItemIndexMethod(INDEX_METHODS[index])
+    view.setViewportUpdateMode(UPDATE_MODES[update])
+    for item in static_items:
+        item.setCacheMode(CACHE_MODES[cache])
@@ -0,0 +1,105 @@
+"""
+Shared sprites for the animation example.
+Each image file is decoded once, and each size it is scaled to is made
+once, no matter how many items show it. The sprites can also be packed
+into one atlas pixmap, which AtlasItem draws its part of, so that all of
+the items in a scene draw from the same pixmap.
+"""
+# import necessary modules
+from PyQt5.QtCore import QRect, QRectF, Qt
+from PyQt5.QtGui import QPainter, QPixmap
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsPixmapItem
+
+# Largest width of an atlas. Sprites are placed in rows up to this width.
+ATLAS_WIDTH = 2048
+
+
+class SpriteCache:
+    """
+    Sprites keyed by (path, width), where width is the width the image
+    is scaled to, keeping its aspect ratio.
+    """
+
+    def __init__(self):
+        self.images = {}
+        self.sprites = {}
+        # Number of image files decoded
+        self.decodes = 0
+
+        # Atlas made by buildAtlas(), and the area of each sprite in it
+        self.atlas = None
+        self.regions = {}
+
+    def pixmap(self, path, width):
+        key = (path, width)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            image = self.images.get(path)
+            if image is None:
+                image = QPixmap(path)
+                self.images[path] = image
+                self.decodes += 1
+            sprite = image.scaledToWidth(width, Qt.SmoothTransformation)
+            self.sprites[key] = sprite
+        return sprite
+
+    def buildAtlas(self, padding = 1):
+        """
+        Pack every sprite made so far into one pixmap, in rows from the
+        tallest sprite to the shortest. padding pixels are left between
+        sprites so that scaled drawing doesn't pick up their neighbours.
+        """
+        keys = sorted(self.sprites, key = lambda key:
+                      -self.sprites[key].height())
+        self.regions = {}
+        x = y = row_height = 0
+        for key in keys:
+            sprite = self.sprites[key]
+            if x > 0 and x + sprite.width() > ATLAS_WIDTH:
+                x = 0
+                y += row_height + padding
+                row_height = 0
+            self.regions[key] = QRect(x, y, sprite.width(), sprite.height())
+            x += sprite.width() + padding
+            row_height = max(row_height, sprite.height())
+
+        width = max([rect.right() + 1 for rect in self.regions.values()] +
+                    [1])
+        self.atlas = QPixmap(width, max(1, y + row_height))
+        self.atlas.fill(Qt.transparent)
+        painter = QPainter(self.atlas)
+        for key, rect in self.regions.items():
+            painter.drawPixmap(rect.topLeft(), self.sprites[key])
+        painter.end()
+
+    def createItem(self, path, width):
+        """
+        Return a graphics item that shows the sprite, drawn from the
+        atlas if the sprite has been packed into it.
+        """
+        pixmap = self.pixmap(path, width)
+        if (path, width) in self.regions:
+            return AtlasItem(self, (path, width))
+        return QGraphicsPixmapItem(pixmap)
+
+
+class AtlasItem(QGraphicsItem):
+    """
+    A graphics item that draws one sprite from a SpriteCache's atlas.
+    """
+
+    def __init__(self, cache, key, parent = None):
+        super().__init__(parent)
+        self.cache = cache
+        self.source = QRectF(cache.regions[key])
+        self.bounds = QRectF(0, 0, self.source.width(), self.source.height())
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget = None):
+        painter.drawPixmap(self.bounds, self.cache.atlas, self.source)
+
+
+# Sprites shared by the whole application
+sprite_cache = SpriteCache()
@@ -0,0 +1,146 @@
+"""
+Smoothed, pressure-aware strokes for the painter GUI.
+Mouse and tablet positions are collected for a frame and processed
+together with NumPy. Points that are closer than a minimum distance
+along the path are dropped, and the points that are left are joined
+with Catmull-Rom curves instead of straight lines. Each point has a
+pressure between 0 and 1 that sets the width of the stroke there.
+"""
+# import necessary modules
+import numpy as np
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QPolygonF
+
+# Narrowest line drawn for a stroke with very light pressure
+MIN_WIDTH = 0.5
+# Most samples used for one curve segment
+MAX_SUBDIVISIONS = 32
+
+
+def catmullRom(controls, first, last, spacing):
+    """
+    Return samples (x, y, pressure) of the curve through controls, an
+    array of shape (n, 3), for segments first to last - 1. Segment i
+    joins controls[i] and controls[i + 1], and is divided into pieces of
+    about spacing pixels. The end of the last segment is included.
+    """
+    count = len(controls)
+    index = np.arange(first, last)
+    # The first and last points are repeated for the end segments
+    p0 = controls[np.maximum(index - 1, 0)]
+    p1 = controls[index]
+    p2 = controls[index + 1]
+    p3 = controls[np.minimum(index + 2, count - 1)]
+
+    lengths = np.hypot(p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1])
+    counts = np.clip(np.ceil(lengths / spacing), 1,
+                     MAX_SUBDIVISIONS).astype(int)
+    segment = np.repeat(np.arange(len(index)), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    t = ((np.arange(counts.sum()) - starts) /
+         np.repeat(counts, counts))[:, None]
+
+    a, b, c, d = p0[segment], p1[segment], p2[segment], p3[segment]
+    samples = 0.5 * (2 * b + (c - a) * t +
+                     (2 * a - 5 * b + 4 * c - d) * t * t +
+                     (3 * b - a - 3 * c + d) * t * t * t)
+    samples = np.vstack([samples, p2[-1:]])
+    samples[:, 2] = samples[:, 2].clip(0.0, 1.0)
+    return samples
+
+
+def drawSamples(painter, samples, width):
+    """
+    Draw samples (x, y, pressure) as connected lines with the painter's
+    pen. The width of each line is width times its pressure. Lines with
+    the same width are drawn together as one polyline.
+    """
+    if len(samples) < 2:
+        return
+
+    # Round widths to half pixels, so that light changes in pressure
+    # don't split the stroke into many polylines
+    widths = np.maximum(MIN_WIDTH, width * samples[:, 2])
+    widths = np.round(widths[:-1] + widths[1:]) / 2
+    breaks = np.flatnonzero(np.diff(widths)) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(widths)]])
+
+    pen = painter.pen()
+    for start, end in zip(starts, ends):
+        pen.setWidthF(float(widths[start]))
+        painter.setPen(pen)
+        painter.drawPolyline(QPolygonF(
+            [QPointF(x, y) for x, y in samples[start:end + 1, :2].tolist()]))
+
+
+class StrokeEngine:
+    """
+    Turns the raw points of a stroke into smooth curve samples. Call
+    begin() with the first point, add() with each frame's points and
+    finish() when the stroke ends. Each call returns the samples that
+    are ready to be drawn. A curve segment can only be drawn once the
+    point after it is known, so the samples lag one point behind.
+    """
+
+    def __init__(self, min_distance = 2.0, spacing = 4.0):
+        self.min_distance = min_distance
+        self.spacing = spacing
+        self.begin(0.0, 0.0)
+
+    def begin(self, x, y, pressure = 1.0):
+        # Points kept after decimation. Only the ones still needed for
+        # segments that haven't been drawn are kept.
+        self.controls = np.array([[x, y, pressure]])
+        self.drawn = 0
+        # Last point received, and the distance travelled since the last
+        # point that was kept
+        self.last_point = np.array([x, y, pressure])
+        self.travelled = 0.0
+
+    def add(self, xs, ys, pressures):
+        """
+        Add the points received during a frame.
+        """
+        points = np.column_stack([xs, ys, pressures]).astype(float)
+        if len(points) == 0:
+            return np.empty((0, 3))
+
+        # Keep the first point after each min_distance along the path
+        path = np.vstack([self.last_point[None, :2], points[:, :2]])
+        steps = np.hypot(*np.diff(path, axis = 0).T)
+        distance = self.travelled + np.cumsum(steps)
+        bins = np.floor(distance / self.min_distance)
+        kept = np.flatnonzero(np.diff(bins, prepend = 0) > 0)
+
+        self.last_point = points[-1]
+        if len(kept) == 0:
+            self.travelled = distance[-1]
+            return np.empty((0, 3))
+        self.travelled = distance[-1] - distance[kept[-1]]
+
+        self.controls = np.vstack([self.controls, points[kept]])
+        return self.emit(len(self.controls) - 2)
+
+    def finish(self):
+        """
+        Return the rest of the stroke, ending at the last point received.
+        """
+        if self.travelled > 0:
+            self.controls = np.vstack([self.controls, self.last_point])
+            self.travelled = 0.0
+        return self.emit(len(self.controls) - 1)
+
+    def emit(self, last):
+        """
+        Return the samples of the segments from the last one drawn up to
+        last, and forget the points that are no longer needed.
+        """
+        if last <= self.drawn:
+            return np.empty((0, 3))
+        samples = catmullRom(self.controls, self.drawn, last, self.spacing)
+
+        # The point before the next segment shapes its curve, so keep it
+        self.controls = self.controls[last - 1:]
+        self.drawn = 1
+        return samples
@@ -0,0 +1,351 @@
+"""
+Vector stroke model for the painter GUI.
+Every stroke is recorded with its tool, colour and width, and its points
+and their pressures are kept in compact array('f')s. Strokes are added
+to a grid spatial index, so undo, redo, erasing and redrawing only need
+to look at the strokes that cross the area being changed. Each tile is
+saved before a recorded stroke first paints on it, and the strokes are
+replayed over that, so paint that isn't part of any stroke, such as a
+loaded document, is kept.
+"""
+# import necessary modules
+from array import array
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRect, QRectF, Qt
+from PyQt5.QtGui import QColor, QPainter, QPen
+
+from stroke_engine import drawSamples
+
+# Size of the square drawn by the eraser at each point
+ERASER_SIZE = 12
+
+
+class Stroke:
+    """
+    A single stroke. tool is either "pen", "eraser" or "fill". A fill
+    has an image of the filled area and two points, its top left and
+    bottom right corners.
+    """
+    __slots__ = ("id", "tool", "color", "width", "antialiased", "points",
+                 "pressures", "image", "left", "top", "right", "bottom")
+
+    def __init__(self, tool, color, width, antialiased = False):
+        self.id = None
+        self.tool = tool
+        self.color = QColor(color).rgba()
+        self.width = width
+        self.antialiased = antialiased
+        # x0, y0, x1, y1, ... stored as 32-bit floats
+        self.points = array('f')
+        self.pressures = array('f')
+        self.image = None
+
+        self.left = self.top = float("inf")
+        self.right = self.bottom = float("-inf")
+
+    def addPoint(self, x, y, pressure = 1.0):
+        self.points.append(x)
+        self.points.append(y)
+        self.pressures.append(pressure)
+
+        self.left = min(self.left, x)
+        self.top = min(self.top, y)
+        self.right = max(self.right, x)
+        self.bottom = max(self.bottom, y)
+
+    def pointCount(self):
+        return len(self.points) // 2
+
+    def margin(self):
+        """
+        Distance that the stroke's paint can reach past its points.
+        """
+        if self.tool == "eraser":
+            return ERASER_SIZE
+        if self.tool == "fill":
+            return 0
+        return self.width // 2 + 2
+
+    def boundingRect(self):
+        """
+        Return the area covered by the stroke, including its width.
+        """
+        if not self.points:
+            return QRect()
+        margin = self.margin()
+        return QRectF(self.left, self.top, self.right - self.left,
+                      self.bottom - self.top).toAlignedRect().adjusted(
+            -margin, -margin, margin, margin)
+
+    def segmentRects(self):
+        """
+        Yield the bounding rectangle of each segment of the stroke.
+        """
+        points = self.points
+        margin = self.margin()
+        # A stroke with a single point is treated as a segment of length 0
+        last = max(0, len(points) - 2)
+        for i in range(0, max(2, last), 2):
+            x1, y1 = points[i], points[i + 1]
+            x2, y2 = points[min(i + 2, last)], points[min(i + 3, last + 1)]
+            yield (min(x1, x2) - margin, min(y1, y2) - margin,
+                   max(x1, x2) + margin, max(y1, y2) + margin)
+
+    def intersects(self, rect):
+        """
+        Return True if any segment of the stroke crosses rect.
+        """
+        left, top = rect.left(), rect.top()
+        right, bottom = rect.right(), rect.bottom()
+        for x1, y1, x2, y2 in self.segmentRects():
+            if x1 <= right and x2 >= left and y1 <= bottom and y2 >= top:
+                return True
+        return False
+
+    def render(self, painter):
+        """
+        Draw the stroke with painter.
+        """
+        points = self.points
+        if self.tool == "fill":
+            painter.drawImage(QPointF(self.left, self.top), self.image)
+            return
+        if self.tool == "eraser":
+            # Erasing makes the canvas transparent again
+            painter.save()
+            painter.setCompositionMode(QPainter.CompositionMode_Clear)
+            for i in range(0, len(points), 2):
+                painter.fillRect(QRectF(points[i], points[i + 1],
+                                        ERASER_SIZE, ERASER_SIZE), Qt.white)
+            painter.restore()
+            return
+
+        painter.setRenderHint(QPainter.Antialiasing, self.antialiased)
+        painter.setPen(QPen(QColor.fromRgba(self.color), self.width,
+                            Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+        samples = np.column_stack([
+            np.frombuffer(points, np.float32).reshape(-1, 2),
+            np.frombuffer(self.pressures, np.float32)])
+        drawSamples(painter, samples, self.width)
+
+
+class GridIndex:
+    """
+    Spatial index that divides the canvas into square cells. Each cell
+    holds the ids of the strokes that have a segment crossing it.
+    """
+
+    def __init__(self, cell_size = 128):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cellsFor(self, left, top, right, bottom):
+        size = self.cell_size
+        for cy in range(int(top // size), int(bottom // size) + 1):
+            for cx in range(int(left // size), int(right // size) + 1):
+                yield cx, cy
+
+    def strokeCells(self, stroke):
+        cells = set()
+        for rect in stroke.segmentRects():
+            cells.update(self.cellsFor(*rect))
+        return cells
+
+    def insert(self, stroke):
+        for cell in self.strokeCells(stroke):
+            self.cells.setdefault(cell, set()).add(stroke.id)
+
+    def remove(self, stroke):
+        for cell in self.strokeCells(stroke):
+            ids = self.cells.get(cell)
+            if ids is not None:
+                ids.discard(stroke.id)
+                if not ids:
+                    del self.cells[cell]
+
+    def query(self, rect):
+        """
+        Return the ids of strokes that may cross rect.
+        """
+        found = set()
+        for cell in self.cellsFor(rect.left(), rect.top(), rect.right(),
+                                  rect.bottom()):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+    def clear(self):
+        self.cells.clear()
+
+
+class StrokeDocument:
+    """
+    Holds the strokes of a drawing, their spatial index and the undo and
+    redo history. Undoing a stroke only redraws the strokes that cross it,
+    so the cost doesn't grow with the size of the drawing. Call capture()
+    with the area a stroke is about to paint before painting it.
+    """
+
+    def __init__(self):
+        self.strokes = {}
+        self.index = GridIndex()
+        self.next_id = 0
+
+        # The tiles the strokes were drawn over, keyed by tile key. Each
+        # is a copy of the tile from before a stroke first painted on it,
+        # or None if it was empty. Tiles that aren't here have never been
+        # painted by a stroke.
+        self.base = {}
+        self.tile_size = None
+
+        # Each entry is ("add", [strokes]) or ("remove", [strokes])
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def insert(self, stroke):
+        self.strokes[stroke.id] = stroke
+        self.index.insert(stroke)
+
+    def delete(self, stroke):
+        del self.strokes[stroke.id]
+        self.index.remove(stroke)
+
+    def capture(self, store, rect):
+        """
+        Save the tiles of store under rect that haven't been painted by
+        a stroke yet. Must be called before painting into rect.
+        """
+        self.tile_size = store.tile_size
+        for key in store.keysIn(rect):
+            if key not in self.base:
+                tile = store.tile(key)
+                self.base[key] = None if tile is None else tile.copy()
+
+    def addStroke(self, stroke):
+        """
+        Add a finished stroke to the drawing.
+        """
+        if stroke.pointCount() == 0:
+            return
+        # Ids increase, so sorting by id gives the order strokes were drawn
+        stroke.id = self.next_id
+        self.next_id += 1
+        self.insert(stroke)
+
+        self.undo_stack.append(("add", [stroke]))
+        self.redo_stack.clear()
+
+    def hitTest(self, rect):
+        """
+        Return the pen strokes that cross rect, checking only the
+        strokes found in the index.
+        """
+        return [self.strokes[stroke_id]
+                for stroke_id in sorted(self.index.query(rect))
+                if self.strokes[stroke_id].tool == "pen" and
+                self.strokes[stroke_id].intersects(rect)]
+
+    def removeStrokes(self, strokes, record = True):
+        """
+        Remove strokes from the drawing, for example with the stroke
+        eraser. Returns the area that needs to be redrawn. If record is
+        False, call recordRemoval() later so the removal can be undone.
+        """
+        dirty = QRect()
+        for stroke in strokes:
+            self.delete(stroke)
+            dirty = dirty.united(stroke.boundingRect())
+
+        if record:
+            self.recordRemoval(strokes)
+        return dirty
+
+    def recordRemoval(self, strokes):
+        if strokes:
+            self.undo_stack.append(("remove", list(strokes)))
+            self.redo_stack.clear()
+
+    def apply(self, action, strokes, reverse):
+        """
+        Apply an entry of the history, or reverse it. Returns the area
+        that needs to be redrawn.
+        """
+        dirty = QRect()
+        adding = (action == "add") != reverse
+        for stroke in strokes:
+            if adding:
+                self.insert(stroke)
+            else:
+                self.delete(stroke)
+            dirty = dirty.united(stroke.boundingRect())
+        return dirty
+
+    def undo(self):
+        if not self.undo_stack:
+            return QRect()
+        action, strokes = self.undo_stack.pop()
+        self.redo_stack.append((action, strokes))
+        return self.apply(action, strokes, reverse = True)
+
+    def redo(self):
+        if not self.redo_stack:
+            return QRect()
+        action, strokes = self.redo_stack.pop()
+        self.undo_stack.append((action, strokes))
+        return self.apply(action, strokes, reverse = False)
+
+    def clear(self):
+        self.strokes.clear()
+        self.index.clear()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.base.clear()
+
+    def drawBase(self, painter, key, tile):
+        """
+        Replace the area of the tile key with tile, or clear it if tile
+        is None.
+        """
+        size = self.tile_size
+        painter.save()
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        if tile is None:
+            painter.fillRect(key[0] * size, key[1] * size, size, size,
+                             Qt.transparent)
+        else:
+            painter.drawImage(key[0] * size, key[1] * size, tile)
+        painter.restore()
+
+    def render(self, painter, rect):
+        """
+        Redraw the area rect, replaying only the strokes that cross it
+        over the saved tiles. Tiles that no stroke has painted on are left
+        as they are.
+        """
+        painter.save()
+        painter.setClipRect(rect)
+        if self.base:
+            size = self.tile_size
+            for ty in range(rect.top() // size, rect.bottom() // size + 1):
+                for tx in range(rect.left() // size,
+                                rect.right() // size + 1):
+                    if (tx, ty) in self.base:
+                        self.drawBase(painter, (tx, ty),
+                                      self.base[(tx, ty)])
+        for stroke_id in sorted(self.index.query(rect)):
+            self.strokes[stroke_id].render(painter)
+        painter.restore()
+
+    def renderAll(self, painter, store):
+        """
+        Replay every stroke over the tiles they were drawn on, for
+        example to draw at another resolution. store holds the tiles
+        that no stroke has painted on.
+        """
+        self.tile_size = store.tile_size
+        for key in store.keys() | self.base.keys():
+            tile = self.base[key] if key in self.base else store.tile(key)
+            if tile is not None:
+                self.drawBase(painter, key, tile)
+        for stroke_id in sorted(self.strokes):
+            self.strokes[stroke_id].render(painter)
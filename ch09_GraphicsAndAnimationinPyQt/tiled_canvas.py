@@ -0,0 +1,348 @@
+"""
+Tiled storage for the painter canvas.
+The canvas has no fixed size. It is divided into square tiles that are
+only created the first time something is painted on them, so empty areas
+use no memory. For zooming out, each group of tiles also has downsampled
+copies (a mip cache). Level 1 tiles cover 2x2 tiles, level 2 tiles cover
+4x4 tiles and so on, so the number of tiles drawn stays about the same
+at any zoom level. Tiles of a saved document can be added unloaded, with
+a function that loads them the first time they are needed.
+"""
+# import necessary modules
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtCore import QRect, QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+TILE_SIZE = 256
+TILE_FORMAT = QImage.Format_ARGB32_Premultiplied
+# A level 12 tile covers 4096 x 4096 tiles
+MAX_MIP_LEVEL = 12
+
+
+class TileStore:
+    """
+    Tiles of a canvas, keyed by (tx, ty). Missing tiles are transparent.
+    """
+
+    def __init__(self, tile_size = TILE_SIZE, max_mip_tiles = 1024):
+        self.tile_size = tile_size
+        self.tiles = {}
+        # Functions that load the tiles that haven't been needed yet
+        self.unloaded = {}
+        # Tiles changed since the document was last saved
+        self.dirty = set()
+
+        # Downsampled tiles of each level, keyed by (tx, ty), least
+        # recently used first. When there are too many, the lowest levels
+        # are removed first. They are only needed to build the levels
+        # above them, and removing them first keeps the tiles of the level
+        # being shown from removing each other.
+        self.mips = [OrderedDict() for level in range(MAX_MIP_LEVEL + 1)]
+        self.mip_count = 0
+        self.max_mip_tiles = max_mip_tiles
+
+        # Number of tiles under each downsampled tile, so that empty
+        # areas can be skipped without looking at each of their tiles
+        self.occupancy = [{} for level in range(MAX_MIP_LEVEL + 1)]
+
+        # Painters kept open on tiles for the duration of a stroke
+        self.painters = {}
+
+    def tileRect(self, key):
+        size = self.tile_size
+        return QRect(key[0] * size, key[1] * size, size, size)
+
+    def keysIn(self, rect):
+        """
+        Return the keys of all tiles, present or not, that rect touches.
+        """
+        if rect.isEmpty():
+            return []
+        size = self.tile_size
+        return [(tx, ty)
+                for ty in range(rect.top() // size, rect.bottom() // size + 1)
+                for tx in range(rect.left() // size,
+                                rect.right() // size + 1)]
+
+    def keys(self):
+        """
+        Return the keys of all tiles, loaded or not.
+        """
+        return self.tiles.keys() | self.unloaded.keys()
+
+    def tile(self, key, create = False):
+        image = self.tiles.get(key)
+        if image is None and key in self.unloaded:
+            image = self.unloaded.pop(key)()
+            self.tiles[key] = image
+        if image is None and create:
+            image = QImage(self.tile_size, self.tile_size, TILE_FORMAT)
+            image.fill(Qt.transparent)
+            self.addTile(key, image)
+        return image
+
+    def addTile(self, key, image):
+        if self.unloaded.pop(key, None) is None and key not in self.tiles:
+            self.count(key, 1)
+        self.tiles[key] = image
+        self.invalidate(key)
+
+    def addUnloaded(self, key, load):
+        """
+        Add a tile that is loaded by calling load() when it is needed.
+        """
+        if key not in self.tiles and key not in self.unloaded:
+            self.count(key, 1)
+            self.unloaded[key] = load
+
+    def removeTile(self, key):
+        if self.tiles.pop(key, None) is None and \
+                self.unloaded.pop(key, None) is None:
+            return
+        self.count(key, -1)
+        self.invalidate(key)
+
+    def count(self, key, change):
+        """
+        Add change to the number of tiles under each downsampled tile
+        that includes the tile key.
+        """
+        tx, ty = key
+        for level in range(1, MAX_MIP_LEVEL + 1):
+            counts = self.occupancy[level]
+            mip_key = (tx >> level, ty >> level)
+            counts[mip_key] = counts.get(mip_key, 0) + change
+            if counts[mip_key] == 0:
+                del counts[mip_key]
+
+    def contentBounds(self):
+        """
+        Return the smallest rectangle that covers everything painted.
+        Only the tiles on the edges of the painted area are checked pixel
+        by pixel, so only they need to be loaded.
+        """
+        keys = self.keys()
+        if not keys:
+            return QRect()
+        left = min(tx for tx, ty in keys)
+        right = max(tx for tx, ty in keys)
+        top = min(ty for tx, ty in keys)
+        bottom = max(ty for tx, ty in keys)
+
+        bounds = QRect()
+        for key in keys:
+            if key[0] in (left, right) or key[1] in (top, bottom):
+                rect = paintedRect(self.tile(key))
+            else:
+                rect = QRect(0, 0, self.tile_size, self.tile_size)
+            if not rect.isEmpty():
+                bounds = bounds.united(
+                    rect.translated(self.tileRect(key).topLeft()))
+        return bounds
+
+    def clear(self):
+        self.endPainting()
+        self.tiles.clear()
+        self.unloaded.clear()
+        self.dirty.clear()
+        for cache in self.mips:
+            cache.clear()
+        self.mip_count = 0
+        for counts in self.occupancy:
+            counts.clear()
+
+    # Painting
+    def painterFor(self, key, setup = None):
+        """
+        Return a painter for the tile key, translated so that it uses
+        canvas coordinates. The painter stays open until endPainting().
+        """
+        painter = self.painters.get(key)
+        if painter is None:
+            painter = QPainter(self.tile(key, create = True))
+            painter.translate(-key[0] * self.tile_size,
+                              -key[1] * self.tile_size)
+            if setup is not None:
+                setup(painter)
+            self.painters[key] = painter
+        return painter
+
+    def paint(self, rect, draw, setup = None):
+        """
+        Call draw(painter) for each tile that rect touches. setup(painter)
+        is called once when a tile's painter is opened.
+        """
+        for key in self.keysIn(rect):
+            draw(self.painterFor(key, setup))
+            self.invalidate(key)
+
+    def endPainting(self):
+        """
+        Close the painters opened during a stroke and remove the tiles
+        that were erased back to transparent.
+        """
+        for key, painter in self.painters.items():
+            painter.end()
+            if isBlank(self.tiles[key]):
+                self.removeTile(key)
+        self.painters.clear()
+
+    # Access to the raw pixels, used by the undo history
+    def tileBytes(self, key):
+        image = self.tile(key)
+        if image is None:
+            return None
+        return image.constBits().asstring(image.sizeInBytes())
+
+    def setTileBytes(self, key, data):
+        if data is None:
+            self.removeTile(key)
+        else:
+            image = QImage(data, self.tile_size, self.tile_size,
+                           self.tile_size * 4, TILE_FORMAT)
+            # Copy so the tile doesn't point into the bytes object
+            self.addTile(key, image.copy())
+
+    # Mip cache
+    def invalidate(self, key):
+        """
+        Remove the downsampled tiles that include the tile key, and mark
+        it as changed.
+        """
+        self.dirty.add(key)
+        tx, ty = key
+        for level in range(1, MAX_MIP_LEVEL + 1):
+            mip_key = (tx >> level, ty >> level)
+            if mip_key in self.mips[level]:
+                del self.mips[level][mip_key]
+                self.mip_count -= 1
+
+    def mip(self, level, tx, ty):
+        """
+        Return the tile at (tx, ty) of the given level, or None if the
+        area is empty. Level 0 is the full size tiles.
+        """
+        if level == 0:
+            return self.tile((tx, ty))
+        if (tx, ty) not in self.occupancy[level]:
+            return None
+
+        cache = self.mips[level]
+        if (tx, ty) in cache:
+            cache.move_to_end((tx, ty))
+            return cache[(tx, ty)]
+
+        # Combine the four tiles of the level below at half size
+        image = None
+        half = self.tile_size // 2
+        for dy in (0, 1):
+            for dx in (0, 1):
+                child = self.mip(level - 1, tx * 2 + dx, ty * 2 + dy)
+                if child is None:
+                    continue
+                if image is None:
+                    image = QImage(self.tile_size, self.tile_size,
+                                   TILE_FORMAT)
+                    image.fill(Qt.transparent)
+                    painter = QPainter(image)
+                    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+                painter.drawImage(QRect(dx * half, dy * half, half, half),
+                                  child)
+        if image is not None:
+            painter.end()
+
+        cache[(tx, ty)] = image
+        self.mip_count += 1
+        if self.mip_count > self.max_mip_tiles:
+            for lower in self.mips[1:]:
+                if lower:
+                    lower.popitem(last = False)
+                    self.mip_count -= 1
+                    break
+        return image
+
+    def render(self, painter, area, zoom):
+        """
+        Draw the part of the canvas inside area (in canvas coordinates).
+        painter must already be scaled by zoom.
+        """
+        level = mipLevel(zoom)
+        size = self.tile_size << level
+
+        for ty in range(int(area.top() // size),
+                        int(area.bottom() // size) + 1):
+            for tx in range(int(area.left() // size),
+                            int(area.right() // size) + 1):
+                image = self.mip(level, tx, ty)
+                if image is not None:
+                    painter.drawImage(QRectF(tx * size, ty * size, size,
+                                             size), image)
+
+    def renderImage(self, rect, background = Qt.white):
+        """
+        Return an image of the area rect of the canvas at full size.
+        """
+        image = QImage(rect.size(), TILE_FORMAT)
+        image.fill(background)
+        painter = QPainter(image)
+        painter.translate(-rect.topLeft())
+        for key in self.keysIn(rect):
+            tile = self.tile(key)
+            if tile is not None:
+                painter.drawImage(self.tileRect(key).topLeft(), tile)
+        painter.end()
+        return image
+
+
+def mipLevel(zoom):
+    """
+    Return the mip level whose tiles are closest to one pixel per pixel
+    when the canvas is drawn at zoom.
+    """
+    if zoom >= 1.0:
+        return 0
+    return min(MAX_MIP_LEVEL, int(math.floor(math.log2(1.0 / zoom))))
+
+
+def tileAlpha(image):
+    """
+    Return the alpha channel of a tile as an array of shape (size, size).
+    """
+    return tilePixels(image) >> 24
+
+
+def tilePixels(image):
+    """
+    Return a read-only view of the pixels of a tile, as an array of
+    shape (size, size) of 0xAARRGGBB values. No copy is made.
+    """
+    pointer = image.constBits()
+    pointer.setsize(image.sizeInBytes())
+    return np.frombuffer(pointer, np.uint32).reshape(image.height(),
+                                                     image.width())
+
+
+def isBlank(image):
+    """
+    Return True if every pixel of image is fully transparent.
+    """
+    # The alpha is the top byte, so it is 0 everywhere if no pixel is
+    # 0x01000000 or more. This avoids making an array of the alphas.
+    return tilePixels(image).max() < 0x01000000
+
+
+def paintedRect(image):
+    """
+    Return the rectangle of a tile that has been painted on.
+    """
+    alpha = tileAlpha(image)
+    rows = np.flatnonzero(alpha.any(axis = 1))
+    columns = np.flatnonzero(alpha.any(axis = 0))
+    if len(rows) == 0:
+        return QRect()
+    return QRect(int(columns[0]), int(rows[0]),
+                 int(columns[-1] - columns[0] + 1),
+                 int(rows[-1] - rows[0] + 1))
@@ -66,41 +66,41 @@ class DrawingLabel(QLabel):
         """
         painter.setBrush(QBrush(QColor("#000000")))
         # drawRect(x, y, width, height)
-        painter.drawRect((self.width / 2) - 40, self.height, 150, 4)
-        painter.drawRect(self.width / 2, 0, 4, 200)
-        painter.drawRect(self.width / 2, 0, 60, 4)
-        painter.drawRect((self.width / 2) + 60, 0, 4, 40)
+        painter.drawRect((self.width // 2) - 40, self.height, 150, 4)
+        painter.drawRect(self.width // 2, 0, 4, 200)
+        painter.drawRect(self.width // 2, 0, 60, 4)
+        painter.drawRect((self.width // 2) + 60, 0, 4, 40)
 
     def drawHangmanBody(self, painter):
         """
         Create and draw body parts for hangman.
         """
         if "head" in self.empty_list:
-            head = QRect((self.width / 2) + 42, 40, 40, 40)
+            head = QRect((self.width // 2) + 42, 40, 40, 40)
             painter.setPen(QPen(QColor("#000000"), 3))
             painter.setBrush(QBrush(QColor("#FFFFFF")))
             painter.drawEllipse(head)
         if "body" in self.empty_list:
-            body = QRect((self.width / 2) + 60, 80, 2, 55)
+            body = QRect((self.width // 2) + 60, 80, 2, 55)
             painter.setBrush(QBrush(QColor("#000000")))
             painter.drawRect(body)
         if "right_arm" in self.empty_list:
-            right_arm = QLine((self.width / 2) + 60, 85,
-                              (self.width / 2) + 50, (self.height / 2) + 30)
+            right_arm = QLine((self.width // 2) + 60, 85,
+                              (self.width // 2) + 50, (self.height // 2) + 30)
             pen = QPen(Qt.black, 3, Qt.SolidLine)
             painter.setPen(pen)
             painter.drawLine(right_arm)
         if "left_arm" in self.empty_list:
-            left_arm = QLine((self.width / 2) + 62, 85,
-                             (self.width / 2) + 72, (self.height / 2) + 30)
+            left_arm = QLine((self.width // 2) + 62, 85,
+                             (self.width // 2) + 72, (self.height // 2) + 30)
             painter.drawLine(left_arm)
         if "right_leg" in self.empty_list:
-            right_leg = QLine((self.width / 2) + 60, 135,
-                              (self.width / 2) + 50, (self.height / 2) + 75)
+            right_leg = QLine((self.width // 2) + 60, 135,
+                              (self.width // 2) + 50, (self.height // 2) + 75)
             painter.drawLine(right_leg)
         if "left_leg" in self.empty_list:
-            left_leg = QLine((self.width / 2) + 62, 135,
-                             (self.width / 2) + 72, (self.height / 2) + 75)
+            left_leg = QLine((self.width // 2) + 62, 135,
+                             (self.width // 2) + 72, (self.height // 2) + 75)
             painter.drawLine(left_leg)
 
         # Reset variable